@@ -1,21 +1,40 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 
-import utils.gradio_ui as gradio_ui
 import utils.agent as agent_utils
+import utils.tracing as tracing
 
 def main():
     SERVER_NAME = os.getenv('SERVER_NAME')
+    # Prometheus-style latency metrics next to the Gradio app; set to 0 to disable. The default port is
+    # outside the range Gradio picks its own port from (7860-7959), and only local clients can connect
+    # unless MEALPLAN_METRICS_HOST is set.
+    METRICS_PORT = int(os.getenv('MEALPLAN_METRICS_PORT') or 9464)
+    METRICS_HOST = os.getenv('MEALPLAN_METRICS_HOST') or '127.0.0.1'
+    # "background" serves the tables right away and loads the agent on a background
+    # thread; "blocking" only starts serving once the agent is loaded.
+    STARTUP_MODE = os.getenv('MEALPLAN_STARTUP_MODE') or "background"
 
+    if METRICS_PORT:
+      try:
+        tracing.start_metrics_server(METRICS_PORT, METRICS_HOST)
+      except OSError as e:
+        print(f"Warning: could not serve metrics on {METRICS_HOST}:{METRICS_PORT}: {e}", file=sys.stderr)
+
+    # Start loading the agent first, so that it overlaps with importing gradio
+    agent_pool = agent_utils.start_agent_pool()
     try:
-      mcp_client = agent_utils.initialize_mcp_client()
-      agent = agent_utils.initialize_agent(mcp_client)
-      demo = gradio_ui.get_gradio_interface(agent)
+      import utils.gradio_ui as gradio_ui
+
+      if STARTUP_MODE == "blocking":
+        agent_pool.wait()
+      demo = gradio_ui.get_gradio_interface(agent_pool)
 
       demo.launch(server_name=SERVER_NAME)
     finally:
-      mcp_client.disconnect()
+      agent_pool.close()
 
 if __name__ == "__main__":
     main()
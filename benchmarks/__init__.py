@@ -0,0 +1,6 @@
+"""Benchmarks of the meal planner, run as modules from the repository root.
+
+`benchmarks.suite` times the database functions, the MCP tools, the table
+builders, agent runs and the intent router on synthetic data and compares
+result files; the bench_* modules each study one optimization in depth.
+"""
@@ -0,0 +1,113 @@
+"""Throughput and latency benchmark for BatchedTransformersModel in utils/local_models.py.
+
+Runs 1, 4 and 16 concurrent sessions against a local model. Every session
+sends several agent steps (a task, then the previous code actions and their
+observations) from its own thread, like concurrent chat sessions do.
+TransformersModel serves one step at a time, as the app does with a local
+model; BatchedTransformersModel generates the steps of all sessions together
+with quantized weights. Reported per backend and concurrency: generated
+tokens per second, and the p50 and p95 latency and time to first token of a
+step.
+
+The default 30B model takes long to load and run on a CPU; pass a smaller
+model to get quick numbers:
+    python -m benchmarks.bench_batching --model-id HuggingFaceTB/SmolLM2-360M-Instruct
+"""
+import argparse
+import contextlib
+import statistics
+import threading
+import time
+
+from smolagents import TransformersModel
+
+from utils import agent as agent_utils
+from utils.local_models import QUANTIZATION_MODES, BatchedTransformersModel
+
+TASKS = [
+    "Fetch all the meals from the database",
+    "Generate a meal plan for the week",
+    "Add a new meal Rajma with Kidney beans, Onion, Tomato to the database",
+    "What can I make with spinach?",
+]
+STOP_SEQUENCES = ["</code>", "Observation:"]
+
+
+def text_message(role: str, text: str) -> dict:
+    return {"role": role, "content": [{"type": "text", "text": text}]}
+
+
+def run_session(model, session: int, steps: int, lock, results: list) -> None:
+    """Send the steps of one session and append (latency, time to first token, tokens) for every step."""
+    messages = [text_message("user", f"New task:\n{TASKS[session % len(TASKS)]}")]
+    for step in range(steps):
+        start = time.perf_counter()
+        # A lock serializes the steps of all sessions for a backend that serves one step at a time,
+        # and the time waiting for it counts towards the step's latency
+        with lock:
+            first_token = None
+            output = []
+            tokens = 0
+            for delta in model.generate_stream(messages, stop_sequences=STOP_SEQUENCES):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                output.append(delta.content or "")
+                tokens += 1
+            latency = time.perf_counter() - start
+        results.append((latency, first_token if first_token is not None else latency, tokens))
+        messages.append(text_message("assistant", "".join(output)))
+        messages.append(text_message("user", f"Observation:\nExecution logs:\nstep {step} done"))
+
+
+def run(model, sessions: int, steps: int, serialize: bool) -> dict:
+    lock = threading.Lock() if serialize else contextlib.nullcontext()
+    results = []
+    threads = [threading.Thread(target=run_session, args=(model, session, steps, lock, results))
+               for session in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies = sorted(result[0] for result in results)
+    first_tokens = sorted(result[1] for result in results)
+    return {
+        "tokens_per_second": sum(result[2] for result in results) / elapsed,
+        "latency_p50": statistics.median(latencies),
+        "latency_p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "first_token_p50": statistics.median(first_tokens),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-id", default=agent_utils.MODEL_ID)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--steps", type=int, default=3)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--quantization", choices=QUANTIZATION_MODES, default="int8")
+    args = parser.parse_args()
+
+    backends = (
+        ("TransformersModel", lambda: TransformersModel(
+            model_id=args.model_id, device_map="cpu", max_new_tokens=args.max_new_tokens), True),
+        (f"BatchedTransformersModel ({args.quantization})", lambda: BatchedTransformersModel(
+            model_id=args.model_id, device_map="cpu", max_new_tokens=args.max_new_tokens,
+            quantization=args.quantization, max_batch_size=max(args.sessions)), False),
+    )
+    for name, load, serialize in backends:
+        model = load()
+        run(model, 1, 1, serialize)  # warm up
+        for sessions in args.sessions:
+            result = run(model, sessions, args.steps, serialize)
+            print(f"{name:>33} {sessions:>3} sessions: {result['tokens_per_second']:8.1f} tokens/s  "
+                  f"step latency p50={result['latency_p50'] * 1e3:8.1f}ms p95={result['latency_p95'] * 1e3:8.1f}ms  "
+                  f"first token p50={result['first_token_p50'] * 1e3:8.1f}ms")
+        if hasattr(model, "batch_stats"):
+            print(f"{'':>33}  {model.batch_stats()}")
+        del model
+
+
+if __name__ == "__main__":
+    main()
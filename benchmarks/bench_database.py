@@ -0,0 +1,111 @@
+"""Micro-benchmark for the pooled SQLite connection layer in utils/database.py.
+
+Compares the per-call latency of the old connect-per-call implementation
+with the pooled connections, while several threads play the part of the
+MCP server (adding meals and reading them back) and the Gradio tabs
+(refreshing the full meals table).
+
+Run from the repository root:
+    python -m benchmarks.bench_database --threads 8 --calls 500
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from utils import database
+
+
+def legacy_initialize_database(db_name: str) -> None:
+    with sqlite3.connect(db_name) as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS meals (
+                id INTEGER PRIMARY KEY,
+                meal_name TEXT NOT NULL,
+                grocery_items TEXT,
+                able_to_make_more_for_lunch BOOLEAN,
+                cuisine TEXT
+            )
+        ''')
+        conn.commit()
+
+
+def legacy_get_all_meal_records_from_db(db_name: str) -> list:
+    legacy_initialize_database(db_name)
+    with sqlite3.connect(db_name) as conn:
+        return conn.execute('SELECT * FROM meals').fetchall()
+
+
+def legacy_add_meal_to_db(meal_name, grocery_items, able_to_make_more_for_lunch, cuisine, db_name) -> None:
+    legacy_initialize_database(db_name)
+    with sqlite3.connect(db_name) as conn:
+        conn.execute('''
+            INSERT INTO meals (meal_name, grocery_items, able_to_make_more_for_lunch, cuisine)
+            VALUES (?, ?, ?, ?)
+        ''', (meal_name, grocery_items, able_to_make_more_for_lunch, cuisine))
+        conn.commit()
+
+
+IMPLEMENTATIONS = {
+    "legacy": (legacy_get_all_meal_records_from_db, legacy_add_meal_to_db),
+    "pooled": (database.get_all_meal_records_from_db, database.add_meal_to_db),
+}
+
+
+def run_workload(name: str, db_name: str, threads: int, calls: int, seed_meals: int) -> list:
+    read_fn, add_fn = IMPLEMENTATIONS[name]
+    for i in range(seed_meals):
+        add_fn(f"Seed meal {i}", "Rice, Onion, Garlic", i % 2 == 0, "Indian", db_name)
+
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def worker(worker_id: int) -> None:
+        local = []
+        for i in range(calls):
+            start = time.perf_counter()
+            # Odd workers behave like the MCP server, even workers like Gradio refreshes.
+            if worker_id % 2 and i % 4 == 0:
+                add_fn(f"Meal {worker_id}-{i}", "Pasta, Tomato", True, "Italian", db_name)
+            else:
+                read_fn(db_name)
+            local.append(time.perf_counter() - start)
+        with latencies_lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies
+
+
+def summarize(name: str, latencies: list, elapsed: float) -> str:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1e6
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1e6
+    return f"{name:>7}: {len(latencies)} calls in {elapsed:.2f}s  p50={p50:.0f}us  p95={p95:.0f}us"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=500, help="Calls per thread.")
+    parser.add_argument("--seed-meals", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in IMPLEMENTATIONS:
+            db_name = os.path.join(tmp_dir, f"{name}.db")
+            start = time.perf_counter()
+            latencies = run_workload(name, db_name, args.threads, args.calls, args.seed_meals)
+            print(summarize(name, latencies, time.perf_counter() - start))
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
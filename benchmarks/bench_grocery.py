@@ -0,0 +1,94 @@
+"""Benchmark of the grocery list aggregation in utils/database.py.
+
+Saves weekly plans for several households on a synthetic catalog, then
+compares database.get_grocery_list, which adds up the ingredient vectors
+stored with every meal in one SQL query, with reading the planned meals'
+grocery_items strings and parsing and counting them in Python.
+
+Run from the repository root:
+    python -m benchmarks.bench_grocery --weeks 1 4 52 --households 1 10
+"""
+import argparse
+import collections
+import datetime
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from utils import database
+
+INGREDIENTS = ["Spinach", "Paneer", "Onion", "Tomatoes", "Garlic", "Rice", "Lentils", "Chicken", "Tofu", "Pasta",
+               "Cheese", "Potato", "Carrot", "Peas"] + [f"Spice {i}" for i in range(300)]
+QUANTITIES = ["", "2 ", "200 g ", "1/2 cup ", "1 kg ", "3 cloves "]
+FIRST_WEEK = datetime.date(2025, 1, 6)
+
+
+def synthetic_meals(size: int, rng: random.Random) -> list:
+    return [(f"Meal {i}", ", ".join(rng.choice(QUANTITIES) + item for item in rng.sample(INGREDIENTS, 6)),
+             rng.random() < 0.4, "Indian") for i in range(size)]
+
+
+def save_plans(meal_names: list, weeks: int, households: int, rng: random.Random, db_name: str) -> None:
+    for week in range(weeks):
+        week_start = (FIRST_WEEK + datetime.timedelta(weeks=week)).isoformat()
+        for household in range(households):
+            database.save_meal_plan(rng.choices(meal_names, k=7), rng.choices(meal_names, k=7), week_start,
+                                    db_name, household=f"household {household}")
+
+
+def python_grocery_list(start_date: str, end_date: str, db_name: str) -> list:
+    """Add up the grocery items of every planned meal by parsing grocery_items, without the ingredient vectors."""
+    conn = database.get_connection(db_name)
+    entries = conn.execute('''
+        SELECT meal_plan_entries.meal_name, meals.grocery_items
+        FROM meal_plan_entries
+        JOIN meal_plans ON meal_plans.id = meal_plan_entries.plan_id
+        JOIN meals ON meals.meal_name = meal_plan_entries.meal_name
+        WHERE plan_id IN (SELECT MAX(id) FROM meal_plans WHERE week_start BETWEEN ? AND ? GROUP BY household, week_start)
+    ''', (start_date, end_date)).fetchall()
+    totals = collections.Counter()
+    for _, grocery_items in entries:
+        for name, quantity, unit in database.parse_grocery_items(grocery_items):
+            totals[(name, unit)] += quantity
+    return sorted((name, quantity, unit) for (name, unit), quantity in totals.items())
+
+
+def p50_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e3
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals", type=int, default=10000)
+    parser.add_argument("--weeks", type=int, nargs="+", default=[1, 4, 52])
+    parser.add_argument("--households", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    meals = synthetic_meals(args.meals, rng)
+    meal_names = [meal[0] for meal in meals]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for households in args.households:
+            db_name = os.path.join(tmp_dir, f"grocery_{households}.db")
+            database.add_meals_to_db(meals, db_name)
+            save_plans(meal_names, max(args.weeks), households, rng, db_name)
+            for weeks in args.weeks:
+                start_date = FIRST_WEEK.isoformat()
+                end_date = (FIRST_WEEK + datetime.timedelta(weeks=weeks, days=-1)).isoformat()
+                engine = p50_ms(lambda: database.get_grocery_list(start_date, end_date, db_name=db_name), args.repeat)
+                python = p50_ms(lambda: python_grocery_list(start_date, end_date, db_name), args.repeat)
+                print(f"{weeks:>3} weeks x {households:>3} households ({weeks * households * 14:>6} meals): "
+                      f"get_grocery_list p50={engine:8.3f}ms  parse in Python p50={python:8.3f}ms")
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
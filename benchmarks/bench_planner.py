@@ -0,0 +1,56 @@
+"""Benchmark for the deterministic meal plan generator in utils/planner.py.
+
+Times plan generation on synthetic catalogs of increasing size, both on
+an in-memory list of meals and end to end from a SQLite database.
+
+Run from the repository root:
+    python -m benchmarks.bench_planner --sizes 100 10000 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from utils import database, planner
+
+CUISINES = ["Indian", "Italian", "Mexican", "Thai", "Chinese", "Japanese", "Greek", "French", "Korean", "Ethiopian"]
+
+
+def synthetic_meals(size: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [(f"Meal {i}", rng.random() < 0.4, rng.choice(CUISINES)) for i in range(size)]
+
+
+def time_calls(fn, repeat: int) -> list:
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            meals = synthetic_meals(size)
+            in_memory = time_calls(lambda seed: planner.generate_meal_plan(meals, seed=seed), args.repeat)
+
+            db_name = os.path.join(tmp_dir, f"planner_{size}.db")
+            database.add_meals_to_db([(name, "Rice, Onion", lunch, cuisine) for name, lunch, cuisine in meals], db_name)
+            from_db = time_calls(lambda seed: planner.generate_meal_plan_from_db(seed=seed, db_name=db_name), args.repeat)
+
+            print(f"{size:>8} meals: in-memory p50={statistics.median(in_memory) * 1e3:.2f}ms  "
+                  f"from database p50={statistics.median(from_db) * 1e3:.2f}ms")
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
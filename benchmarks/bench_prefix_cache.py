@@ -0,0 +1,78 @@
+"""Time-to-first-token benchmark for the prefix key/value cache in utils/local_models.py.
+
+Replays agent conversations against a local model: every step sends the
+agent's real system prompt (prompt_templates.yaml rendered with the meal
+planner tools), the task and the previous steps, like CodeAgent does. The
+time to the first streamed token is compared between TransformersModel and
+PrefixCachedTransformersModel.
+
+The default 30B model takes long to prefill on a CPU; pass a smaller model
+to get quick numbers:
+    python -m benchmarks.bench_prefix_cache --model-id HuggingFaceTB/SmolLM2-360M-Instruct
+"""
+import argparse
+import statistics
+import time
+
+from smolagents import TransformersModel
+
+from utils import agent as agent_utils
+from utils.local_models import PrefixCachedTransformersModel
+from utils.local_tools import get_local_tools
+
+TASKS = [
+    "Fetch all the meals from the database",
+    "Generate a meal plan for the week",
+    "Add a new meal Rajma with Kidney beans, Onion, Tomato to the database",
+]
+
+
+def text_message(role: str, text: str) -> dict:
+    return {"role": role, "content": [{"type": "text", "text": text}]}
+
+
+def render_system_prompt(model) -> str:
+    return agent_utils.create_agent(get_local_tools(), model).system_prompt
+
+
+def replay(model, system_prompt: str, sessions: int, steps: int) -> list:
+    """Run the conversations and return the time to first token of every step."""
+    timings = []
+    for session in range(sessions):
+        messages = [text_message("system", system_prompt), text_message("user", f"New task:\n{TASKS[session % len(TASKS)]}")]
+        for step in range(steps):
+            start = time.perf_counter()
+            first_token = None
+            output = []
+            for delta in model.generate_stream(messages, stop_sequences=["<end_code>", "Observation:"]):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                output.append(delta.content or "")
+            timings.append(first_token if first_token is not None else time.perf_counter() - start)
+            messages.append(text_message("assistant", "".join(output)))
+            messages.append(text_message("user", f"Observation:\nExecution logs:\nstep {step} done"))
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-id", default=agent_utils.MODEL_ID)
+    parser.add_argument("--sessions", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    for name, model_class in (("TransformersModel", TransformersModel),
+                              ("PrefixCachedTransformersModel", PrefixCachedTransformersModel)):
+        model = model_class(model_id=args.model_id, device_map="cpu", max_new_tokens=args.max_new_tokens)
+        system_prompt = render_system_prompt(model)
+        timings = replay(model, system_prompt, args.sessions, args.steps)
+        print(f"{name:>30}: time to first token p50={statistics.median(timings) * 1e3:9.1f}ms  "
+              f"first step={timings[0] * 1e3:9.1f}ms  later steps mean={statistics.mean(timings[1:]) * 1e3:9.1f}ms")
+        if hasattr(model, "cache_stats"):
+            print(f"{'':>30}  {model.cache_stats()}")
+        del model
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark of the FTS5 meal search in utils/database.py.
+
+Compares database.search_meals with the LIKE query the agent used to write
+for ingredient questions, on synthetic catalogs of increasing size.
+
+Run from the repository root:
+    python -m benchmarks.bench_search --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from utils import database
+
+INGREDIENTS = ["Spinach", "Paneer", "Onion", "Tomatoes", "Garlic", "Rice", "Lentils", "Chicken", "Tofu", "Pasta",
+               "Cheese", "Potato", "Carrot", "Peas"] + [f"Spice {i}" for i in range(300)]
+CUISINES = ["Indian", "Italian", "Mexican", "Thai", "Chinese", "Japanese", "Greek", "French", "Korean", "Ethiopian"]
+QUERIES = [("spinach paneer", ["%spinach%", "%paneer%"]), ("lentils", ["%lentils%"])]
+
+
+def synthetic_meals(size: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [(f"Meal {i}", ", ".join(rng.sample(INGREDIENTS, 6)), rng.random() < 0.4, rng.choice(CUISINES))
+            for i in range(size)]
+
+
+def p50_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e3
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            db_name = os.path.join(tmp_dir, f"search_{size}.db")
+            database.add_meals_to_db(synthetic_meals(size), db_name)
+            conn = database.get_connection(db_name)
+            for query, patterns in QUERIES:
+                like_sql = "SELECT * FROM meals WHERE " + " AND ".join(["grocery_items LIKE ?"] * len(patterns)) + " LIMIT 10"
+                fts = p50_ms(lambda: database.search_meals(query, 10, db_name), args.repeat)
+                like = p50_ms(lambda: conn.execute(like_sql, patterns).fetchall(), args.repeat)
+                print(f"{size:>8} meals, {query!r:>16}: search_meals p50={fts:7.3f}ms  LIKE p50={like:7.3f}ms")
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Startup-time benchmark for the app.
+
+Starts the app in a fresh interpreter, in both startup modes, and measures
+from the moment the process is spawned
+- how long until the Gradio UI answers HTTP requests, and
+- how long until the agent pool is loaded and chat requests can run.
+
+With MEALPLAN_STARTUP_MODE=blocking the UI is only served once the agent is
+loaded; with "background" the tables are served while the agent loads.
+
+Loading the real model can take many minutes, so by default the model load
+is simulated with a sleep of --model-load-seconds. Pass --real-model to load
+the model configured with MEALPLAN_MODEL_TYPE and MODEL_ID instead.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup --model-load-seconds 30
+"""
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Mirrors app.main(), on a given port and without blocking the process
+APP_SNIPPET = """
+import sys, time
+import utils.agent as agent_utils
+
+mode, port, model_load_seconds = sys.argv[1], int(sys.argv[2]), float(sys.argv[3])
+if model_load_seconds >= 0:
+    agent_utils.initialize_model = lambda: time.sleep(model_load_seconds) or object()
+
+agent_pool = agent_utils.start_agent_pool(tool_mode="local")
+import utils.gradio_ui as gradio_ui
+if mode == "blocking":
+    agent_pool.wait()
+demo = gradio_ui.get_gradio_interface(agent_pool)
+demo.launch(server_port=port, prevent_thread_lock=True, quiet=True)
+agent_pool.wait()
+print("AGENT READY", flush=True)
+time.sleep(3600)
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serving(port: int) -> bool:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def measure(mode: str, work_dir: str, model_load_seconds: float, timeout: float) -> tuple:
+    """Return the seconds until the UI is served and until the agent is ready."""
+    port = free_port()
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT, "GRADIO_ANALYTICS_ENABLED": "False", "MEALPLAN_TRACING": "0"}
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", APP_SNIPPET, mode, str(port), str(model_load_seconds)],
+                               cwd=work_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        ui_seconds = None
+        while ui_seconds is None:
+            if process.poll() is not None:
+                raise RuntimeError(f"The app exited with code {process.returncode}")
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"The UI was not served within {timeout}s")
+            if serving(port):
+                ui_seconds = time.perf_counter() - start
+            else:
+                time.sleep(0.05)
+        # The snippet prints this line once the agent pool is loaded, which is always after launch
+        for line in process.stdout:
+            if line.startswith("AGENT READY"):
+                break
+        return ui_seconds, time.perf_counter() - start
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-load-seconds", type=float, default=20.0)
+    parser.add_argument("--real-model", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=3600.0)
+    args = parser.parse_args()
+    model_load_seconds = -1 if args.real_model else args.model_load_seconds
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        shutil.copy(os.path.join(REPO_ROOT, "meal_plan.json"), work_dir)
+        for mode in ("blocking", "background"):
+            timings = [measure(mode, work_dir, model_load_seconds, args.timeout) for _ in range(args.repeat)]
+            ui_seconds = sorted(ui for ui, _ in timings)[len(timings) // 2]
+            agent_seconds = sorted(agent for _, agent in timings)[len(timings) // 2]
+            print(f"{mode:>10}: UI served after {ui_seconds:6.2f}s, agent ready after {agent_seconds:6.2f}s (median of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
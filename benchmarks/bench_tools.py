@@ -0,0 +1,138 @@
+"""Benchmark of the two ways the agent can reach the meal planner tools.
+
+- "mcp": the tools run in an MCP server subprocess and every call is a
+  JSON-RPC request over stdio (MEALPLAN_TOOL_MODE=mcp).
+- "local": the same tool functions are bound in process (MEALPLAN_TOOL_MODE=local).
+
+Startup is the time until the tools are available: spawning the server,
+the MCP handshake and listing the tools, versus importing the server
+module and building the in-process tools (measured in a fresh interpreter
+that has already imported smolagents, like the app).
+Per-call latency is measured for a few read tools on a synthetic database.
+
+The server is started with the current Python interpreter by default; pass
+--server-command "uv run --with mcp mcp run" to include the environment
+resolution that the app performs at startup.
+
+Run from the repository root:
+    python -m benchmarks.bench_tools --meals 1000 --calls 200
+"""
+import argparse
+import asyncio
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+from utils import database
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPT = os.path.join(REPO_ROOT, "utils", "mcp_server.py")
+TOOL_CALLS = [
+    ("get_all_meal_names_from_db", {}),
+    ("read_meal_records", {"page_size": 50}),
+    ("read_all_meal_records_from_db", {}),
+]
+# smolagents is imported before the clock starts, since the app has it loaded either way
+LOCAL_STARTUP_SNIPPET = """
+import time
+import smolagents
+start = time.perf_counter()
+from utils.local_tools import get_local_tools
+get_local_tools()
+print(time.perf_counter() - start)
+"""
+
+
+def summarize(timings: list) -> str:
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return f"p50={statistics.median(timings) * 1e3:8.3f}ms  p95={p95 * 1e3:8.3f}ms"
+
+
+def seed_database(db_name: str, size: int) -> None:
+    database.add_meals_to_db([(f"Meal {i}", "Rice, Onion, Tomato", i % 3 == 0, "Indian") for i in range(size)], db_name)
+    database.close_connections()
+
+
+async def bench_mcp(server_command: list, work_dir: str, calls: int, startups: int) -> tuple:
+    parameters = StdioServerParameters(command=server_command[0], args=server_command[1:] + [SERVER_SCRIPT],
+                                       env={**os.environ, "PYTHONPATH": REPO_ROOT}, cwd=work_dir)
+    startup_timings = []
+    call_timings = {}
+    devnull = open(os.devnull, "w")  # The server logs every request to stderr
+    for run in range(startups):
+        start = time.perf_counter()
+        async with stdio_client(parameters, errlog=devnull) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                await session.list_tools()
+                startup_timings.append(time.perf_counter() - start)
+                if run:
+                    continue
+                for name, arguments in TOOL_CALLS:
+                    timings = call_timings[name] = []
+                    for _ in range(calls):
+                        start = time.perf_counter()
+                        await session.call_tool(name, arguments)
+                        timings.append(time.perf_counter() - start)
+    devnull.close()
+    return startup_timings, call_timings
+
+
+def bench_local(work_dir: str, calls: int, startups: int) -> tuple:
+    startup_timings = []
+    for _ in range(startups):
+        output = subprocess.run([sys.executable, "-c", LOCAL_STARTUP_SNIPPET], cwd=work_dir, check=True,
+                                capture_output=True, text=True, env={**os.environ, "PYTHONPATH": REPO_ROOT})
+        startup_timings.append(float(output.stdout.strip().splitlines()[-1]))
+
+    from utils.local_tools import get_local_tools
+
+    cwd = os.getcwd()
+    os.chdir(work_dir)  # The tools use the database in the working directory, like the server does
+    try:
+        tools = {tool.name: tool for tool in get_local_tools()}
+        call_timings = {}
+        for name, arguments in TOOL_CALLS:
+            timings = call_timings[name] = []
+            for _ in range(calls):
+                start = time.perf_counter()
+                tools[name](**arguments)
+                timings.append(time.perf_counter() - start)
+        database.close_connections()
+    finally:
+        os.chdir(cwd)
+    return startup_timings, call_timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals", type=int, default=1000)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--startups", type=int, default=5)
+    parser.add_argument("--server-command", default=shlex.quote(sys.executable),
+                        help="The command the server script is appended to.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        seed_database(os.path.join(work_dir, "meals_database.db"), args.meals)
+        results = {
+            "mcp": asyncio.run(bench_mcp(shlex.split(args.server_command), work_dir, args.calls, args.startups)),
+            "local": bench_local(work_dir, args.calls, args.startups),
+        }
+
+    for mode, (startup_timings, call_timings) in results.items():
+        print(f"{mode:>5} startup{'':23}{summarize(startup_timings)}")
+        for name, timings in call_timings.items():
+            print(f"{mode:>5} {name:<30}{summarize(timings)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""A scripted stand-in for the LLM, to time full agent runs without a model.
+
+`ScriptedModel` answers every step of a CodeAgent run with a fixed code
+action chosen from the task, so agent runs are deterministic and the
+measured time is the agent loop itself: prompt rendering, code parsing and
+execution, the tool calls and memory handling.
+"""
+import re
+from typing import Generator
+
+from smolagents import ChatMessage, ChatMessageStreamDelta, MessageRole, Model, TokenUsage
+
+# The code actions the model takes for a task, one per step. The last one calls final_answer.
+SCRIPTS = {
+    "list_meals": [
+        "meals = read_all_meal_records_from_db()\nprint(meals[:2000])",
+        "final_answer(meals[:2000])",
+    ],
+    "show_plan": [
+        "plan = read_meal_plan()\nprint(plan)",
+        "final_answer(plan)",
+    ],
+    "generate_plan": [
+        "plan = generate_meal_plan(seed=0)\nprint(plan)",
+        "final_answer(plan)",
+    ],
+    "add_meal": [
+        "print(search_meals(query={meal_name!r}))",
+        "result = add_meal_to_db(meal_name={meal_name!r}, grocery_items={grocery_items!r}, "
+        "able_to_make_more_for_lunch=False, cuisine='Indian')\nprint(result)",
+        "final_answer(result)",
+    ],
+    "grocery_list": [
+        "groceries = get_grocery_list()\nprint(groceries)",
+        "final_answer(groceries)",
+    ],
+    "search_meals": [
+        "meals = search_meals(query={query!r})\nprint(meals)",
+        "final_answer(meals)",
+    ],
+    "other": [
+        "names = get_all_meal_names_from_db()\nprint(names[:500])",
+        "final_answer('I looked at the meals in the database: ' + names[:200])",
+    ],
+}
+_ADD_MEAL = re.compile(r"add .*?(?:meal|dish) (?:called |named )?(?P<meal_name>.+?) with (?P<grocery_items>.+)", re.IGNORECASE)
+_SEARCH = re.compile(r"what can i (?:make|cook) with (?P<query>.+)", re.IGNORECASE)
+
+
+def script_for(task: str) -> tuple:
+    """Return the name of the script the model follows for a task and the values filled into it."""
+    text = task.lower()
+    match = _ADD_MEAL.search(task)
+    if match:
+        return "add_meal", {"meal_name": match["meal_name"].strip(), "grocery_items": match["grocery_items"].strip(" .")}
+    match = _SEARCH.search(task)
+    if match:
+        return "search_meals", {"query": match["query"].strip(" ?")}
+    if "grocery" in text or "shopping" in text:
+        return "grocery_list", {}
+    if "generate" in text or "create" in text:
+        return "generate_plan", {}
+    if "plan" in text:
+        return "show_plan", {}
+    if "meals" in text:
+        return "list_meals", {}
+    return "other", {}
+
+
+def _text(content) -> str:
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+class ScriptedModel(Model):
+    """A smolagents Model that plays back the script of the task it is given."""
+
+    def __init__(self, **kwargs):
+        super().__init__(model_id="scripted", **kwargs)
+        self.calls = 0
+
+    def _next_action(self, messages: list) -> str:
+        task = ""
+        steps = 0
+        for message in messages:
+            role = message.role if isinstance(message, ChatMessage) else message["role"]
+            content = message.content if isinstance(message, ChatMessage) else message["content"]
+            role = str(getattr(role, "value", role))
+            if role == MessageRole.USER.value and not task and "New task" in _text(content):
+                task = _text(content).split("New task:", 1)[-1].strip()
+            elif role == MessageRole.ASSISTANT.value:
+                steps += 1
+        name, values = script_for(task)
+        script = SCRIPTS[name]
+        code = script[min(steps, len(script) - 1)].format(**values)
+        self.calls += 1
+        return f"Thought: Step {steps + 1} of the {name} script.\n<code>\n{code}\n</code>"
+
+    def generate(self, messages: list, stop_sequences: list = None, response_format: dict = None,
+                 tools_to_call_from: list = None, **kwargs) -> ChatMessage:
+        content = self._next_action(messages)
+        return ChatMessage(role=MessageRole.ASSISTANT, content=content, raw=content,
+                           token_usage=TokenUsage(input_tokens=0, output_tokens=len(content.split())))
+
+    def generate_stream(self, messages: list, stop_sequences: list = None, response_format: dict = None,
+                        tools_to_call_from: list = None, **kwargs) -> Generator:
+        content = self._next_action(messages)
+        yield ChatMessageStreamDelta(content=content,
+                                     token_usage=TokenUsage(input_tokens=0, output_tokens=len(content.split())))
@@ -0,0 +1,511 @@
+"""Reproducible performance benchmark suite.
+
+`run` builds a synthetic database (benchmarks/synthetic.py) for every
+catalog size and times
+- every function of utils/database.py, checking the grocery totals of a
+  plan with a leftover lunch first,
+- every MCP tool of utils/mcp_server.py, called directly and over stdio
+  through an MCP server subprocess,
+- the three display_* table builders of utils/gradio_ui.py, with a cold
+  and a warm table cache,
+- full agent runs driven by the scripted model of benchmarks/mock_model.py,
+- the intent router of utils/intent_router.py on a set of chat messages,
+  reporting its hit rate and the chat latency with and without it, and
+  checking that its grocery list matches the Grocery List tab,
+- cache hits of the model response cache of utils/llm_cache.py, for a text
+  response and a tool call response, which must come back unchanged.
+
+Results are written as JSON. `compare` reads two result files and flags
+every benchmark whose median got slower by more than --threshold; it exits
+with status 1 if there is any regression.
+
+cleanup_database is not timed, since it deletes the catalog.
+
+Run from the repository root:
+    python -m benchmarks.suite run --sizes 10 1000 100000 --output results.json
+    python -m benchmarks.suite compare baseline.json results.json --threshold 0.25
+"""
+import argparse
+import asyncio
+import csv
+import datetime
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import synthetic
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPT = os.path.join(REPO_ROOT, "utils", "mcp_server.py")
+DB_NAME = "meals_database.db"  # The tools use this file in the working directory
+EXCLUDED = {"cleanup_database"}
+AGENT_TASKS = [
+    "Fetch all the meals from the database",
+    "Generate a meal plan for the week",
+    "Show this week's plan",
+    "Add a new Indian meal Bench Dal {n} with Lentils, Onion, Garlic",
+    "What can I make with spinach and paneer?",
+    "Show my grocery list",
+    "Which of my meals would suit a rainy day?",
+]
+# Chat messages for the intent router: the examples of the chat tab, simple variants and requests it must leave to the agent
+ROUTER_MESSAGES = [
+    "Fetch all the meals from the database",
+    "Add a new meal to the database",
+    "Generate a meal plan for the week",
+    "list meals",
+    "Show this week's plan",
+    "Add a new Indian meal Bench Rajma {n} with Kidney beans, Onion, Tomato",
+    "add meal Bench Poha {n} with Rice flakes, Peanuts",
+    "What can I make with spinach and paneer?",
+    "Show my grocery list",
+    "Generate a meal plan for next week with Rajma on Monday",
+    "Which of my meals would suit a rainy day?",
+    "Fetch all the Italian meals",
+]
+
+
+def measure(fn, repeat: int, budget_seconds: float, setup=None) -> dict:
+    """Time fn repeat times, or fewer once budget_seconds have been spent.
+    Args:
+        fn: The function to time. It is called with the arguments returned by setup, if given.
+        repeat (int): The maximum number of runs.
+        budget_seconds (float): Stop after the run that exceeds this total time.
+        setup: Called before every run, outside of the timing, to build fresh arguments.
+    Returns:
+        dict: {"p50_ms", "p95_ms", "runs"}.
+    """
+    timings = []
+    spent = 0.0
+    while len(timings) < repeat and spent < budget_seconds:
+        arguments = setup() if setup else {}
+        start = time.perf_counter()
+        fn(**arguments)
+        timings.append(time.perf_counter() - start)
+        spent += timings[-1]
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings) * 1e3, 4),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1e3, 4),
+        "runs": len(timings),
+    }
+
+
+# Meals added by the write benchmarks are numbered from here, far above any catalog
+_new_meal_batches = itertools.count()
+NEW_MEALS_START = 10 ** 7
+_new_plans = itertools.count(1)
+
+
+def new_meals(count: int = 1) -> list:
+    """Return meals that are not in the catalog yet, a different batch on every call."""
+    return list(synthetic.synthetic_meals(count, start=NEW_MEALS_START + next(_new_meal_batches) * 1000))
+
+
+def new_plan(size: int) -> dict:
+    """Return the arguments of a new weekly plan of catalog meals."""
+    _, _, lunch, dinner = next(synthetic.synthetic_plans(size, 1, seed=next(_new_plans)))
+    return {"lunch_list": lunch, "dinner_list": dinner}
+
+
+def new_meal() -> dict:
+    meal_name, grocery_items, leftovers, cuisine = new_meals()[0]
+    return {"meal_name": meal_name, "grocery_items": grocery_items, "able_to_make_more_for_lunch": leftovers,
+            "cuisine": cuisine}
+
+
+def database_cases(size: int, work_dir: str) -> dict:
+    """Return {function name: (function, setup)} for every function of utils/database.py."""
+    from utils import database
+
+    return {
+        "get_connection": (database.get_connection, None),
+        "get_data_version": (database.get_data_version, None),
+        "parse_grocery_items": (lambda: database.parse_grocery_items("200 g Paneer, Spinach, 2 Onions, 1/2 cup Rice"), None),
+        "week_start_of": (database.week_start_of, None),
+        "execute_query_on_database": (lambda: database.execute_query_on_database(
+            "SELECT cuisine, COUNT(*) FROM meals GROUP BY cuisine", []), None),
+        "get_all_meal_records_from_db": (database.get_all_meal_records_from_db, None),
+        "add_meal_to_db": (database.add_meal_to_db, new_meal),
+        "add_meals_to_db": (database.add_meals_to_db, lambda: {"meals": new_meals(100)}),
+        "get_all_meal_names": (database.get_all_meal_names, None),
+        "get_cuisines": (database.get_cuisines, None),
+        "iter_meal_records": (lambda: sum(len(batch) for batch in database.iter_meal_records()), None),
+        "get_meal_records_page": (lambda: database.get_meal_records_page(size // 2, 50), None),
+        "meal_exists": (lambda: database.meal_exists(synthetic.meal_name(size // 2)), None),
+        "search_meals": (lambda: database.search_meals("spinach paneer"), None),
+        "save_meal_plan": (database.save_meal_plan, lambda: new_plan(size)),
+        "get_meal_plan": (database.get_meal_plan, None),
+        "get_recently_served_meals": (lambda: database.get_recently_served_meals(4), None),
+        "get_meals_not_served_in_weeks": (lambda: database.get_meals_not_served_in_weeks(4), None),
+        "get_plan_grocery_list": (database.get_plan_grocery_list, None),
+        "get_grocery_list": (lambda: database.get_grocery_list(
+            (datetime.date.today() - datetime.timedelta(weeks=8)).isoformat(), datetime.date.today().isoformat()), None),
+    }
+
+
+def tool_cases(size: int, work_dir: str) -> dict:
+    """Return {tool name: function returning fresh arguments} for every MCP tool but the excluded ones."""
+    from utils import mcp_server
+
+    import_files = itertools.count()
+    # The tools only accept files in their data directory, relative to the working directory
+    data_dir = os.path.join(work_dir, mcp_server.DATA_DIR)
+    os.makedirs(data_dir, exist_ok=True)
+
+    def import_file() -> dict:
+        file_name = f"import_{next(import_files)}.csv"
+        with open(os.path.join(data_dir, file_name), "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["meal_name", "grocery_items", "able_to_make_more_for_lunch", "cuisine"])
+            writer.writerows(new_meals(100))
+        return {"file_path": file_name}
+
+    return {
+        "read_meal_records": lambda: {"page_size": 50},
+        "search_meals": lambda: {"query": "spinach paneer"},
+        "read_all_meal_records_from_db": lambda: {},
+        "get_all_meal_names_from_db": lambda: {},
+        "add_meal_to_db": new_meal,
+        "import_meals": import_file,
+        "export_meals": lambda: {"file_path": "export.jsonl"},
+        "write_meal_plan_to_json_file": lambda: new_plan(size),
+        "generate_meal_plan": lambda: {"seed": 0},
+        "read_meal_plan": lambda: {},
+        "get_grocery_list": lambda: {},
+        "get_meals_not_served_recently": lambda: {"weeks": 4},
+        "execute_query_on_database": lambda: {"sql_query": "SELECT cuisine, COUNT(*) FROM meals GROUP BY cuisine",
+                                              "sql_query_args": []},
+    }
+
+
+# A plan with one leftover lunch: Monday's Dal dinner is made in a larger quantity for Tuesday's lunch
+LEFTOVER_MEALS = [("Dal", "200 g Lentils, Onion", True, "Indian"), ("Pasta", "100 g Pasta", False, "Italian")]
+LEFTOVER_PLAN = (["Pasta", "Dal"] + ["Pasta"] * 5, ["Dal"] + ["Pasta"] * 6)
+# The leftover lunch is a second portion cooked with the dinner, so Dal counts twice
+LEFTOVER_GROCERY_LIST = [("Lentils", 400, "g"), ("Onion", 2, ""), ("Pasta", 1200, "g")]
+
+
+def _check_leftover_grocery_totals(work_dir: str) -> None:
+    """Check that the grocery lists count a leftover lunch as a second portion of the previous day's dinner."""
+    from utils import database
+
+    db_name = os.path.join(work_dir, "leftovers.db")
+    database.add_meals_to_db(LEFTOVER_MEALS, db_name)
+    database.save_meal_plan(*LEFTOVER_PLAN, week_start="2025-01-06", db_name=db_name)
+    for name, grocery_list in (
+            ("get_plan_grocery_list", database.get_plan_grocery_list("2025-01-06", db_name=db_name)),
+            ("get_grocery_list", database.get_grocery_list("2025-01-06", db_name=db_name))):
+        if grocery_list != LEFTOVER_GROCERY_LIST:
+            raise RuntimeError(f"{name} of a plan with a leftover lunch is {grocery_list}, not {LEFTOVER_GROCERY_LIST}")
+
+
+def bench_database(size: int, work_dir: str, args) -> dict:
+    """Time every function of utils/database.py, after checking the grocery totals of a plan with a leftover lunch."""
+    _check_leftover_grocery_totals(work_dir)
+    results = {}
+    for name, (fn, setup) in database_cases(size, work_dir).items():
+        results[f"database/{name}"] = measure(fn, args.repeat, args.budget, setup)
+    return results
+
+
+def _registered_tools() -> list:
+    from utils import mcp_server
+    return [tool.name for tool in mcp_server.mcp._tool_manager.list_tools() if tool.name not in EXCLUDED]
+
+
+def bench_tools_direct(size: int, work_dir: str, args) -> dict:
+    from utils import mcp_server
+
+    cases = tool_cases(size, work_dir)
+    results = {}
+    for name in _registered_tools():
+        if name not in cases:
+            print(f"No arguments for the tool {name}, skipping it", file=sys.stderr)
+            continue
+        results[f"tool_direct/{name}"] = measure(getattr(mcp_server, name), args.repeat, args.budget, cases[name])
+    return results
+
+
+async def _bench_tools_stdio(size: int, work_dir: str, args) -> dict:
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    parameters = StdioServerParameters(command=sys.executable, args=[SERVER_SCRIPT], cwd=work_dir,
+                                       env={**os.environ, "PYTHONPATH": REPO_ROOT, "MEALPLAN_TRACING": "0"})
+    cases = tool_cases(size, work_dir)
+    results = {}
+    with open(os.devnull, "w") as devnull:  # The server logs every request to stderr
+        async with stdio_client(parameters, errlog=devnull) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                tools = [tool.name for tool in (await session.list_tools()).tools if tool.name not in EXCLUDED]
+                for name in tools:
+                    if name not in cases:
+                        print(f"No arguments for the tool {name}, skipping it", file=sys.stderr)
+                        continue
+                    timings = []
+                    spent = 0.0
+                    while len(timings) < args.repeat and spent < args.budget:
+                        arguments = cases[name]()
+                        start = time.perf_counter()
+                        result = await session.call_tool(name, arguments)
+                        timings.append(time.perf_counter() - start)
+                        spent += timings[-1]
+                        if result.isError:
+                            raise RuntimeError(f"{name} failed: {result.content}")
+                    timings.sort()
+                    results[f"tool_stdio/{name}"] = {
+                        "p50_ms": round(statistics.median(timings) * 1e3, 4),
+                        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1e3, 4),
+                        "runs": len(timings),
+                    }
+    return results
+
+
+def bench_tools_stdio(size: int, work_dir: str, args) -> dict:
+    return asyncio.run(_bench_tools_stdio(size, work_dir, args))
+
+
+def bench_display(size: int, work_dir: str, args) -> dict:
+    from utils import gradio_ui
+
+    results = {}
+    for name in ("display_meals", "display_plan", "display_grocery_list"):
+        fn = getattr(gradio_ui, name)
+        results[f"display/{name}/cold"] = measure(fn, args.repeat, args.budget, lambda: gradio_ui.table_cache.invalidate() or {})
+        results[f"display/{name}/warm"] = measure(fn, args.repeat, args.budget)
+    return results
+
+
+def _agent():
+    from rich.console import Console
+    from smolagents.monitoring import LogLevel
+
+    from benchmarks.mock_model import ScriptedModel
+    from utils import agent as agent_utils
+    from utils.local_tools import get_local_tools
+
+    agent = agent_utils.create_agent(get_local_tools(), ScriptedModel())
+    agent.logger.level = LogLevel.OFF
+    # The streamed model output is rendered live on the logger's console
+    agent.logger.console = Console(file=open(os.devnull, "w"))
+    return agent
+
+
+def bench_agent(size: int, work_dir: str, args) -> dict:
+    agent = _agent()
+    results = {}
+    for task in AGENT_TASKS:
+        counter = itertools.count()
+        key = task.split("{")[0].strip().lower().replace(" ", "_").replace("?", "").replace("'", "")
+        results[f"agent/{key}"] = measure(lambda task: agent.run(task, reset=True), args.repeat, args.budget,
+                                          lambda: {"task": task.format(n=next(counter))})
+    return results
+
+
+def _check_routed_grocery_list() -> None:
+    """Check that the routed grocery list answer lists the rows of the Grocery List tab."""
+    from utils import gradio_ui, intent_router
+
+    answer = intent_router.answer("Show my grocery list")
+    if answer is None:
+        return  # The router is disabled
+    # The table rows of the answer, without the header and separator rows
+    rows = [line.strip("| ").split(" | ") for line in answer.splitlines() if line.startswith("| ")][2:]
+    routed = [(item, *(quantity.split(" ", 1) + [""])[:2]) for item, quantity in rows]
+    tab = list(gradio_ui.display_grocery_list().itertuples(index=False))[:intent_router.MAX_TABLE_ROWS]
+    if len(routed) != len(tab) or any(
+            (item, float(quantity), unit) != (tab_item.replace("|", "\\|"), float(tab_quantity), tab_unit)
+            for (item, quantity, unit), (tab_item, tab_quantity, tab_unit) in zip(routed, tab)):
+        raise RuntimeError(f"The routed grocery list does not match the Grocery List tab:\n{answer}")
+
+
+def bench_router(size: int, work_dir: str, args) -> dict:
+    """Time every router message on the router and on the agent, and the chat latency with and without the router.
+    The routed grocery list must match the Grocery List tab."""
+    from utils import intent_router
+
+    _check_routed_grocery_list()
+    agent = _agent()
+    counter = itertools.count()
+    routed = 0
+    with_router = []
+    without_router = []
+    for message in ROUTER_MESSAGES:
+        for _ in range(max(1, args.repeat // 4)):
+            text = message.format(n=next(counter))
+            start = time.perf_counter()
+            answer = intent_router.answer(text)
+            router_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            agent.run(message.format(n=next(counter)), reset=True)
+            agent_seconds = time.perf_counter() - start
+            routed += answer is not None
+            with_router.append(router_seconds if answer is not None else router_seconds + agent_seconds)
+            without_router.append(agent_seconds)
+    return {
+        "router/hit_rate": {"value": round(routed / len(with_router), 4)},
+        "router/chat_with_router": {"p50_ms": round(statistics.median(with_router) * 1e3, 4), "runs": len(with_router)},
+        "router/chat_agent_only": {"p50_ms": round(statistics.median(without_router) * 1e3, 4), "runs": len(without_router)},
+    }
+
+
+def _response_model(response):
+    from smolagents import Model
+
+    class FixedResponseModel(Model):
+        def generate(self, messages, stop_sequences=None, response_format=None, tools_to_call_from=None, **kwargs):
+            return response
+
+    return FixedResponseModel(model_id="fixed")
+
+
+def bench_llm_cache(size: int, work_dir: str, args) -> dict:
+    """Time cache hits of CachedModel, checking that the cached responses come back unchanged."""
+    from smolagents import ChatMessage, MessageRole, TokenUsage
+    from smolagents.models import ChatMessageToolCall, ChatMessageToolCallFunction
+
+    from utils.llm_cache import CachedModel, SQLiteLRUCache
+
+    responses = {
+        "text": ChatMessage(role=MessageRole.ASSISTANT, content="Thought: done.\n<code>\nfinal_answer('ok')\n</code>"),
+        "tool_call": ChatMessage(role=MessageRole.ASSISTANT, content=None, tool_calls=[ChatMessageToolCall(
+            id="call_0", type="function",
+            function=ChatMessageToolCallFunction(name="search_meals", arguments={"query": "spinach"}))]),
+    }
+    messages = [ChatMessage(role=MessageRole.USER, content="What can I make with spinach?")]
+    results = {}
+    for name, response in responses.items():
+        response.token_usage = TokenUsage(input_tokens=10, output_tokens=10)
+        model = CachedModel(_response_model(response), SQLiteLRUCache(":memory:"))
+        model.generate(messages)
+        cached = model.generate(messages)
+        if model.cache.hits != 1 or (cached.role, cached.content, cached.tool_calls) != (
+                response.role, response.content, response.tool_calls):
+            raise RuntimeError(f"The cached {name} response does not match the model response: {cached}")
+        results[f"llm_cache/hit_{name}"] = measure(lambda: model.generate(messages), args.repeat, args.budget)
+    return results
+
+
+SECTIONS = {
+    "database": bench_database,
+    "tools_direct": bench_tools_direct,
+    "tools_stdio": bench_tools_stdio,
+    "display": bench_display,
+    "agent": bench_agent,
+    "router": bench_router,
+    "llm_cache": bench_llm_cache,
+}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> None:
+    os.environ.setdefault("MEALPLAN_TRACING", "0")
+    from utils import database
+
+    output = {
+        "meta": {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "sizes": args.sizes,
+            "sections": args.sections,
+        },
+        "results": {},
+    }
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            work_dir = os.path.join(tmp_dir, f"catalog_{size}")
+            os.makedirs(work_dir)
+            start = time.perf_counter()
+            synthetic.build_database(os.path.join(work_dir, DB_NAME), size, args.weeks, args.households, args.seed)
+            print(f"Built a catalog of {size} meals in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+            os.chdir(work_dir)  # The tools and the tables use the database in the working directory
+            try:
+                for section in args.sections:
+                    for name, result in SECTIONS[section](size, work_dir, args).items():
+                        output["results"][f"{name}@{size}"] = result
+                        summary = "  ".join(f"{key}={value}" for key, value in result.items())
+                        print(f"{name + '@' + str(size):<60} {summary}")
+            finally:
+                database.close_connections()
+                os.chdir(cwd)
+    with open(args.output, "w") as results_file:
+        json.dump(output, results_file, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+def compare(args) -> int:
+    """Print the change of every benchmark between two result files and return 1 if any regressed."""
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        baseline = json.load(baseline_file)["results"]
+        current = json.load(current_file)["results"]
+    regressions = 0
+    for name in sorted(baseline.keys() | current.keys()):
+        if name not in baseline or name not in current:
+            print(f"{name:<60} {'only in ' + ('current' if name in current else 'baseline')}")
+            continue
+        before, after = baseline[name].get("p50_ms"), current[name].get("p50_ms")
+        if before is None or after is None:
+            before, after = baseline[name].get("value"), current[name].get("value")
+            print(f"{name:<60} {before} -> {after}")
+            continue
+        change = (after - before) / before if before else 0.0
+        regressed = change > args.threshold and after - before > args.min_ms
+        regressions += regressed
+        flag = "REGRESSION" if regressed else ("improved" if change < -args.threshold else "")
+        print(f"{name:<60} {before:10.3f}ms -> {after:10.3f}ms  {change:+7.1%}  {flag}")
+    print(f"{regressions} regression(s) above {args.threshold:.0%}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Run the benchmarks and write the results as JSON.")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000],
+                            help="Catalog sizes, from 10 to 1000000 meals.")
+    run_parser.add_argument("--sections", nargs="+", choices=list(SECTIONS), default=list(SECTIONS))
+    run_parser.add_argument("--weeks", type=int, default=8, help="Weeks of plan history.")
+    run_parser.add_argument("--households", type=int, default=2)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--repeat", type=int, default=20, help="The maximum number of runs per benchmark.")
+    run_parser.add_argument("--budget", type=float, default=2.0,
+                            help="Seconds after which a benchmark stops repeating.")
+    run_parser.add_argument("--output", default="benchmark_results.json")
+    compare_parser = commands.add_parser("compare", help="Compare two result files and flag regressions.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.25,
+                                help="The relative slowdown of the median that counts as a regression.")
+    compare_parser.add_argument("--min-ms", type=float, default=0.05,
+                                help="Ignore slowdowns smaller than this many milliseconds.")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Seeded generator of synthetic meal catalogs and plan histories.
+
+The same size and seed always produce the same meals and plans, so timings
+from different runs and machines are taken on identical data. Catalogs of
+10 to 1M meals are written in batches, so memory stays flat.
+"""
+import datetime
+import random
+
+from utils import database
+
+CUISINES = ["Indian", "Italian", "Mexican", "Thai", "Chinese", "Japanese", "Greek", "French", "Korean", "Ethiopian"]
+INGREDIENTS = ["Spinach", "Paneer", "Onion", "Tomatoes", "Garlic", "Rice", "Lentils", "Chicken", "Tofu", "Pasta",
+               "Cheese", "Potato", "Carrot", "Peas", "Kidney beans", "Basil", "Coconut milk", "Eggs", "Yogurt",
+               "Mushrooms"] + [f"Spice {i}" for i in range(300)]
+QUANTITIES = ["", "", "2 ", "200 g ", "1/2 cup ", "1 kg ", "3 cloves "]
+INGREDIENTS_PER_MEAL = 6
+INSERT_BATCH_SIZE = 50000
+
+
+def meal_name(index: int) -> str:
+    return f"Meal {index}"
+
+
+def synthetic_meals(size: int, seed: int = 0, start: int = 0):
+    """Yield size (meal_name, grocery_items, able_to_make_more_for_lunch, cuisine) tuples.
+    Args:
+        size (int): The number of meals.
+        seed (int): The random seed.
+        start (int): The index of the first meal, to generate meals that are not in a catalog yet.
+    """
+    rng = random.Random(f"meals-{seed}-{start}")
+    for index in range(start, start + size):
+        grocery_items = ", ".join(rng.choice(QUANTITIES) + item for item in rng.sample(INGREDIENTS, INGREDIENTS_PER_MEAL))
+        yield meal_name(index), grocery_items, rng.random() < 0.4, rng.choice(CUISINES)
+
+
+def synthetic_plans(catalog_size: int, weeks: int, households: int = 1, seed: int = 0, last_week: str = None):
+    """Yield (household, week_start, lunch_list, dinner_list) for consecutive weeks.
+    The history ends with the current week, so the tools that default to it
+    find a plan; only the dates depend on the day the plans are generated.
+    The plans are random meals of the catalog rather than planner output.
+    """
+    rng = random.Random(f"plans-{seed}")
+    last_monday = datetime.date.fromisoformat(database.week_start_of(last_week))
+    for week in range(weeks):
+        week_start = (last_monday - datetime.timedelta(weeks=weeks - 1 - week)).isoformat()
+        for household in range(households):
+            meals = [meal_name(rng.randrange(catalog_size)) for _ in range(14)]
+            yield f"household {household}", week_start, meals[:7], meals[7:]
+
+
+def build_database(db_name: str, size: int, weeks: int = 8, households: int = 1, seed: int = 0) -> None:
+    """Fill a new database with a synthetic catalog and plan history.
+    Args:
+        db_name (str): The database file to create.
+        size (int): The number of meals, e.g. 10 to 1000000.
+        weeks (int): The number of weeks of plans.
+        households (int): The number of households with a plan every week. The first one is the default household.
+        seed (int): The random seed.
+    """
+    batch = []
+    for meal in synthetic_meals(size, seed):
+        batch.append(meal)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            database.add_meals_to_db(batch, db_name)
+            batch = []
+    database.add_meals_to_db(batch, db_name)
+    for household, week_start, lunch_list, dinner_list in synthetic_plans(size, weeks, households, seed):
+        if household == "household 0":
+            household = database.DEFAULT_HOUSEHOLD
+        database.save_meal_plan(lunch_list, dinner_list, week_start, db_name, household=household)
@@ -1,23 +1,71 @@
 import os
-from typing import Any
+import time
+from typing import TYPE_CHECKING, Any, Callable
 
-from smolagents import InferenceClientModel, CodeAgent, DuckDuckGoSearchTool, MCPClient, TransformersModel, OpenAIServerModel
-from mcp import StdioServerParameters
+from utils import database, tracing
+from utils.agent_pool import AgentPool, BackgroundAgentPool
+
+# smolagents, mcp and the model backends take seconds to import, so they are
+# only imported by the functions that need them. This lets the app serve its
+# tables while the agent is still loading.
+if TYPE_CHECKING:
+    from mcp import StdioServerParameters
+    from smolagents import CodeAgent, MCPClient
 
 
 MEALPLAN_MODEL_TYPE = os.getenv("MEALPLAN_MODEL_TYPE") or "TransformersModel"
 MODEL_ID = os.getenv("MODEL_ID") or "Qwen/Qwen3-30B-A3B-Instruct-2507"
+# Model types that run inference in this process
+LOCAL_MODEL_TYPES = ("TransformersModel", "PrefixCachedTransformersModel", "BatchedTransformersModel")
+# Weight quantization ("int8", "int4" or "none") and the largest batch of BatchedTransformersModel
+MEALPLAN_QUANTIZATION = os.getenv("MEALPLAN_QUANTIZATION") or "int8"
+MEALPLAN_MAX_BATCH_SIZE = int(os.getenv("MEALPLAN_MAX_BATCH_SIZE") or 8)
+# A local model runs on the CPU of this machine (and TransformersModel streams through
+# a single shared streamer), so it only serves one agent run at a time, except
+# BatchedTransformersModel, which generates the steps of concurrent runs together.
+# Remote models can serve several.
+if MEALPLAN_MODEL_TYPE == "BatchedTransformersModel":
+    _DEFAULT_CONCURRENT_RUNS = MEALPLAN_MAX_BATCH_SIZE
+elif MEALPLAN_MODEL_TYPE in LOCAL_MODEL_TYPES:
+    _DEFAULT_CONCURRENT_RUNS = 1
+else:
+    _DEFAULT_CONCURRENT_RUNS = 4
+MAX_CONCURRENT_RUNS = int(os.getenv("MEALPLAN_MAX_CONCURRENT_RUNS") or _DEFAULT_CONCURRENT_RUNS)
+
+# Model responses are cached on disk across restarts; set MEALPLAN_LLM_CACHE=0 to disable.
+LLM_CACHE_ENABLED = os.getenv("MEALPLAN_LLM_CACHE", "1") != "0"
+LLM_CACHE_PATH = os.getenv("MEALPLAN_LLM_CACHE_PATH") or os.path.join(".cache", "llm_cache.db")
+LLM_CACHE_MAX_MB = int(os.getenv("MEALPLAN_LLM_CACHE_MAX_MB") or 256)
+# Read-only tool results are cached in memory, because database data versions
+# are only meaningful within one process.
+TOOL_CACHE_MAX_MB = int(os.getenv("MEALPLAN_TOOL_CACHE_MAX_MB") or 32)
+
+# "mcp" runs the tools in an MCP server subprocess over stdio, "local" calls
+# the same tool functions inside the app process.
+MEALPLAN_TOOL_MODE = os.getenv("MEALPLAN_TOOL_MODE") or "mcp"
+
+# The caches created by get_tools and initialize_model, by name
+caches = {}
+
+MCP_SERVER_COMMAND = "uv"
+MCP_SERVER_ARGS = ["run", "--with", "mcp", "mcp", "run", "./utils/mcp_server.py"]
+
+def get_mcp_server_parameters() -> "StdioServerParameters":
+    """Return the parameters that start the meal planner MCP server."""
+    from mcp import StdioServerParameters
 
-MCP_SERVER_PARAMETERS = StdioServerParameters(
-    command="uv",
-    args=["run", "--with", "mcp", "mcp", "run", "./utils/mcp_server.py"],
-    env={**os.environ},
-    transport="streamable-http",
-)
+    return StdioServerParameters(
+        command=MCP_SERVER_COMMAND,
+        args=MCP_SERVER_ARGS,
+        env={**os.environ},
+        transport="streamable-http",
+    )
 
-def initialize_mcp_client(server_parameters: StdioServerParameters = MCP_SERVER_PARAMETERS) -> MCPClient:
+def initialize_mcp_client(server_parameters: "StdioServerParameters" = None) -> "MCPClient":
     """Initialize the MCP client with the server parameters."""
-    mcp_client = MCPClient(server_parameters=server_parameters)
+    from smolagents import MCPClient
+
+    mcp_client = MCPClient(server_parameters=server_parameters or get_mcp_server_parameters())
     return mcp_client
 
 def get_prompt_template() -> Any:
@@ -30,16 +78,34 @@ def get_prompt_template() -> Any:
         prompt_templates = yaml.safe_load(stream)
         return prompt_templates
 
-def initialize_agent(mcp_client: MCPClient) -> Any:
-    """Initialize the agent with the MCP client and the model.
+def get_tools(mcp_client: "MCPClient" = None) -> list:
+    """Get the MCP tools plus the web search tool available to the agent.
         Args:
-        mcp_client (MCPClient): The MCP client to use for tool calls.
+        mcp_client (MCPClient): The MCP client to use for tool calls. If None, the MCP
+            tools are bound in process.
         Returns:
-        Any: The initialized agent.
+        list: The tools.
     """
-    tools = mcp_client.get_tools()
+    from smolagents import DuckDuckGoSearchTool
+    from utils.llm_cache import SQLiteLRUCache, cache_read_only_tools
+    from utils.local_tools import get_local_tools
+
+    tools = mcp_client.get_tools() if mcp_client is not None else get_local_tools()
+    if LLM_CACHE_ENABLED:
+        caches.setdefault("tool_results", SQLiteLRUCache(":memory:", TOOL_CACHE_MAX_MB * 1024 * 1024))
+        cache_read_only_tools(tools, caches["tool_results"], database.get_data_version, database.week_start_of)
     tools.append(DuckDuckGoSearchTool())
+    tracing.instrument_tools(tools)
     print (f"Available tools: {[tool.name for tool in tools]}")
+    return tools
+
+def initialize_model() -> Any:
+    """Initialize the model selected with the MEALPLAN_MODEL_TYPE and MODEL_ID environment variables.
+        Returns:
+        Any: The initialized model.
+    """
+    from smolagents import InferenceClientModel, OpenAIServerModel, TransformersModel
+    from utils.llm_cache import CachedModel, SQLiteLRUCache
 
     model_id = MODEL_ID
 
@@ -51,6 +117,28 @@ def initialize_agent(mcp_client: MCPClient) -> Any:
             device_map="cpu",
             max_new_tokens=10000,
         )
+    elif MEALPLAN_MODEL_TYPE == "PrefixCachedTransformersModel":
+        from utils.local_models import PrefixCachedTransformersModel
+
+        # Reuses the prefilled key/value cache of the system prompt and of earlier steps
+        model = PrefixCachedTransformersModel(
+            model_id=model_id,
+            device_map="cpu",
+            max_new_tokens=10000,
+        )
+        tracing.register_stats_provider("prefix_cache", model.cache_stats)
+    elif MEALPLAN_MODEL_TYPE == "BatchedTransformersModel":
+        from utils.local_models import BatchedTransformersModel
+
+        # Quantized weights, and the steps of concurrent agent runs are generated in one batch
+        model = BatchedTransformersModel(
+            model_id=model_id,
+            device_map="cpu",
+            max_new_tokens=10000,
+            quantization=MEALPLAN_QUANTIZATION,
+            max_batch_size=MEALPLAN_MAX_BATCH_SIZE,
+        )
+        tracing.register_stats_provider("batching", model.batch_stats)
     elif MEALPLAN_MODEL_TYPE == "OpenAIServerModel":
         model = OpenAIServerModel(
             model_id=model_id,
@@ -60,8 +148,32 @@ def initialize_agent(mcp_client: MCPClient) -> Any:
     else:
         raise NotImplementedError(f"Unrecognized model type: {MEALPLAN_MODEL_TYPE}")
 
+    if LLM_CACHE_ENABLED:
+        if os.path.dirname(LLM_CACHE_PATH):
+            os.makedirs(os.path.dirname(LLM_CACHE_PATH), exist_ok=True)
+        caches.setdefault("llm_responses", SQLiteLRUCache(LLM_CACHE_PATH, LLM_CACHE_MAX_MB * 1024 * 1024))
+        model = CachedModel(model, caches["llm_responses"])
+    return model
 
-    prompt_templates = get_prompt_template()
+def get_cache_stats() -> dict:
+    """Return the hit-rate statistics of the model response and tool result caches."""
+    return {name: cache.stats() for name, cache in caches.items()}
+
+tracing.register_stats_provider("cache", get_cache_stats)
+
+def create_agent(tools: list, model: Any, prompt_templates: Any = None) -> "CodeAgent":
+    """Create a CodeAgent. Agents created with the same tools and model share them.
+        Args:
+        tools (list): The tools the agent can call.
+        model (Any): The model the agent uses.
+        prompt_templates (Any): The prompt templates. Loaded from prompt_templates.yaml if not given.
+        Returns:
+        CodeAgent: The new agent.
+    """
+    from smolagents import CodeAgent
+
+    if prompt_templates is None:
+        prompt_templates = get_prompt_template()
 
     agent = CodeAgent(tools=tools,
                         model=model,
@@ -70,5 +182,65 @@ def initialize_agent(mcp_client: MCPClient) -> Any:
                         max_print_outputs_length= 5000,
                         max_steps=10,
                         prompt_templates=prompt_templates,
+                        step_callbacks=[tracing.record_agent_step],
                     )
     return agent
+
+def initialize_agent(mcp_client: "MCPClient" = None) -> Any:
+    """Initialize the agent with the MCP client and the model.
+        Args:
+        mcp_client (MCPClient): The MCP client to use for tool calls, or None to bind the tools in process.
+        Returns:
+        Any: The initialized agent.
+    """
+    return create_agent(get_tools(mcp_client), initialize_model())
+
+def initialize_agent_pool(mcp_client: "MCPClient" = None, max_concurrent_runs: int = MAX_CONCURRENT_RUNS,
+                          report_progress: Callable[[str], None] = print) -> AgentPool:
+    """Initialize a pool that gives every chat session its own agent.
+    The model, the tools and the prompt templates are loaded once and shared by all agents.
+        Args:
+        mcp_client (MCPClient): The MCP client to use for tool calls, or None to bind the tools in process.
+        max_concurrent_runs (int): The maximum number of agent runs at the same time.
+        report_progress (Callable[[str], None]): Called with the name of each loading stage.
+        Returns:
+        AgentPool: The agent pool.
+    """
+    report_progress("Loading the tools")
+    tools = get_tools(mcp_client)
+    report_progress(f"Loading the model {MODEL_ID}")
+    started = time.perf_counter()
+    model = initialize_model()
+    print(f"Loaded the model {MODEL_ID} in {time.perf_counter() - started:.1f}s")
+    prompt_templates = get_prompt_template()
+    agent_pool = AgentPool(lambda: create_agent(tools, model, prompt_templates), max_concurrent_runs)
+    tracing.register_stats_provider("agent_pool", agent_pool.stats)
+    return agent_pool
+
+def start_agent_pool(tool_mode: str = MEALPLAN_TOOL_MODE, max_concurrent_runs: int = MAX_CONCURRENT_RUNS) -> BackgroundAgentPool:
+    """Start the MCP client and load the model and the agent pool on a background thread.
+        Args:
+        tool_mode (str): "mcp" to call the tools through the MCP server, "local" to bind them in process.
+        max_concurrent_runs (int): The maximum number of agent runs at the same time.
+        Returns:
+        BackgroundAgentPool: The loading pool. Call close() on it when the app stops.
+    """
+    if tool_mode not in ("mcp", "local"):
+        raise NotImplementedError(f"Unrecognized tool mode: {tool_mode}")
+    mcp_clients = []
+
+    def build(report_progress: Callable[[str], None]) -> AgentPool:
+        mcp_client = None
+        if tool_mode == "mcp":
+            report_progress("Starting the MCP tool server")
+            mcp_client = initialize_mcp_client()
+            mcp_clients.append(mcp_client)
+        return initialize_agent_pool(mcp_client, max_concurrent_runs, report_progress)
+
+    def close() -> None:
+        for mcp_client in mcp_clients:
+            mcp_client.disconnect()
+
+    background_pool = BackgroundAgentPool(build, close).start()
+    tracing.register_stats_provider("agent_startup", background_pool.stats)
+    return background_pool
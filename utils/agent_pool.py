@@ -0,0 +1,220 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generator
+
+# How long a queued request waits for a free run slot before it refreshes
+# its queue position in the chat.
+QUEUE_POLL_SECONDS = 0.5
+
+
+class AgentPool:
+    """Session-scoped agents with a bounded number of concurrent runs.
+
+    Every chat session gets its own agent, which remembers the earlier
+    messages of its session, so follow-up requests like "swap Tuesday's
+    dinner" have their context and sessions never share agent memory. At most `max_concurrent_runs` agents run at the same time; other
+    requests wait in a FIFO queue and are told their position while waiting.
+    """
+
+    def __init__(self, agent_factory: Callable[[], Any], max_concurrent_runs: int = 4, max_sessions: int = 100):
+        """
+        Args:
+            agent_factory (Callable[[], Any]): Creates a new agent for a session.
+            max_concurrent_runs (int): The maximum number of agent runs at the same time.
+            max_sessions (int): The maximum number of session agents kept. The least recently used one is dropped first,
+                and its session starts over with a new agent.
+        """
+        self._agent_factory = agent_factory
+        self._max_concurrent_runs = max_concurrent_runs
+        self._max_sessions = max_sessions
+        self._agents = OrderedDict()  # session id -> (agent, lock held while the agent runs)
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._queue = []              # tickets of the waiting requests, oldest first
+        self._running = 0
+
+    def _get_agent(self, session_id: str) -> tuple:
+        with self._lock:
+            entry = self._agents.get(session_id)
+            if entry is not None:
+                self._agents.move_to_end(session_id)
+                return entry
+        entry = (self._agent_factory(), threading.Lock())
+        with self._lock:
+            entry = self._agents.setdefault(session_id, entry)
+            self._agents.move_to_end(session_id)
+            while len(self._agents) > self._max_sessions:
+                self._agents.popitem(last=False)
+        return entry
+
+    def queue_depth(self) -> int:
+        """Return the number of requests waiting for a free run slot."""
+        with self._lock:
+            return len(self._queue)
+
+    def stats(self) -> dict:
+        """Return the current number of sessions, running agents and queued requests."""
+        with self._lock:
+            return {
+                "sessions": len(self._agents),
+                "running": self._running,
+                "queued": len(self._queue),
+                "max_concurrent_runs": self._max_concurrent_runs,
+            }
+
+    def _wait_to_start(self, ticket: object, timeout: float) -> int:
+        """Wait up to timeout seconds for the request to start.
+        Returns:
+            int: 0 if the request started, otherwise its position in the queue.
+        """
+        with self._slot_freed:
+            if timeout and (self._queue[0] is not ticket or self._running >= self._max_concurrent_runs):
+                self._slot_freed.wait(timeout)
+            if self._queue[0] is ticket and self._running < self._max_concurrent_runs:
+                self._queue.pop(0)
+                self._running += 1
+                self._slot_freed.notify_all()
+                return 0
+            return self._queue.index(ticket) + 1
+
+    def stream_run(self, session_id: str, task: str) -> Generator:
+        """Run the session's agent on a task, continuing its conversation, and stream its output.
+        Args:
+            session_id (str): Identifies the chat session.
+            task (str): The user message.
+        Yields:
+            The queue position (int) while waiting, then the gradio ChatMessages and
+            partial markdown strings produced by smolagents' stream_to_gradio.
+        """
+        from smolagents.gradio_ui import stream_to_gradio
+
+        ticket = object()
+        with self._lock:
+            self._queue.append(ticket)
+        try:
+            last_position = None
+            position = self._wait_to_start(ticket, 0)
+            while position:
+                if position != last_position:
+                    last_position = position
+                    yield position
+                position = self._wait_to_start(ticket, QUEUE_POLL_SECONDS)
+        except BaseException:
+            with self._slot_freed:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    self._slot_freed.notify_all()
+            raise
+
+        try:
+            agent, agent_lock = self._get_agent(session_id)
+            with agent_lock:
+                # The agent keeps its memory, so the task follows up on the session's earlier messages
+                yield from stream_to_gradio(agent, task, reset_agent_memory=False)
+        finally:
+            with self._slot_freed:
+                self._running -= 1
+                self._slot_freed.notify_all()
+
+
+class LoadingStatus:
+    """Yielded by BackgroundAgentPool.stream_run while the agents are still loading."""
+
+    def __init__(self, message: str):
+        self.message = message
+
+
+class BackgroundAgentPool:
+    """Builds an AgentPool on a background thread so the app can serve requests right away.
+
+    Chat requests that arrive before the pool is ready are told what is being
+    loaded and wait for it; afterwards they are passed on to the pool.
+    """
+
+    def __init__(self, build: Callable[[Callable[[str], None]], AgentPool], close: Callable[[], None] = None):
+        """
+        Args:
+            build (Callable): Builds the pool. It is called with a function that reports
+                the current loading stage, e.g. "Loading the model".
+            close (Callable[[], None]): Releases what build acquired, e.g. the MCP client.
+        """
+        self._build = build
+        self._close = close
+        self._pool = None
+        self._error = None
+        self._stage = "Waiting to start"
+        self._started_at = None
+        self._load_seconds = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self) -> "BackgroundAgentPool":
+        """Start loading on a daemon thread."""
+        if self._thread is None:
+            self._started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._load, name="agent-loader", daemon=True)
+            self._thread.start()
+        return self
+
+    def _report(self, stage: str) -> None:
+        self._stage = stage
+        print(f"Agent startup: {stage}")
+
+    def _load(self) -> None:
+        try:
+            self._pool = self._build(self._report)
+        except BaseException as e:
+            self._error = e
+            self._report(f"Loading the agent failed: {type(e).__name__}: {e}")
+        else:
+            self._report("Ready")
+        finally:
+            self._load_seconds = time.perf_counter() - self._started_at
+            self._ready.set()
+
+    def status(self) -> str:
+        """Return a message describing the current loading stage and how long loading has taken."""
+        if self._ready.is_set():
+            return self._stage
+        elapsed = time.perf_counter() - self._started_at if self._started_at else 0
+        return f"{self._stage}... ({elapsed:.0f}s)"
+
+    def wait(self, timeout: float = None) -> AgentPool:
+        """Wait until the pool is loaded.
+        Args:
+            timeout (float): The maximum number of seconds to wait. Waits forever if None.
+        Returns:
+            AgentPool: The pool, or None if it is still loading after timeout seconds.
+        Raises:
+            Exception: Whatever building the pool raised.
+        """
+        self.start()
+        if not self._ready.wait(timeout):
+            return None
+        if self._error is not None:
+            raise self._error
+        return self._pool
+
+    def stats(self) -> dict:
+        """Return whether the pool is ready or failed to load, and how long loading took."""
+        stats = {"ready": int(self._pool is not None), "failed": int(self._error is not None)}
+        if self._load_seconds is not None:
+            stats["load_seconds"] = round(self._load_seconds, 3)
+        return stats
+
+    def stream_run(self, session_id: str, task: str) -> Generator:
+        """Like AgentPool.stream_run, but first yields LoadingStatus messages until the pool is ready."""
+        self.start()
+        while not self._ready.is_set():
+            yield LoadingStatus(f"The agent is starting up: {self.status()}")
+            self._ready.wait(QUEUE_POLL_SECONDS)
+        if self._error is not None:
+            yield LoadingStatus(self._stage)
+            return
+        yield from self._pool.stream_run(session_id, task)
+
+    def close(self) -> None:
+        """Release the resources acquired while loading."""
+        if self._close is not None:
+            self._close()
@@ -0,0 +1,56 @@
+import threading
+from typing import Any, Callable
+
+
+class ChangeAwareCache:
+    """Memoizes computed values together with the version of the data they were built from.
+
+    A cached value is served as long as the caller reports the same version
+    (e.g. a database data version and the current week). Once the version
+    changes the value is rebuilt, so unchanged data costs one version check.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, version: Any, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for key, or compute and cache it if the version changed.
+        Args:
+            key (str): The name of the cached value.
+            version (Any): The current version of the data the value is built from.
+            compute (Callable[[], Any]): Builds the value when it is missing or out of date.
+        Returns:
+            Any: The cached or freshly computed value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = (version, value)
+        return value
+
+    def invalidate(self, key: str = None) -> None:
+        """Drop one cached value, or all of them if no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        """Return the hit and miss counts and the hit rate."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._entries),
+            }
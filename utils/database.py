@@ -1,49 +1,597 @@
+import datetime
+import json
+import os
+import re
 import sqlite3
+import sys
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+from utils import tracing
+
+# Connections are kept open per thread and per database file instead of being
+# opened on every call. SQLite connections must not be shared between threads
+# without extra locking, so each Gradio worker thread and the MCP server thread
+# get their own connection, all of them created with the same tuned settings.
+CONNECTION_TIMEOUT_SECONDS = 5.0
+STATEMENT_CACHE_SIZE = 256
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA foreign_keys=ON",
+)
+# Read-only connections open the file with mode=ro, so they cannot write even if a
+# statement was misclassified, and they leave the journal mode alone.
+READ_ONLY_CONNECTION_PRAGMAS = (
+    "PRAGMA query_only=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+_thread_local = threading.local()
+_pool_generation = 0
+_open_connections = []
+_open_connections_lock = threading.Lock()
+_initialized_databases = set()
+_schema_lock = threading.Lock()
+_version_connections = {}
+_version_lock = threading.Lock()
+
+def _connect(db_name: str, read_only: bool = False) -> sqlite3.Connection:
+    """Return the calling thread's open connection to db_name, creating it if needed.
+    Args:
+        db_name (str): The name of the SQLite database file.
+        read_only (bool): Return the thread's read-only connection, which must not be used before the schema exists.
+    Returns:
+        sqlite3.Connection: A connection owned by the calling thread.
+    """
+    connections = getattr(_thread_local, 'connections', None)
+    if connections is None or _thread_local.generation != _pool_generation:
+        connections = _thread_local.connections = {}
+        _thread_local.generation = _pool_generation
+
+    key = (db_name, 'ro') if read_only else db_name
+    conn = connections.get(key)
+    if conn is None:
+        if read_only:
+            conn = sqlite3.connect(f'file:{urllib.parse.quote(os.path.abspath(db_name))}?mode=ro',
+                                   uri=True,
+                                   timeout=CONNECTION_TIMEOUT_SECONDS,
+                                   cached_statements=STATEMENT_CACHE_SIZE,
+                                   check_same_thread=False)
+        else:
+            conn = sqlite3.connect(db_name,
+                                   timeout=CONNECTION_TIMEOUT_SECONDS,
+                                   cached_statements=STATEMENT_CACHE_SIZE,
+                                   check_same_thread=False)
+        for pragma in READ_ONLY_CONNECTION_PRAGMAS if read_only else CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        connections[key] = conn
+        with _open_connections_lock:
+            _open_connections.append(conn)
+    return conn
+
+def get_connection(db_name: str = 'meals_database.db') -> sqlite3.Connection:
+    """Get the calling thread's pooled connection, making sure the schema exists.
+    The schema is only created once per database file and process.
+    Args:
+        db_name (str): The name of the SQLite database file.
+    Returns:
+        sqlite3.Connection: A connection owned by the calling thread.
+    """
+    if db_name not in _initialized_databases:
+        initialize_database(db_name)
+    return _connect(db_name)
+
+def close_connections() -> None:
+    """Close every pooled connection opened by this process.
+    The next database call on any thread opens a fresh connection.
+    """
+    global _pool_generation
+    with _open_connections_lock:
+        connections = list(_open_connections)
+        _open_connections.clear()
+        _pool_generation += 1
+    with _version_lock:
+        connections.extend(_version_connections.values())
+        _version_connections.clear()
+    for conn in connections:
+        conn.close()
+    _initialized_databases.clear()
+    # Data versions of the new connections do not continue those of the closed ones
+    clear_query_cache()
+
+def get_data_version(db_name: str = 'meals_database.db') -> int:
+    """Return a number that changes whenever data in the database is committed.
+    A dedicated connection that never writes is used, so commits from this
+    process's pooled connections and from other processes (e.g. the MCP
+    server) all change the value of its PRAGMA data_version.
+    Args:
+        db_name (str): The name of the SQLite database file.
+    Returns:
+        int: The current data version. Only compare it with values from the same process.
+    """
+    get_connection(db_name)  # Make sure the schema exists before watching the file
+    with _version_lock:
+        conn = _version_connections.get(db_name)
+        if conn is None:
+            conn = sqlite3.connect(db_name, timeout=CONNECTION_TIMEOUT_SECONDS, check_same_thread=False)
+            _version_connections[db_name] = conn
+        return conn.execute('PRAGMA data_version').fetchone()[0]
+
+# Units a grocery item's quantity can be given in, e.g. "200 g Paneer" or "2 cups Rice",
+# mapped to the unit it is stored in and the factor to convert to that unit.
+GROCERY_UNITS = {
+    'g': ('g', 1), 'gram': ('g', 1), 'grams': ('g', 1), 'kg': ('g', 1000),
+    'ml': ('ml', 1), 'l': ('ml', 1000), 'litre': ('ml', 1000), 'litres': ('ml', 1000),
+    'liter': ('ml', 1000), 'liters': ('ml', 1000),
+    'tsp': ('tsp', 1), 'teaspoon': ('tsp', 1), 'teaspoons': ('tsp', 1),
+    'tbsp': ('tbsp', 1), 'tablespoon': ('tbsp', 1), 'tablespoons': ('tbsp', 1),
+    'cup': ('cup', 1), 'cups': ('cup', 1),
+    'oz': ('oz', 1), 'lb': ('lb', 1), 'lbs': ('lb', 1),
+    'can': ('can', 1), 'cans': ('can', 1), 'bunch': ('bunch', 1), 'bunches': ('bunch', 1),
+    'clove': ('clove', 1), 'cloves': ('clove', 1),
+}
+_LEADING_QUANTITY = re.compile(
+    r'^(?P<quantity>\d+(?:\.\d+)?|\d+/\d+)\s*(?:(?P<unit>'
+    + '|'.join(sorted(GROCERY_UNITS, key=len, reverse=True))
+    + r')\.?)?\s+(?:of\s+)?(?P<name>.+)$', re.IGNORECASE)
+_TRAILING_QUANTITY = re.compile(r'^(?P<name>.+?)\s*[x\u00d7]\s*(?P<quantity>\d+(?:\.\d+)?)$', re.IGNORECASE)
+
+def parse_grocery_item(item: str) -> tuple:
+    """Split one grocery item into its ingredient name, quantity and unit.
+    Items without a quantity, like "Paneer", stand for one portion of the
+    ingredient per meal.
+    Args:
+        item (str): A grocery item, e.g. "Paneer", "200 g Paneer", "1/2 cup Rice" or "Onion x2".
+    Returns:
+        tuple: (name, quantity, unit). The unit is "" for plain counts.
+    """
+    item = item.strip()
+    match = _LEADING_QUANTITY.match(item) or _TRAILING_QUANTITY.match(item)
+    if match is None:
+        return item, 1.0, ''
+    quantity = match['quantity']
+    if '/' in quantity:
+        numerator, denominator = quantity.split('/')
+        quantity = float(numerator) / float(denominator) if float(denominator) else 1.0
+    else:
+        quantity = float(quantity)
+    unit, factor = GROCERY_UNITS.get((match.groupdict().get('unit') or '').lower(), ('', 1))
+    return match['name'].strip(), quantity * factor, unit
+
+def parse_grocery_items(grocery_items: str) -> list:
+    """Split a comma-separated grocery items string into the ingredient vector of a meal.
+    Args:
+        grocery_items (str): Comma-separated list of grocery items.
+    Returns:
+        list: (name, quantity, unit) tuples in their original order. Repeated items in the
+        same unit are added up.
+    """
+    totals = {}
+    for item in (grocery_items or '').split(','):
+        name, quantity, unit = parse_grocery_item(item)
+        if name:
+            key = (name.lower(), unit)
+            if key in totals:
+                totals[key][1] += quantity
+            else:
+                totals[key] = [name, quantity, unit]
+    return [tuple(entry) for entry in totals.values()]
+
+def _store_meal_ingredients(conn: sqlite3.Connection, meal_id: int, grocery_items: str) -> None:
+    """Write the ingredient vector of one meal, so grocery lists never parse grocery_items again."""
+    ingredients = parse_grocery_items(grocery_items)
+    conn.executemany('INSERT OR IGNORE INTO ingredients (name) VALUES (?)', [(name,) for name, _, _ in ingredients])
+    # "Paneer" and "paneer" are the same ingredient, so their quantities are added up
+    conn.executemany('''
+        INSERT INTO meal_ingredients (meal_id, ingredient_id, unit, quantity)
+        SELECT ?, id, ?, ? FROM ingredients WHERE name = ?
+        ON CONFLICT (meal_id, ingredient_id, unit) DO UPDATE SET quantity = quantity + excluded.quantity
+    ''', [(meal_id, unit, quantity, name) for name, quantity, unit in ingredients])
+
+def _sync_meal_ingredients(conn: sqlite3.Connection) -> None:
+    """Rebuild the ingredient rows of meals that have none.
+    The triggers on the meals table drop the ingredient rows of updated and
+    deleted meals, so this picks up every meal written with raw SQL.
+    """
+    stale_meals = conn.execute('''
+        SELECT id, grocery_items FROM meals
+        WHERE NOT EXISTS (SELECT 1 FROM meal_ingredients WHERE meal_id = meals.id)
+    ''').fetchall()
+    for meal_id, grocery_items in stale_meals:
+        _store_meal_ingredients(conn, meal_id, grocery_items)
+
+def _resolve_duplicate_meal_names(conn: sqlite3.Connection) -> None:
+    """Make meal names unique before the unique index is created.
+    Older databases could contain the same meal name more than once. A copy
+    that equals the first meal of its name is removed. A copy with other
+    grocery items, cuisine or leftovers flag is kept and renamed to
+    "<name> (<id>)". Every change is reported on stderr, since stdout carries
+    the JSON-RPC messages when the MCP server runs the migration.
+    """
+    duplicates = conn.execute('''
+        SELECT id, meal_name, grocery_items, able_to_make_more_for_lunch, cuisine FROM meals
+        WHERE meal_name IN (SELECT meal_name FROM meals GROUP BY meal_name HAVING COUNT(*) > 1)
+        ORDER BY id
+    ''').fetchall()
+    first_meals = {}
+    for meal_id, meal_name, *details in duplicates:
+        first_id, first_details = first_meals.setdefault(meal_name, (meal_id, details))
+        if first_id == meal_id:
+            continue
+        if details == first_details:
+            conn.execute('DELETE FROM meals WHERE id = ?', (meal_id,))
+            print(f"Removed meal {meal_id} {meal_name!r}, a copy of meal {first_id}", file=sys.stderr)
+        else:
+            new_name = f'{meal_name} ({meal_id})'
+            conn.execute('UPDATE meals SET meal_name = ? WHERE id = ?', (new_name, meal_id))
+            print(f"Renamed meal {meal_id} {meal_name!r} to {new_name!r}, since it differs from meal {first_id}: "
+                  f"grocery_items={details[0]!r}, able_to_make_more_for_lunch={details[1]!r}, cuisine={details[2]!r}",
+                  file=sys.stderr)
+
+def _migrate_to_normalized_ingredients(conn: sqlite3.Connection) -> None:
+    """Schema version 1: unique meal names, indexes and the normalized ingredient tables."""
+    _resolve_duplicate_meal_names(conn)
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_meals_meal_name ON meals (meal_name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_meals_cuisine ON meals (cuisine)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ingredients (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS meal_ingredients (
+            meal_id INTEGER NOT NULL,
+            ingredient_id INTEGER NOT NULL REFERENCES ingredients (id),
+            PRIMARY KEY (meal_id, ingredient_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_meal_ingredients_ingredient ON meal_ingredients (ingredient_id)')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS meals_grocery_items_updated
+        AFTER UPDATE OF id, grocery_items ON meals
+        BEGIN
+            DELETE FROM meal_ingredients WHERE meal_id = OLD.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS meals_deleted
+        AFTER DELETE ON meals
+        BEGIN
+            DELETE FROM meal_ingredients WHERE meal_id = OLD.id;
+        END
+    ''')
+    # The ingredient rows are written by schema version 4, which adds their quantities
+
+def _migrate_to_full_text_search(conn: sqlite3.Connection) -> None:
+    """Schema version 2: an FTS5 index over meal names, grocery items and cuisines."""
+    # External content table: the text lives in meals only, the index is kept
+    # in sync by the triggers below, including for writes made with raw SQL.
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS meals_fts USING fts5 (
+            meal_name, grocery_items, cuisine,
+            content = 'meals', content_rowid = 'id',
+            tokenize = 'porter unicode61 remove_diacritics 2'
+        )
+    ''')
+    # Rank matches on the meal name above matches on ingredients or cuisine
+    conn.execute("INSERT INTO meals_fts (meals_fts, rank) VALUES ('rank', 'bm25(4.0, 2.0, 1.0)')")
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS meals_fts_inserted
+        AFTER INSERT ON meals
+        BEGIN
+            INSERT INTO meals_fts (rowid, meal_name, grocery_items, cuisine)
+            VALUES (NEW.id, NEW.meal_name, NEW.grocery_items, NEW.cuisine);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS meals_fts_deleted
+        AFTER DELETE ON meals
+        BEGIN
+            INSERT INTO meals_fts (meals_fts, rowid, meal_name, grocery_items, cuisine)
+            VALUES ('delete', OLD.id, OLD.meal_name, OLD.grocery_items, OLD.cuisine);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS meals_fts_updated
+        AFTER UPDATE ON meals
+        BEGIN
+            INSERT INTO meals_fts (meals_fts, rowid, meal_name, grocery_items, cuisine)
+            VALUES ('delete', OLD.id, OLD.meal_name, OLD.grocery_items, OLD.cuisine);
+            INSERT INTO meals_fts (rowid, meal_name, grocery_items, cuisine)
+            VALUES (NEW.id, NEW.meal_name, NEW.grocery_items, NEW.cuisine);
+        END
+    ''')
+    conn.execute("INSERT INTO meals_fts (meals_fts) VALUES ('rebuild')")
+
+# The file the meal plan was kept in before plans were stored in the database.
+# It is imported once, from the directory of the database file.
+LEGACY_MEAL_PLAN_FILE = 'meal_plan.json'
+
+def _migrate_to_meal_plan_history(conn: sqlite3.Connection) -> None:
+    """Schema version 3: versioned weekly meal plans."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS meal_plans (
+            id INTEGER PRIMARY KEY,
+            week_start TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now')),
+            UNIQUE (week_start, version)
+        )
+    ''')
+    # Entries keep the meal name rather than the meal id, so the history
+    # survives meals being renamed or deleted.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS meal_plan_entries (
+            plan_id INTEGER NOT NULL REFERENCES meal_plans (id) ON DELETE CASCADE,
+            day INTEGER NOT NULL,
+            slot TEXT NOT NULL,
+            meal_name TEXT NOT NULL,
+            PRIMARY KEY (plan_id, day, slot)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_meal_plan_entries_meal_name ON meal_plan_entries (meal_name, plan_id)')
+    # The plan of an existing meal_plan.json is imported by schema version 4
+
+DEFAULT_HOUSEHOLD = 'home'
+
+def _import_legacy_meal_plan(conn: sqlite3.Connection) -> None:
+    """Import the plan of a meal_plan.json next to the database file, written by older versions."""
+    db_file = next(row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main')
+    plan_file = os.path.join(os.path.dirname(db_file), LEGACY_MEAL_PLAN_FILE) if db_file else None
+    if plan_file and os.path.exists(plan_file):
+        try:
+            with open(plan_file) as json_file:
+                meal_plan = json.load(json_file)
+            # The plan was for the week the file was last written in
+            written_on = datetime.date.fromtimestamp(os.path.getmtime(plan_file))
+            _insert_meal_plan(conn, meal_plan["Lunch"], meal_plan["Dinner"], week_start_of(written_on))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Not stdout, which carries the JSON-RPC messages when the MCP server runs the migration
+            print(f"Could not import the meal plan from {plan_file}: {e}", file=sys.stderr)
+
+def _migrate_to_grocery_quantities(conn: sqlite3.Connection) -> None:
+    """Schema version 4: ingredient quantities and units, and meal plans per household."""
+    # The primary key gains the unit, so the table is rebuilt from grocery_items
+    conn.execute('DROP TABLE IF EXISTS meal_ingredients')
+    conn.execute('''
+        CREATE TABLE meal_ingredients (
+            meal_id INTEGER NOT NULL,
+            ingredient_id INTEGER NOT NULL REFERENCES ingredients (id),
+            unit TEXT NOT NULL DEFAULT '',
+            quantity REAL NOT NULL DEFAULT 1,
+            PRIMARY KEY (meal_id, ingredient_id, unit)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX idx_meal_ingredients_ingredient ON meal_ingredients (ingredient_id)')
+    _sync_meal_ingredients(conn)
+    # Names that were parsed differently before, e.g. "200 g Paneer", are no longer used
+    conn.execute('DELETE FROM ingredients WHERE id NOT IN (SELECT ingredient_id FROM meal_ingredients)')
+
+    # Plans are versioned per household and week. SQLite cannot change a
+    # table's constraints, so both plan tables are rebuilt. The entries are
+    # set aside first, since dropping meal_plans would cascade to them.
+    conn.execute('CREATE TEMP TABLE meal_plans_v3 AS SELECT * FROM meal_plans')
+    conn.execute('CREATE TEMP TABLE meal_plan_entries_v3 AS SELECT * FROM meal_plan_entries')
+    conn.execute('DROP TABLE meal_plan_entries')
+    conn.execute('DROP TABLE meal_plans')
+    conn.execute(f'''
+        CREATE TABLE meal_plans (
+            id INTEGER PRIMARY KEY,
+            household TEXT NOT NULL DEFAULT '{DEFAULT_HOUSEHOLD}',
+            week_start TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now')),
+            UNIQUE (household, week_start, version)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE meal_plan_entries (
+            plan_id INTEGER NOT NULL REFERENCES meal_plans (id) ON DELETE CASCADE,
+            day INTEGER NOT NULL,
+            slot TEXT NOT NULL,
+            meal_name TEXT NOT NULL,
+            PRIMARY KEY (plan_id, day, slot)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX idx_meal_plan_entries_meal_name ON meal_plan_entries (meal_name, plan_id)')
+    conn.execute('CREATE INDEX idx_meal_plans_week_start ON meal_plans (week_start)')
+    conn.execute('''
+        INSERT INTO meal_plans (id, week_start, version, created_at)
+        SELECT id, week_start, version, created_at FROM temp.meal_plans_v3
+    ''')
+    conn.execute('INSERT INTO meal_plan_entries SELECT * FROM temp.meal_plan_entries_v3')
+    conn.execute('DROP TABLE temp.meal_plans_v3')
+    conn.execute('DROP TABLE temp.meal_plan_entries_v3')
+    if conn.execute('SELECT 1 FROM meal_plans LIMIT 1').fetchone() is None:
+        _import_legacy_meal_plan(conn)
+
+# Migrations are applied in order. PRAGMA user_version records how many of
+# them a database file has already been through.
+SCHEMA_MIGRATIONS = (
+    _migrate_to_normalized_ingredients,
+    _migrate_to_full_text_search,
+    _migrate_to_meal_plan_history,
+    _migrate_to_grocery_quantities,
+)
 
 def initialize_database(db_name: str = 'meals_database.db') -> None:
-    """Initialize the SQLite database and create the meals table if it doesn't exist.
+    """Initialize the SQLite database, create the meals table if it doesn't exist
+    and migrate databases created by older versions to the current schema.
     Args:
         db_name (str): The name of the SQLite database file.
     """
-    with sqlite3.connect(db_name) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS meals (
-                id INTEGER PRIMARY KEY,
-                meal_name TEXT NOT NULL,
-                grocery_items TEXT,
-                able_to_make_more_for_lunch BOOLEAN,
-                cuisine TEXT
-            )
-        ''')
-        conn.commit()
+    with _schema_lock:
+        conn = _connect(db_name)
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS meals (
+                    id INTEGER PRIMARY KEY,
+                    meal_name TEXT NOT NULL,
+                    grocery_items TEXT,
+                    able_to_make_more_for_lunch BOOLEAN,
+                    cuisine TEXT
+                )
+            ''')
+            schema_version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for version, migration in enumerate(SCHEMA_MIGRATIONS[schema_version:], start=schema_version + 1):
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {version}')
+        _initialized_databases.add(db_name)
+
+# Results of execute_query_on_database are cut off after this many rows or
+# (approximate) bytes, and end with a row holding QUERY_TRUNCATED_MARKER.
+QUERY_MAX_ROWS = int(os.getenv("MEALPLAN_QUERY_MAX_ROWS") or 1000)
+QUERY_MAX_BYTES = int(os.getenv("MEALPLAN_QUERY_MAX_BYTES") or 1024 * 1024)
+QUERY_TRUNCATED_MARKER = '[truncated]'
+QUERY_FETCH_SIZE = 256
+# The results of this many read-only queries are kept, until the data changes
+QUERY_CACHE_SIZE = 256
+# Authorizer actions of statements that only read. Any other action, e.g. an
+# INSERT, an ATTACH or a PRAGMA other than the schema lookups below, makes the statement a write.
+READ_ONLY_ACTIONS = frozenset((sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION,
+                               sqlite3.SQLITE_RECURSIVE))
+READ_ONLY_PRAGMAS = frozenset(('table_info', 'table_xinfo', 'table_list', 'index_list', 'index_info', 'index_xinfo',
+                               'foreign_key_list'))
+
+_query_cache = OrderedDict()  # (db_name, sql, args, max_rows, max_bytes) -> (data version, rows)
+_query_cache_lock = threading.Lock()
+_query_cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+def is_read_only_query(sql_query: str, sql_query_args: list, db_name: str = 'meals_database.db') -> bool:
+    """Tell whether a statement only reads the database.
+    The statement is prepared under EXPLAIN, which does not run it, on a
+    read-only connection, and SQLite's authorizer reports every action it
+    would take.
+    Args:
+        sql_query (str): The SQL statement.
+        sql_query_args (list): The arguments for the statement.
+        db_name (str): The name of the SQLite database file.
+    Returns:
+        bool: True if the statement only reads, False if it may write or cannot be prepared.
+    """
+    get_connection(db_name)  # Make sure the schema exists before opening the file read-only
+    conn = _connect(db_name, read_only=True)
+    read_only = True
+
+    def authorize(action, arg1, *_):
+        nonlocal read_only
+        if action not in READ_ONLY_ACTIONS and not (action == sqlite3.SQLITE_PRAGMA and arg1.lower() in READ_ONLY_PRAGMAS):
+            read_only = False
+        return sqlite3.SQLITE_OK
+
+    conn.set_authorizer(authorize)
+    try:
+        conn.execute(f'EXPLAIN {sql_query}', sql_query_args).close()
+    except sqlite3.Error:
+        return False  # Left to the read-write connection, which reports the error
+    finally:
+        conn.set_authorizer(None)
+    return read_only
+
+def _fetch_capped(cursor: sqlite3.Cursor, max_rows: int, max_bytes: int) -> list:
+    """Fetch the rows of a cursor until max_rows or max_bytes is exceeded, then close it."""
+    rows = []
+    size = 0
+    try:
+        while True:
+            batch = cursor.fetchmany(QUERY_FETCH_SIZE)
+            if not batch:
+                return rows
+            for row in batch:
+                size += sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in row)
+                if len(rows) >= max_rows or size > max_bytes:
+                    limit = f'{max_rows} rows' if len(rows) >= max_rows else f'{max_bytes} bytes'
+                    rows.append((f'{QUERY_TRUNCATED_MARKER} The result is longer than {limit}, only the first '
+                                 f'{len(rows)} rows are shown. Add a LIMIT, an aggregate or a narrower WHERE clause.',))
+                    return rows
+                rows.append(row)
+    finally:
+        cursor.close()  # Ends the read transaction of a result that was cut off
+
+def clear_query_cache(db_name: str = None) -> None:
+    """Drop the cached query results of one database, or of all databases."""
+    with _query_cache_lock:
+        for key in [key for key in _query_cache if db_name is None or key[0] == db_name]:
+            del _query_cache[key]
+        _query_cache_stats['invalidations'] += 1
+
+def query_cache_stats() -> dict:
+    """Return the hit and miss counts of the read-only query cache."""
+    with _query_cache_lock:
+        total = _query_cache_stats['hits'] + _query_cache_stats['misses']
+        return {**_query_cache_stats, 'hit_rate': round(_query_cache_stats['hits'] / total, 4) if total else 0.0,
+                'entries': len(_query_cache)}
 
-def execute_query_on_database(sql_query: str, sql_query_args: list, db_name: str = 'meals_database.db') -> list:
+tracing.register_stats_provider('query_cache', query_cache_stats)
+
+@tracing.traced_function("db_query")
+def execute_query_on_database(sql_query: str, sql_query_args: list, db_name: str = 'meals_database.db',
+                              max_rows: int = QUERY_MAX_ROWS, max_bytes: int = QUERY_MAX_BYTES) -> list:
     """Connect to the SQLite database and execute a query.
+    Statements that only read run on a read-only connection, and their
+    results are cached until the data changes. Other statements run on the
+    read-write connection and clear the cached results.
     Args:
         sql_query (str): The SQL query to execute.
         sql_query_args (list): The arguments for the SQL query.
         db_name (str): The name of the SQLite database file.
+        max_rows (int): The maximum number of rows returned.
+        max_bytes (int): The maximum approximate size of the returned values.
     Returns:
-        list: The result of the query as a list of tuples.
+        list: The result of the query as a list of tuples. A longer result is cut off and its
+            last row is a one-element tuple starting with QUERY_TRUNCATED_MARKER.
     """
+    key = (db_name, sql_query, json.dumps(sql_query_args, sort_keys=True, default=repr), max_rows, max_bytes)
+    # Read before the query, so a write committed while it runs makes the next call miss
+    version = get_data_version(db_name)
+    with _query_cache_lock:
+        # Only read-only statements are cached, so a hit needs no classification
+        entry = _query_cache.get(key)
+        if entry is not None and entry[0] == version:
+            _query_cache.move_to_end(key)
+            _query_cache_stats['hits'] += 1
+            return list(entry[1])
+
+    if not is_read_only_query(sql_query, sql_query_args, db_name):
+        conn = get_connection(db_name)
+        try:
+            with conn:
+                changes_before = conn.total_changes
+                result = _fetch_capped(conn.execute(sql_query, sql_query_args), max_rows, max_bytes)
+                if conn.total_changes != changes_before:
+                    _sync_meal_ingredients(conn)
+                return result
+        finally:
+            clear_query_cache(db_name)
 
-    initialize_database(db_name)  # Ensure the database and table are initialized
-    with sqlite3.connect(db_name) as conn:
-        cursor = conn.cursor()
-        cursor.execute(sql_query, sql_query_args)
-        return cursor.fetchall()
+    with _query_cache_lock:
+        _query_cache_stats['misses'] += 1
+    conn = _connect(db_name, read_only=True)
+    result = _fetch_capped(conn.execute(sql_query, sql_query_args), max_rows, max_bytes)
+    with _query_cache_lock:
+        _query_cache[key] = (version, result)
+        _query_cache.move_to_end(key)
+        while len(_query_cache) > QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    return list(result)
 
+@tracing.traced_function("db_query")
 def cleanup_database(db_name: str = 'meals_database.db') -> None:
     """Clean up the database by removing all records from the meals table.
     Args:
         db_name (str): The name of the SQLite database file.
     """
-    with sqlite3.connect(db_name) as conn:
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM meals')
-        conn.commit()
+    conn = get_connection(db_name)
+    with conn:
+        conn.execute('DELETE FROM meals')
 
+@tracing.traced_function("db_query")
 def get_all_meal_records_from_db(db_name: str = 'meals_database.db') -> list:
     """Fetch all meal records from the database.
     Args:
@@ -52,15 +600,10 @@ def get_all_meal_records_from_db(db_name: str = 'meals_database.db') -> list:
         list: A list of meal records, where each record is a tuple containing meal details:
         (id, meal_name, grocery_items, able_to_make_more_for_lunch, cuisine).
     """
-    initialize_database(db_name)  # Ensure the database and table are initialized
-
-    # Using a context manager to ensure the connection is closed properly
-    with sqlite3.connect(db_name) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM meals')
-        meal_records = cursor.fetchall()
-    return meal_records
+    conn = get_connection(db_name)
+    return conn.execute('SELECT * FROM meals').fetchall()
 
+@tracing.traced_function("db_query")
 def add_meal_to_db(meal_name: str, grocery_items: str, able_to_make_more_for_lunch: bool, cuisine: str, db_name: str = 'meals_database.db') -> None:
     """Add a new meal to the database.
     Args:
@@ -69,16 +612,467 @@ def add_meal_to_db(meal_name: str, grocery_items: str, able_to_make_more_for_lun
         able_to_make_more_for_lunch (bool): Whether more can be made for lunch.
         cuisine (str): The type of cuisine.
         db_name (str): The name of the SQLite database file.
+    Raises:
+        sqlite3.IntegrityError: If a meal with the same name already exists.
     """
-    initialize_database(db_name)  # Ensure the database and table are initialized
-
-    with sqlite3.connect(db_name) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+    conn = get_connection(db_name)
+    with conn:
+        cursor = conn.execute('''
             INSERT INTO meals (meal_name, grocery_items, able_to_make_more_for_lunch, cuisine)
             VALUES (?, ?, ?, ?)
         ''', (meal_name, grocery_items, able_to_make_more_for_lunch, cuisine))
-        conn.commit()
+        _store_meal_ingredients(conn, cursor.lastrowid, grocery_items)
+
+MEAL_COLUMNS = ("id", "meal_name", "grocery_items", "able_to_make_more_for_lunch", "cuisine")
+
+@tracing.traced_function("db_query")
+def add_meals_to_db(meals: list, db_name: str = 'meals_database.db') -> int:
+    """Add a batch of meals to the database in a single transaction.
+    Args:
+        meals (list): A list of (meal_name, grocery_items, able_to_make_more_for_lunch, cuisine) tuples.
+        db_name (str): The name of the SQLite database file.
+    Returns:
+        int: The number of meals added.
+    Raises:
+        sqlite3.IntegrityError: If any of the meals already exists. Nothing from the batch is added then.
+    """
+    if not meals:
+        return 0
+    conn = get_connection(db_name)
+    with conn:
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM meals').fetchone()[0]
+        conn.executemany('''
+            INSERT INTO meals (meal_name, grocery_items, able_to_make_more_for_lunch, cuisine)
+            VALUES (?, ?, ?, ?)
+        ''', meals)
+        new_meals = conn.execute('SELECT id, grocery_items FROM meals WHERE id > ?', (last_id,)).fetchall()
+        for meal_id, grocery_items in new_meals:
+            _store_meal_ingredients(conn, meal_id, grocery_items)
+    return len(meals)
+
+@tracing.traced_function("db_query")
+def get_all_meal_names(db_name: str = 'meals_database.db') -> list:
+    """Fetch the names of all meals in the database.
+    Args:
+        db_name (str): The name of the SQLite database file.
+    Returns:
+        list: A list of meal names.
+    """
+    conn = get_connection(db_name)
+    return [row[0] for row in conn.execute('SELECT meal_name FROM meals')]
+
+@tracing.traced_function("db_query")
+def get_cuisines(db_name: str = 'meals_database.db') -> list:
+    """Fetch the distinct cuisines of the meals in the database.
+    Args:
+        db_name (str): The name of the SQLite database file.
+    Returns:
+        list: A list of cuisines, as they are spelled in the database.
+    """
+    conn = get_connection(db_name)
+    # Jumps from one cuisine to the next in idx_meals_cuisine, instead of reading every meal's entry
+    return [row[0] for row in conn.execute('''
+        WITH RECURSIVE cuisines (cuisine) AS (
+            SELECT MIN(cuisine) FROM meals WHERE cuisine > ''
+            UNION ALL
+            SELECT (SELECT MIN(cuisine) FROM meals WHERE cuisine > cuisines.cuisine)
+            FROM cuisines WHERE cuisine IS NOT NULL
+        )
+        SELECT cuisine FROM cuisines WHERE cuisine IS NOT NULL
+    ''')]
+
+def iter_meal_records(batch_size: int = 1000, db_name: str = 'meals_database.db', columns: list = None):
+    """Iterate over all meal records in batches, ordered by id.
+    Args:
+        batch_size (int): The number of records fetched per batch.
+        db_name (str): The name of the SQLite database file.
+        columns (list): The columns to return, any of MEAL_COLUMNS. Defaults to all columns.
+    Yields:
+        list: A list of at most batch_size meal records with the requested columns.
+    Raises:
+        ValueError: If an unknown column is requested.
+    """
+    columns = list(columns or MEAL_COLUMNS)
+    unknown_columns = [column for column in columns if column not in MEAL_COLUMNS]
+    if unknown_columns:
+        raise ValueError(f"Unknown columns {unknown_columns}. Valid columns are {list(MEAL_COLUMNS)}.")
+    conn = get_connection(db_name)
+    cursor = conn.execute(f'SELECT {", ".join(columns)} FROM meals ORDER BY id')
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        yield batch
+
+@tracing.traced_function("db_query")
+def get_meal_records_page(after_id: int = 0, page_size: int = 50, columns: list = None, cuisine: str = None,
+                          able_to_make_more_for_lunch: bool = None, ingredient: str = None,
+                          db_name: str = 'meals_database.db') -> tuple:
+    """Fetch one page of meal records using keyset pagination on the meal id.
+    Args:
+        after_id (int): Only return meals with an id greater than this. Use 0 for the first page
+            and the returned next cursor for the following pages.
+        page_size (int): The maximum number of records to return.
+        columns (list): The columns to return, any of MEAL_COLUMNS. Defaults to all columns.
+        cuisine (str): Only return meals of this cuisine (case-insensitive).
+        able_to_make_more_for_lunch (bool): Only return meals with this leftover flag.
+        ingredient (str): Only return meals with an ingredient containing this text (case-insensitive).
+        db_name (str): The name of the SQLite database file.
+    Returns:
+        tuple: (records, next_cursor). records is a list of tuples with the requested columns
+        in the requested order. next_cursor is the after_id of the next page, or None if this is the last page.
+    Raises:
+        ValueError: If an unknown column is requested or page_size is not positive.
+    """
+    columns = list(columns or MEAL_COLUMNS)
+    unknown_columns = [column for column in columns if column not in MEAL_COLUMNS]
+    if unknown_columns:
+        raise ValueError(f"Unknown columns {unknown_columns}. Valid columns are {list(MEAL_COLUMNS)}.")
+    if page_size <= 0:
+        raise ValueError("page_size must be a positive integer.")
+
+    conditions = ["id > ?"]
+    args = [after_id]
+    if cuisine is not None:
+        conditions.append("cuisine = ? COLLATE NOCASE")
+        args.append(cuisine)
+    if able_to_make_more_for_lunch is not None:
+        conditions.append("able_to_make_more_for_lunch = ?")
+        args.append(bool(able_to_make_more_for_lunch))
+    if ingredient is not None:
+        conditions.append('''EXISTS (
+            SELECT 1 FROM meal_ingredients
+            JOIN ingredients ON ingredients.id = meal_ingredients.ingredient_id
+            WHERE meal_ingredients.meal_id = meals.id AND ingredients.name LIKE ?
+        )''')
+        args.append(f"%{ingredient}%")
+
+    # Fetch one extra row to know whether there is a next page
+    conn = get_connection(db_name)
+    rows = conn.execute(f'''
+        SELECT id, {', '.join(columns)} FROM meals
+        WHERE {' AND '.join(conditions)}
+        ORDER BY id
+        LIMIT ?
+    ''', args + [page_size + 1]).fetchall()
+
+    next_cursor = rows[page_size - 1][0] if len(rows) > page_size else None
+    records = [row[1:] for row in rows[:page_size]]
+    return records, next_cursor
+
+@tracing.traced_function("db_query")
+def meal_exists(meal_name: str, db_name: str = 'meals_database.db') -> bool:
+    """Check whether a meal with the given name is already in the database.
+    This is an index lookup on meal_name, so it does not scan the table.
+    Args:
+        meal_name (str): The name of the meal.
+        db_name (str): The name of the SQLite database file.
+    Returns:
+        bool: True if the meal exists.
+    """
+    conn = get_connection(db_name)
+    return conn.execute('SELECT 1 FROM meals WHERE meal_name = ?', (meal_name,)).fetchone() is not None
+
+# Words that carry no meaning in a meal search, e.g. in "what can I make with spinach and paneer"
+SEARCH_STOPWORDS = frozenset((
+    "a", "an", "and", "any", "are", "can", "do", "for", "have", "i", "in", "is", "make", "me", "my",
+    "of", "on", "or", "some", "that", "the", "to", "using", "what", "which", "with",
+))
+
+def _search_terms(query: str) -> list:
+    """Split free text into unique lowercase search words, without stopwords.
+    Only word characters are kept, so FTS5 operators and punctuation in the text are not interpreted.
+    """
+    words = [word for word in re.findall(r"\w+", query.lower()) if word not in SEARCH_STOPWORDS]
+    return list(dict.fromkeys(words))
+
+@tracing.traced_function("db_query")
+def search_meals(query: str, limit: int = 10, db_name: str = 'meals_database.db') -> list:
+    """Find the meals that best match some words in their name, grocery items or cuisine.
+    Meals containing all the words are returned, or if there are none, meals containing any
+    of them. Meals with the words in their name come first, best match first.
+    Words match their inflections too, e.g. "tomato" matches "Tomatoes".
+    Args:
+        query (str): Words to look for, e.g. "spinach paneer".
+        limit (int): The maximum number of meals to return.
+        db_name (str): The name of the SQLite database file.
+    Returns:
+        list: Meal records as tuples of MEAL_COLUMNS, best match first.
+    Raises:
+        ValueError: If limit is not positive.
+    """
+    if limit <= 0:
+        raise ValueError("limit must be a positive integer.")
+    terms = [f'"{term}"' for term in _search_terms(query)]
+    if not terms:
+        return []
+    conn = get_connection(db_name)
+    columns = ', '.join(f'meals.{column}' for column in MEAL_COLUMNS)
+
+    def matching_ids(match: str, ranked: bool, exclude: list = ()) -> list:
+        return [row[0] for row in conn.execute(f'''
+            SELECT rowid FROM meals_fts
+            WHERE meals_fts MATCH ? AND rowid NOT IN ({', '.join('?' * len(exclude))})
+            {'ORDER BY rank' if ranked else ''}
+            LIMIT ?
+        ''', (match, *exclude, limit - len(exclude))).fetchall()]
+
+    # bm25 has to score every matching meal, and a common ingredient matches
+    # thousands of them. Meal names are short and rarely match, so only those
+    # are ranked; the remaining matches follow in catalog order.
+    all_terms = " AND ".join(terms)
+    ids = matching_ids(f"{{meal_name}} : ({all_terms})", ranked=True)
+    if len(ids) < limit:
+        ids += matching_ids(all_terms, ranked=False, exclude=ids)
+    if not ids and len(terms) > 1:
+        # Nothing has all the words, so rank by how many of them and how well each meal matches
+        ids = matching_ids(" OR ".join(terms), ranked=True)
+    if not ids:
+        return []
+    records = {row[0]: row for row in conn.execute(f'''
+        SELECT {columns} FROM meals WHERE id IN ({', '.join('?' * len(ids))})
+    ''', ids).fetchall()}
+    return [records[meal_id] for meal_id in ids]
+
+MEAL_PLAN_DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+MEAL_PLAN_SLOTS = ("Lunch", "Dinner")
+
+def week_start_of(day=None) -> str:
+    """Return the Monday of the week a date falls in, as an ISO date string.
+    Args:
+        day (datetime.date | str): A date, or an ISO date string such as "2025-06-18". Defaults to today.
+    Returns:
+        str: The Monday of that week, e.g. "2025-06-16".
+    Raises:
+        ValueError: If day is not a valid ISO date.
+    """
+    if day is None:
+        day = datetime.date.today()
+    elif isinstance(day, str):
+        day = datetime.date.fromisoformat(day)
+    return (day - datetime.timedelta(days=day.weekday())).isoformat()
+
+def _insert_meal_plan(conn: sqlite3.Connection, lunch_list: list, dinner_list: list, week_start: str,
+                      household: str = DEFAULT_HOUSEHOLD) -> int:
+    """Insert a plan as the next version of its household's week and return that version. Must run inside a transaction."""
+    if len(lunch_list) != len(MEAL_PLAN_DAYS) or len(dinner_list) != len(MEAL_PLAN_DAYS):
+        raise ValueError("Both lunch and dinner lists must contain exactly 7 meals.")
+    # A single statement picks the next version, so concurrent writers cannot both claim it
+    plan_id = conn.execute('''
+        INSERT INTO meal_plans (household, week_start, version)
+        SELECT ?, ?, COALESCE(MAX(version), 0) + 1 FROM meal_plans WHERE household = ? AND week_start = ?
+    ''', (household, week_start, household, week_start)).lastrowid
+    version = conn.execute('SELECT version FROM meal_plans WHERE id = ?', (plan_id,)).fetchone()[0]
+    conn.executemany(
+        'INSERT INTO meal_plan_entries (plan_id, day, slot, meal_name) VALUES (?, ?, ?, ?)',
+        [(plan_id, day, slot, str(meal_name))
+         for slot, meal_names in zip(MEAL_PLAN_SLOTS, (lunch_list, dinner_list))
+         for day, meal_name in enumerate(meal_names)])
+    return version
+
+@tracing.traced_function("db_query")
+def save_meal_plan(lunch_list: list, dinner_list: list, week_start: str = None, db_name: str = 'meals_database.db',
+                   household: str = DEFAULT_HOUSEHOLD) -> dict:
+    """Save a weekly meal plan as a new version of its week, in one transaction.
+    Earlier versions of the week are kept.
+    Args:
+        lunch_list (list): The 7 lunches, Monday first.
+        dinner_list (list): The 7 dinners, Monday first.
+        week_start (str): Any ISO date in the week the plan is for. Defaults to the current week.
+        db_name (str): The name of the SQLite database file.
+        household (str): The household the plan is for. Every household has its own versions.
+    Returns:
+        dict: {"week_start": the Monday of the week, "version": the version number of the saved plan}.
+    Raises:
+        ValueError: If lunch_list or dinner_list does not contain exactly 7 meals, or week_start is not a date.
+    """
+    week_start = week_start_of(week_start)
+    conn = get_connection(db_name)
+    with conn:
+        version = _insert_meal_plan(conn, lunch_list, dinner_list, week_start, household)
+    return {"week_start": week_start, "version": version}
+
+def _find_meal_plan(conn: sqlite3.Connection, week_start: str, version: int, household: str) -> tuple:
+    """Return the (id, week_start, version, created_at) row of the plan get_meal_plan fetches, or None."""
+    if week_start is None:
+        condition, args = 'week_start <= ?', [week_start_of()]
+    else:
+        condition, args = 'week_start = ?', [week_start_of(week_start)]
+    if version is not None:
+        condition += ' AND version = ?'
+        args.append(version)
+    return conn.execute(f'''
+        SELECT id, week_start, version, created_at FROM meal_plans
+        WHERE household = ? AND {condition}
+        ORDER BY week_start DESC, version DESC
+        LIMIT 1
+    ''', [household] + args).fetchone()
+
+@tracing.traced_function("db_query")
+def get_meal_plan(week_start: str = None, version: int = None, db_name: str = 'meals_database.db',
+                  household: str = DEFAULT_HOUSEHOLD) -> dict:
+    """Fetch a weekly meal plan.
+    Args:
+        week_start (str): Any ISO date in the week to fetch. Defaults to the current week or,
+            if it has no plan yet, the most recent earlier week with one.
+        version (int): The version to fetch. Defaults to the latest version of the week.
+        db_name (str): The name of the SQLite database file.
+        household (str): The household whose plan to fetch.
+    Returns:
+        dict: {"household", "week_start", "version", "created_at", "Lunch": [7 meal names], "Dinner": [7 meal names]},
+        or None if there is no such plan.
+    Raises:
+        ValueError: If week_start is not a date.
+    """
+    conn = get_connection(db_name)
+    plan = _find_meal_plan(conn, week_start, version, household)
+    if plan is None:
+        return None
+    plan_id, week_start, version, created_at = plan
+    meal_plan = {"household": household, "week_start": week_start, "version": version, "created_at": created_at,
+                 **{slot: [None] * len(MEAL_PLAN_DAYS) for slot in MEAL_PLAN_SLOTS}}
+    for day, slot, meal_name in conn.execute(
+            'SELECT day, slot, meal_name FROM meal_plan_entries WHERE plan_id = ?', (plan_id,)):
+        meal_plan[slot][day] = meal_name
+    return meal_plan
+
+def _served_plans_sql(weeks: int, before_week: str, household: str) -> tuple:
+    """SQL selecting the latest version of every plan of a household in the given number of weeks before before_week."""
+    before = datetime.date.fromisoformat(week_start_of(before_week))
+    since = (before - datetime.timedelta(weeks=weeks)).isoformat()
+    # Only the latest version of a week was actually served
+    return '''
+        SELECT MAX(id) FROM meal_plans
+        WHERE household = ? AND week_start >= ? AND week_start < ?
+        GROUP BY week_start
+    ''', [household, since, before.isoformat()]
+
+@tracing.traced_function("db_query")
+def get_recently_served_meals(weeks: int, before_week: str = None, db_name: str = 'meals_database.db',
+                              household: str = DEFAULT_HOUSEHOLD) -> set:
+    """Return the names of the meals planned in the given number of weeks before a week.
+    Args:
+        weeks (int): How many weeks to look back.
+        before_week (str): Any ISO date in the week to look back from. That week itself is not included.
+            Defaults to the current week.
+        db_name (str): The name of the SQLite database file.
+        household (str): The household whose plans to look at.
+    Returns:
+        set: The meal names.
+    """
+    if weeks <= 0:
+        return set()
+    plans_sql, args = _served_plans_sql(weeks, before_week, household)
+    conn = get_connection(db_name)
+    return {row[0] for row in conn.execute(f'''
+        SELECT DISTINCT meal_name FROM meal_plan_entries WHERE plan_id IN ({plans_sql})
+    ''', args)}
+
+@tracing.traced_function("db_query")
+def get_meals_not_served_in_weeks(weeks: int, before_week: str = None, db_name: str = 'meals_database.db',
+                                  household: str = DEFAULT_HOUSEHOLD) -> list:
+    """Return the meals in the database that were not planned in the given number of weeks before a week.
+    Args:
+        weeks (int): How many weeks to look back.
+        before_week (str): Any ISO date in the week to look back from. That week itself is not included.
+            Defaults to the current week.
+        db_name (str): The name of the SQLite database file.
+        household (str): The household whose plans to look at.
+    Returns:
+        list: The meal names, in the order they were added to the database.
+    """
+    plans_sql, args = _served_plans_sql(max(weeks, 0), before_week, household)
+    conn = get_connection(db_name)
+    return [row[0] for row in conn.execute(f'''
+        SELECT meal_name FROM meals
+        WHERE NOT EXISTS (
+            SELECT 1 FROM meal_plan_entries
+            WHERE meal_plan_entries.meal_name = meals.meal_name AND plan_id IN ({plans_sql})
+        )
+        ORDER BY id
+    ''', args)]
+
+GROCERY_COLUMNS = ("grocery_item", "quantity", "unit")
+
+def _grocery_totals(conn: sqlite3.Connection, entries_sql: str, args: list) -> list:
+    """Add up the ingredient vectors of the meals cooked for the selected plan entries.
+    entries_sql selects (plan_id, day, slot, meal_name) rows. Every entry is one portion,
+    so a meal planned twice counts twice, and a lunch made from the previous day's dinner
+    counts as a second portion cooked with that dinner.
+    """
+    rows = conn.execute(f'''
+        WITH planned AS ({entries_sql}),
+        cooked (meal_name, times) AS (
+            SELECT meal_name, COUNT(*) FROM planned GROUP BY meal_name
+        )
+        SELECT ingredients.name, SUM(meal_ingredients.quantity * cooked.times), meal_ingredients.unit
+        FROM cooked
+        JOIN meals ON meals.meal_name = cooked.meal_name
+        JOIN meal_ingredients ON meal_ingredients.meal_id = meals.id
+        JOIN ingredients ON ingredients.id = meal_ingredients.ingredient_id
+        GROUP BY meal_ingredients.ingredient_id, meal_ingredients.unit
+        ORDER BY ingredients.name, meal_ingredients.unit
+    ''', args).fetchall()
+    return [(name, int(quantity) if quantity == int(quantity) else round(quantity, 2), unit)
+            for name, quantity, unit in rows]
+
+@tracing.traced_function("db_query")
+def get_plan_grocery_list(week_start: str = None, version: int = None, db_name: str = 'meals_database.db',
+                          household: str = DEFAULT_HOUSEHOLD) -> list:
+    """Compute the grocery list of one weekly meal plan.
+    Args:
+        week_start (str): Any ISO date in the week of the plan. Defaults to the plan get_meal_plan shows.
+        version (int): The version of the plan. Defaults to the latest version of the week.
+        db_name (str): The name of the SQLite database file.
+        household (str): The household whose plan to use.
+    Returns:
+        list: (grocery_item, quantity, unit) tuples sorted by grocery item. The unit is "" for
+        items without a quantity, whose quantity is the number of meals that need them.
+    Raises:
+        ValueError: If week_start is not a date.
+    """
+    conn = get_connection(db_name)
+    plan = _find_meal_plan(conn, week_start, version, household)
+    if plan is None:
+        return []
+    return _grocery_totals(conn, '''
+        SELECT plan_id, day, slot, meal_name FROM meal_plan_entries WHERE plan_id = ?
+    ''', [plan[0]])
+
+@tracing.traced_function("db_query")
+def get_grocery_list(start_date: str = None, end_date: str = None, households: list = None,
+                     db_name: str = 'meals_database.db') -> list:
+    """Compute the grocery list of every meal planned between two dates, for any number of households.
+    The latest version of each household's weekly plan is used.
+    Args:
+        start_date (str): The first day, as an ISO date. Defaults to the Monday of the current week.
+        end_date (str): The last day, as an ISO date. Defaults to the Sunday after start_date.
+        households (list): The households to shop for. Defaults to all of them.
+        db_name (str): The name of the SQLite database file.
+    Returns:
+        list: (grocery_item, quantity, unit) tuples sorted by grocery item. The unit is "" for
+        items without a quantity, whose quantity is the number of meals that need them.
+    Raises:
+        ValueError: If a date is not a valid ISO date, or end_date is before start_date.
+    """
+    start = datetime.date.fromisoformat(start_date or week_start_of())
+    end = datetime.date.fromisoformat(end_date) if end_date else start + datetime.timedelta(days=6)
+    if end < start:
+        raise ValueError("end_date must not be before start_date.")
+    condition, args = 'week_start >= ? AND week_start <= ?', [week_start_of(start), end.isoformat()]
+    if households is not None:
+        if not households:
+            return []
+        condition += f" AND household IN ({', '.join(['?'] * len(households))})"
+        args.extend(households)
+    conn = get_connection(db_name)
+    return _grocery_totals(conn, f'''
+        SELECT plan_id, day, slot, meal_name
+        FROM meal_plan_entries
+        JOIN meal_plans ON meal_plans.id = meal_plan_entries.plan_id
+        WHERE plan_id IN (SELECT MAX(id) FROM meal_plans WHERE {condition} GROUP BY household, week_start)
+          AND date(week_start, '+' || day || ' days') BETWEEN ? AND ?
+    ''', args + [start.isoformat(), end.isoformat()])
 
 # Example usage
 if __name__ == "__main__":
@@ -108,4 +1102,3 @@ if __name__ == "__main__":
     print("All meal records:", meals)
     meal_names = [meal[1] for meal in meals]  # Extracting meal names from the records
     print("Available meal names:", meal_names)
-
@@ -1,62 +1,106 @@
 import gradio as gr
 import pandas as pd
 
-def display_meals() -> pd.DataFrame:
-    from utils.database import get_all_meal_records_from_db
-    meal_records = get_all_meal_records_from_db()
+from utils import database, intent_router, tracing
+from utils.agent_pool import LoadingStatus
+from utils.cache import ChangeAwareCache
+
+# The tables only change when the database changes, so Refresh clicks on
+# unchanged data are served from this cache.
+table_cache = ChangeAwareCache()
+tracing.register_stats_provider("table_cache", table_cache.stats)
+
+def _build_meals_table() -> pd.DataFrame:
+    meal_records = database.get_all_meal_records_from_db()
     df = pd.DataFrame(meal_records, columns=["ID", "Meal Name", "Grocery Items", "Able to Make More for Lunch", "Cuisine"])
     return df
 
-def display_plan() -> pd.DataFrame:
+@tracing.traced_function("gradio_refresh")
+def display_meals() -> pd.DataFrame:
+    return table_cache.get("meals", database.get_data_version(), _build_meals_table)
+
+def _build_plan_table() -> pd.DataFrame:
     # Monday, Tuesday, Wednesday, Thursday, Friday, Saturday, Sunday
-    # Load the data with lines=True for line-delimited JSON
-    df = pd.read_json('meal_plan.json')
+    meal_plan = database.get_meal_plan()
+    if meal_plan is None:
+        return pd.DataFrame(columns=["Day", "Lunch", "Dinner"])
+    df = pd.DataFrame({"Lunch": meal_plan["Lunch"], "Dinner": meal_plan["Dinner"]})
     first_col = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
     # Insert the new column at the beginning 
     df.insert(loc=0, column="Day", value=first_col)
     return df
 
+@tracing.traced_function("gradio_refresh")
+def display_plan() -> pd.DataFrame:
+    # The current week also changes on Mondays, without the database changing
+    version = (database.get_data_version(), database.week_start_of())
+    return table_cache.get("plan", version, _build_plan_table)
+
+def _build_grocery_table() -> pd.DataFrame:
+    # The totals are added up in SQL from the ingredient vectors stored with every meal
+    grocery_items_df = pd.DataFrame(database.get_plan_grocery_list(), columns=["Grocery Item", "Quantity", "Unit"])
+    return grocery_items_df
+
+@tracing.traced_function("gradio_refresh")
 def display_grocery_list()-> pd.DataFrame:
-    """Reads the meal_plan.json, gets the meals in the current week's plan.
+    """Gets the meals in the current week's plan.
     Then gets the grocery items for the meals.
-    Counts the grocery items across all meals
-    and creates a grocery list with quantities.
+    Adds up the quantities of the grocery items over every meal that is cooked,
+    so a meal planned twice counts twice and a leftover lunch is a second portion of the dinner before it.
     Finally, sorts the grocery list alphabetically by item name.
     Returns the grocery list as a dataframe.
+    The list is cached until the database or the current week changes.
     Args:
         None
     Returns:
-        pd.DataFrame: A dataframe with two columns: "Grocery Item" and "Quantity
+        pd.DataFrame: A dataframe with three columns: "Grocery Item", "Quantity" and "Unit".
     """
-    meal_plan_df = pd.read_json('meal_plan.json')
-    meal_names = meal_plan_df.values.flatten().tolist()
-    sql_query = f"SELECT grocery_items FROM meals WHERE meal_name IN ({', '.join(['?']*len(meal_names))})"
-    from utils.database import execute_query_on_database
-    grocery_dict = {}
-    grocery_items = execute_query_on_database(sql_query, tuple(meal_names))
-    for items_in_one_meal in grocery_items:
-        # Each element is a tuple with one string separated by commas
-        for item in items_in_one_meal[0].split(', '):
-            if item in grocery_dict:
-                grocery_dict[item] += 1
+    version = (database.get_data_version(), database.week_start_of())
+    return table_cache.get("grocery_list", version, _build_grocery_table)
+
+def get_table_cache_stats() -> dict:
+    """Return the hit and miss counts of the cache behind the table tabs."""
+    return table_cache.stats()
+
+def _get_chat_fn(agent_pool):
+    """Build the chat handler that streams the session's agent run into the chat.
+    Simple requests are answered by the intent router, without running the agent.
+    """
+    def chat(message, _history, request: gr.Request):
+        routed = intent_router.answer(message)
+        if routed is not None:
+            # Shown like the final answer of an agent run
+            yield [gr.ChatMessage(role="assistant", content=f"**Final answer:**\n{routed}\n", metadata={"status": "done"})]
+            return
+        session_id = request.session_hash if request else "default"
+        messages = []
+        for event in agent_pool.stream_run(session_id, message):
+            if isinstance(event, LoadingStatus):
+                yield event.message
+            elif isinstance(event, int):
+                yield f"All agents are busy. Your request is number {event} in the queue..."
+            elif isinstance(event, gr.ChatMessage):
+                messages.append(event)
+                yield messages
             else:
-                grocery_dict[item] = 1
-    grocery_items_df = pd.DataFrame(grocery_dict.items(), columns=["Grocery Item", "Quantity"])
-    grocery_items_df = grocery_items_df.sort_values(by="Grocery Item").reset_index(drop=True)
-    return grocery_items_df
+                # Partial model output of the step that is currently running
+                yield messages + [gr.ChatMessage(role="assistant", content=event)]
+    return chat
 
-def get_gradio_interface(agent) -> gr.Blocks:
+def get_gradio_interface(agent_pool) -> gr.Blocks:
     chat_tab = gr.ChatInterface(
-        fn=lambda message, _history: str(agent.run(message)),
+        fn=_get_chat_fn(agent_pool),
         type="messages",
+        # The agent pool limits and queues concurrent runs itself
+        concurrency_limit=None,
         examples=["Fetch all the meals from the database", "Add a new meal to the database", "Generate a meal plan for the week"],
         title="Agent with MCP Tools to manage your Meal Plans",
         description="This is a simple agent that uses MCP tools to help you manage your meal plans. You can ask it to fetch all meals, add new meals, and more.",
     )
 
     with gr.Blocks() as grocery_block:
-        plan_tab = gr.DataFrame(headers=["Groccery Item", "Quantity"],
+        plan_tab = gr.DataFrame(headers=["Groccery Item", "Quantity", "Unit"],
                                   value=display_grocery_list(),
                                   interactive=True,
                                   label="Grocery List")
@@ -0,0 +1,221 @@
+"""Rule-based routing of common chat requests straight to the meal planner tools.
+
+Most chat messages are one of a few simple requests, like the examples of
+the chat tab ("Fetch all the meals from the database", "Generate a meal
+plan for the week") or "show this week's plan". The agent answers each of
+them with a single tool call, but only after several model-bound steps.
+
+`route()` recognizes these requests with regular expressions and `answer()`
+calls the tool function in process, which takes milliseconds. The grocery
+list comes from the function behind the Grocery List tab instead of the
+get_grocery_list tool (which adds up all households), so the chat and the
+tab show the same list. A message
+that matches no rule, or lacks something the tool needs (e.g. the cuisine
+of a new meal, which must be one the database already has), returns None
+and is left to the agent.
+
+Set MEALPLAN_INTENT_ROUTER=0 to send every message to the agent.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+from utils import tracing
+
+ROUTER_ENABLED = os.getenv("MEALPLAN_INTENT_ROUTER", "1") != "0"
+# Longer tables are cut off in the chat, the Meals in Database tab has all rows
+MAX_TABLE_ROWS = 100
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+_POLITE = r"(?:(?:please|can you|could you|would you|kindly)\s+)?"
+_THIS_WEEK = r"(?:\s+for\s+(?:the|this)\s+(?:current\s+)?week)?"
+
+
+class Intent:
+    """A recognized request: the tool that answers it and the tool's arguments."""
+
+    def __init__(self, name: str, tool: str, arguments: dict):
+        self.name = name
+        self.tool = tool
+        self.arguments = arguments
+
+    def __repr__(self) -> str:
+        return f"Intent({self.name!r}, {self.tool!r}, {self.arguments!r})"
+
+
+def _split_items(grocery_items: str) -> str:
+    # Only commas separate items, since "and" is part of items like "Salt and pepper"
+    items = [item.strip() for item in grocery_items.split(",") if item.strip()]
+    return ", ".join(items)
+
+
+def _known_cuisine(word: str) -> str:
+    """Return the cuisine of the database that word names, or None if it is not a cuisine there."""
+    # Imported here, so the app does not load the MCP server module before the first routed message
+    from utils import database, mcp_server
+
+    cuisines = {cuisine.lower(): cuisine for cuisine in database.get_cuisines(mcp_server.DB_NAME)}
+    return cuisines.get(word.lower())
+
+
+def _add_meal_arguments(match: re.Match) -> dict:
+    # The tool needs a cuisine. Any other word before "meal" (e.g. "a quick meal"),
+    # or a cuisine the database does not have yet, is left to the model.
+    if not match["cuisine"]:
+        return None
+    cuisine = _known_cuisine(match["cuisine"].strip())
+    if cuisine is None:
+        return None
+    return {
+        "meal_name": match["meal_name"].strip(" '\""),
+        "grocery_items": _split_items(match["grocery_items"]),
+        "able_to_make_more_for_lunch": bool(match["leftovers"]),
+        "cuisine": cuisine,
+    }
+
+
+# (intent, tool, pattern, function building the tool arguments from the match or
+# returning None when the request is incomplete). The patterns see the message
+# with its whitespace collapsed and trailing punctuation removed.
+RULES = [
+    ("list_meals", "read_all_meal_records_from_db", re.compile(
+        rf"^{_POLITE}(?:fetch|list|show|get|display|read)(?:\s+me)?(?:\s+all)?(?:\s+of)?(?:\s+the|\s+my)?\s+meals"
+        r"(?:\s+(?:from|in)\s+(?:the\s+)?database)?(?:\s+please)?$"
+        r"|^what\s+meals\s+(?:do\s+i\s+have|are\s+(?:there|in\s+the\s+database))$", re.IGNORECASE),
+     lambda match: {}),
+    ("add_meal", "add_meal_to_db", re.compile(
+        rf"^{_POLITE}add\s+(?:an?\s+)?(?:new\s+)?(?P<cuisine>(?!meal\b|dish\b|recipe\b)[a-z]+\s+)?(?:meal|dish|recipe)"
+        r"(?:\s+called|\s+named)?\s+(?P<meal_name>.+?)(?:\s+to\s+the\s+database)?\s+with\s+(?P<grocery_items>.+?)"
+        r"(?P<leftovers>,?\s+(?:that|which)\s+(?:can\s+be|is)\s+(?:made|cooked)\s+(?:in\s+a\s+larger\s+quantity|for\s+lunch(?:\s+too)?))?"
+        r"(?:\s+to\s+the\s+database)?$", re.IGNORECASE),
+     _add_meal_arguments),
+    ("show_plan", "read_meal_plan", re.compile(
+        rf"^{_POLITE}(?:show|display|get|fetch|read|what(?:'s|\s+is))(?:\s+me)?(?:\s+this\s+week'?s|\s+the|\s+my)?"
+        rf"(?:\s+current|\s+weekly)?(?:\s+meal)?\s+plan{_THIS_WEEK}$", re.IGNORECASE),
+     lambda match: {}),
+    ("generate_plan", "generate_meal_plan", re.compile(
+        rf"^{_POLITE}(?:generate|create|make)(?:\s+me)?(?:\s+a|\s+the|\s+my)?(?:\s+new)?(?:\s+weekly)?\s+meal\s+plan"
+        rf"{_THIS_WEEK}$", re.IGNORECASE),
+     lambda match: {}),
+    ("grocery_list", "get_plan_grocery_list", re.compile(
+        rf"^{_POLITE}(?:show|display|get|make|what(?:'s|\s+is))(?:\s+me)?(?:\s+this\s+week'?s|\s+the|\s+my)?"
+        rf"\s+(?:grocery|shopping)\s+list{_THIS_WEEK}$", re.IGNORECASE),
+     lambda match: {}),
+    ("search_meals", "search_meals", re.compile(
+        r"^what\s+(?:can|could|should)\s+i\s+(?:make|cook)\s+with\s+(?P<query>.+)$", re.IGNORECASE),
+     lambda match: {"query": match["query"]}),
+]
+
+
+def route(message: str) -> Intent:
+    """Match a chat message against the routing rules.
+    Args:
+        message (str): The user message.
+    Returns:
+        Intent: The recognized request, or None if the message should go to the agent.
+    """
+    if not isinstance(message, str):
+        return None
+    text = re.sub(r"\s+", " ", message).strip().rstrip(".!?").strip()
+    for name, tool, pattern, build_arguments in RULES:
+        match = pattern.match(text)
+        if match:
+            arguments = build_arguments(match)
+            return Intent(name, tool, arguments) if arguments is not None else None
+    return None
+
+
+def _markdown_table(columns: list, rows: list, noun: str) -> str:
+    lines = ["| " + " | ".join(columns) + " |", "|" + " --- |" * len(columns)]
+    for row in rows[:MAX_TABLE_ROWS]:
+        lines.append("| " + " | ".join(str(value).replace("|", "\\|") for value in row) + " |")
+    if len(rows) > MAX_TABLE_ROWS:
+        lines.append(f"\n... and {len(rows) - MAX_TABLE_ROWS} more {noun}.")
+    return "\n".join(lines)
+
+
+def _format_plan(meal_plan: dict) -> str:
+    return _markdown_table(["Day", "Lunch", "Dinner"], list(zip(DAYS, meal_plan["Lunch"], meal_plan["Dinner"])), "days")
+
+
+def _format_meals(records: list) -> str:
+    if not records:
+        return "There are no meals in the database yet."
+    rows = [(name, grocery_items, "Yes" if leftovers else "No", cuisine)
+            for _, name, grocery_items, leftovers, cuisine in records]
+    return (f"There are {len(records)} meals in the database:\n\n"
+            + _markdown_table(["Meal", "Grocery Items", "Leftovers for Lunch", "Cuisine"], rows, "meals"))
+
+
+def _format_answer(intent: Intent, result) -> str:
+    """Turn a tool result into the markdown answer the agent would give."""
+    if intent.name == "list_meals":
+        return _format_meals(json.loads(result))
+    if intent.name == "search_meals":
+        records = json.loads(result)["records"]
+        if not records:
+            return f"No meals in the database match \"{intent.arguments['query']}\"."
+        return "These meals match:\n\n" + _format_meals(records).split("\n\n", 1)[1]
+    if intent.name == "show_plan":
+        meal_plan = json.loads(result)
+        if meal_plan is None:
+            return "There is no meal plan yet. Ask me to generate one."
+        return (f"Here is the meal plan for the week of {meal_plan['week_start']} "
+                f"(version {meal_plan['version']}):\n\n" + _format_plan(meal_plan))
+    if intent.name == "generate_plan":
+        return ("I generated and saved this meal plan for the week:\n\n" + _format_plan(json.loads(result))
+                + "\n\nRefresh the Meal Plan tab to see it.")
+    if intent.name == "grocery_list":
+        if not result:
+            return "There is nothing on the grocery list, since there is no meal plan yet. Ask me to generate one."
+        rows = [(item, f"{quantity} {unit}".strip()) for item, quantity, unit in result]
+        return ("Here is the grocery list of the meal plan in the Meal Plan tab:\n\n"
+                + _markdown_table(["Item", "Quantity"], rows, "items"))
+    return str(result)
+
+
+_stats_lock = threading.Lock()
+_stats = {"messages": 0, "routed": 0}
+
+
+def stats() -> dict:
+    """Return how many chat messages the router saw and how many it answered itself."""
+    with _stats_lock:
+        messages, routed = _stats["messages"], _stats["routed"]
+    return {"messages": messages, "routed": routed, "hit_rate": round(routed / messages, 4) if messages else 0.0}
+
+
+tracing.register_stats_provider("intent_router", stats)
+
+
+def answer(message: str) -> str:
+    """Answer a chat message without the agent, if it is one of the routed requests.
+    Args:
+        message (str): The user message.
+    Returns:
+        str: The markdown answer, or None if the message should go to the agent.
+    """
+    if not ROUTER_ENABLED:
+        return None
+    start, started = time.time(), time.perf_counter()
+    intent = route(message)
+    with _stats_lock:
+        _stats["messages"] += 1
+        _stats["routed"] += intent is not None
+    if intent is None:
+        tracing.record_span("intent_router", start, time.perf_counter() - started, labels={"intent": "none"})
+        return None
+
+    # Imported here, so the app does not load the MCP server module before the first routed message
+    from utils import database, mcp_server
+
+    # The grocery list is the one of the Grocery List tab: the current (or latest earlier) plan of the default household
+    module = database if intent.name == "grocery_list" else mcp_server
+    with tracing.span("intent_router", intent=intent.name):
+        try:
+            result = getattr(module, intent.tool)(**intent.arguments)
+        except (ValueError, TypeError) as e:
+            return f"I could not do that: {e}"
+        return _format_answer(intent, result)
@@ -0,0 +1,251 @@
+"""Response caching for the planning agent.
+
+- `SQLiteLRUCache` is a size-bounded LRU key/value store backed by a SQLite
+  file (or by memory with the path ":memory:").
+- `CachedModel` wraps a smolagents model and caches its responses on disk,
+  keyed on the normalized message list, the stop sequences and the model id.
+- `cache_read_only_tools` caches the results of read-only MCP tools keyed on
+  the database data version, and clears them whenever a write tool runs.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Generator
+
+from smolagents import ChatMessage, ChatMessageStreamDelta, Model, TokenUsage
+
+# MCP tools that only read the database. Their results can be reused until the data changes.
+READ_ONLY_TOOLS = {"read_all_meal_records_from_db", "get_all_meal_names_from_db", "read_meal_records", "search_meals",
+                   "read_meal_plan", "get_meals_not_served_recently", "get_grocery_list"}
+# Read-only tools whose defaults depend on the current week (this week's plan and grocery list, the
+# weeks before this one). Their results are also keyed on the week, so they expire when it rolls over.
+CURRENT_WEEK_TOOLS = {"read_meal_plan", "get_grocery_list", "get_meals_not_served_recently"}
+# MCP tools that may change the database. Running one clears the cached tool results.
+WRITE_TOOLS = {"add_meal_to_db", "import_meals", "cleanup_database", "execute_query_on_database", "generate_meal_plan",
+               "write_meal_plan_to_json_file"}
+
+
+def cache_key(*parts: Any) -> str:
+    """Hash JSON-serializable parts into a cache key."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class SQLiteLRUCache:
+    """A size-bounded least-recently-used cache of strings stored in SQLite."""
+
+    def __init__(self, path: str = ":memory:", max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            path (str): The SQLite file to store the cache in, or ":memory:".
+            max_bytes (int): The maximum total size of the cached values. Least recently used entries are evicted first.
+        """
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Return the cached value for key, or None if it is not cached."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        """Cache a value and evict least recently used entries until the cache fits in max_bytes."""
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock, self._conn:
+            replaced = self._conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                               (key, value, size, time.time()))
+            self._total_bytes += size - (replaced[0] if replaced else 0)
+            if self._total_bytes <= self.max_bytes:
+                return
+            while self._total_bytes > self.max_bytes:
+                oldest = self._conn.execute("SELECT key, size FROM cache ORDER BY last_access LIMIT 64").fetchall()
+                for old_key, old_size in oldest:
+                    if self._total_bytes <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM cache WHERE key = ?", (old_key,))
+                    self._total_bytes -= old_size
+                    self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every cached value."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        """Return the hit, miss and eviction counts, the hit rate and the current size."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _normalize_messages(messages: list) -> list:
+    """Reduce messages to (role, text) pairs with whitespace collapsed, so near-identical prompts share a key."""
+    normalized = []
+    for message in messages:
+        if isinstance(message, ChatMessage):
+            role, content = message.role, message.content
+        else:
+            role, content = message["role"], message.get("content")
+        if isinstance(content, list):
+            content = "\n".join(part.get("text", f"<{part.get('type')}>") for part in content)
+        normalized.append((str(getattr(role, "value", role)), " ".join(str(content or "").split())))
+    return normalized
+
+
+class CachedModel(Model):
+    """Wraps a smolagents model and serves repeated prompts from a persistent cache."""
+
+    def __init__(self, model: Model, cache: SQLiteLRUCache):
+        super().__init__(model_id=model.model_id)
+        self.model = model
+        self.cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        # Anything the agent needs beyond generate/generate_stream comes from the wrapped model.
+        model = self.__dict__.get("model")
+        if model is None:
+            raise AttributeError(name)
+        return getattr(model, name)
+
+    def _key(self, messages: list, stop_sequences: list, kwargs: dict) -> str:
+        return cache_key(self.model_id, _normalize_messages(messages), stop_sequences, kwargs)
+
+    @staticmethod
+    def _to_json(message: ChatMessage) -> str:
+        data = message.dict()
+        # The raw provider response may not be serializable, and a cached answer uses no tokens
+        data.pop("raw", None)
+        data.pop("token_usage", None)
+        return json.dumps(data)
+
+    def generate(self, messages: list, stop_sequences: list = None, response_format: dict = None,
+                 tools_to_call_from: list = None, **kwargs) -> ChatMessage:
+        cacheable = response_format is None and not tools_to_call_from
+        key = self._key(messages, stop_sequences, kwargs) if cacheable else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                message = ChatMessage.from_dict(json.loads(cached))
+                message.token_usage = TokenUsage(input_tokens=0, output_tokens=0)
+                return message
+        message = self.model.generate(messages, stop_sequences=stop_sequences, response_format=response_format,
+                                      tools_to_call_from=tools_to_call_from, **kwargs)
+        if key is not None:
+            self.cache.put(key, self._to_json(message))
+        return message
+
+    def generate_stream(self, messages: list, stop_sequences: list = None, response_format: dict = None,
+                        tools_to_call_from: list = None, **kwargs) -> Generator:
+        cacheable = response_format is None and not tools_to_call_from
+        key = self._key(messages, stop_sequences, kwargs) if cacheable else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield ChatMessageStreamDelta(content=json.loads(cached)["content"],
+                                             token_usage=TokenUsage(input_tokens=0, output_tokens=0))
+                return
+        content = []
+        for delta in self.model.generate_stream(messages, stop_sequences=stop_sequences, response_format=response_format,
+                                                tools_to_call_from=tools_to_call_from, **kwargs):
+            if delta.tool_calls:
+                key = None
+            if delta.content:
+                content.append(delta.content)
+            yield delta
+        if key is not None:
+            self.cache.put(key, json.dumps({"role": "assistant", "content": "".join(content), "tool_calls": None}))
+
+
+def cache_read_only_tools(tools: list, cache: SQLiteLRUCache, data_version: Callable[[], Any],
+                          current_week: Callable[[], Any] = None) -> list:
+    """Cache the results of the read-only MCP tools in place.
+    Results are keyed on the tool name, its arguments and the database data
+    version, so any committed write makes them miss. A write tool that
+    changed the data also clears the cache right away; one that did not, like
+    execute_query_on_database running a SELECT, leaves it alone.
+    Args:
+        tools (list): The agent's tools. Tools are modified in place.
+        cache (SQLiteLRUCache): Where to keep the results. Use an in-memory cache,
+            since data versions are only comparable within one process.
+        data_version (Callable[[], Any]): Returns the current database data version.
+        current_week (Callable[[], Any]): Returns the current week, added to the keys of CURRENT_WEEK_TOOLS.
+    Returns:
+        list: The same tools.
+    """
+    for tool in tools:
+        if tool.name in READ_ONLY_TOOLS:
+            version = data_version
+            if current_week is not None and tool.name in CURRENT_WEEK_TOOLS:
+                version = _with_current_week(data_version, current_week)
+            tool.forward = _cached_forward(tool.name, tool.forward, cache, version)
+        elif tool.name in WRITE_TOOLS:
+            tool.forward = _invalidating_forward(tool.forward, cache, data_version)
+    return tools
+
+
+def _with_current_week(data_version: Callable[[], Any], current_week: Callable[[], Any]) -> Callable[[], Any]:
+    return lambda: (data_version(), current_week())
+
+
+def _cached_forward(tool_name: str, forward: Callable, cache: SQLiteLRUCache, data_version: Callable[[], Any]) -> Callable:
+    def cached_forward(*args, **kwargs):
+        key = cache_key(tool_name, args, kwargs, data_version())
+        cached = cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
+        result = forward(*args, **kwargs)
+        try:
+            cache.put(key, json.dumps(result))
+        except TypeError:
+            pass  # Results that cannot be serialized are simply not cached
+        return result
+    return cached_forward
+
+
+def _invalidating_forward(forward: Callable, cache: SQLiteLRUCache, data_version: Callable[[], Any]) -> Callable:
+    def invalidating_forward(*args, **kwargs):
+        version = data_version()
+        try:
+            return forward(*args, **kwargs)
+        finally:
+            if data_version() != version:
+                cache.clear()
+    return invalidating_forward
@@ -0,0 +1,573 @@
+"""Local transformers model backends tuned for the planning agent.
+
+`PrefixCachedTransformersModel` keeps the key/value cache of prompts it has
+already processed. Every agent step re-sends the ~500 line system prompt plus
+the conversation so far, so most of each prompt was already prefilled by an
+earlier step or session. Only the tokens after the longest cached prefix are
+run through the model, which cuts the time to first token on CPU.
+
+`BatchedTransformersModel` quantizes the weights to int8 or int4 and
+runs the steps that concurrent sessions send at about the same time as one
+batched `generate` call, with a token budget per step.
+"""
+import copy
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Generator
+
+import torch
+from smolagents import ChatMessage, ChatMessageStreamDelta, MessageRole, TokenUsage, TransformersModel
+from smolagents.models import remove_content_after_stop_sequences
+from transformers import (AutoConfig, AutoModelForCausalLM, AutoModelForImageTextToText, DynamicCache, QuantoConfig,
+                          StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer)
+
+# A prompt that diverges from a conversation within this many tokens of its end
+# continues that conversation (the previous answer is often tokenized slightly
+# differently once it is part of the prompt). Other prompts copy the cache.
+CONTINUATION_SLACK_TOKENS = 64
+
+
+def _common_prefix_length(a: torch.Tensor, b: torch.Tensor) -> int:
+    """Return the number of leading tokens two 1-D token id tensors share."""
+    length = min(len(a), len(b))
+    mismatches = (a[:length] != b[:length]).nonzero()
+    return int(mismatches[0]) if len(mismatches) else length
+
+
+class PrefixCachedTransformersModel(TransformersModel):
+    """A TransformersModel that reuses the key/value cache of previously processed prompts.
+
+    Two kinds of caches are kept:
+    - the system prompt of every agent (the static instructions and tool
+      descriptions), prefilled once when it is first seen and shared by all
+      steps and sessions;
+    - the caches of the most recent conversations, extended by each step with
+      the new prompt tokens and the generated answer.
+
+    A prompt starts from the cache with the longest common token prefix.
+    Conversation caches are handed over to the step that continues them,
+    other caches are copied.
+    """
+
+    def __init__(self, *args, max_cached_conversations: int = 4, max_cached_system_prompts: int = 4,
+                 min_prefix_tokens: int = 64, **kwargs):
+        """
+        Args:
+            *args: Passed to TransformersModel.
+            max_cached_conversations (int): The number of conversation caches kept in memory.
+            max_cached_system_prompts (int): The number of system prompt caches kept in memory.
+            min_prefix_tokens (int): Shorter shared prefixes are not worth copying a cache for.
+            **kwargs: Passed to TransformersModel.
+        """
+        super().__init__(*args, **kwargs)
+        self.max_cached_conversations = max_cached_conversations
+        self.max_cached_system_prompts = max_cached_system_prompts
+        self.min_prefix_tokens = min_prefix_tokens
+        self._conversations = OrderedDict()   # id -> (token ids, cache)
+        self._system_prompts = OrderedDict()  # system prompt text -> (token ids, cache)
+        self._lock = threading.Lock()
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+        self.reused_tokens = 0
+        self.prefilled_tokens = 0
+
+    @property
+    def _tokenizer(self) -> Any:
+        return self.processor.tokenizer if hasattr(self, "processor") else self.tokenizer
+
+    def _prefill(self, token_ids: torch.Tensor) -> DynamicCache:
+        cache = DynamicCache()
+        with torch.no_grad():
+            self.model(input_ids=token_ids.unsqueeze(0), past_key_values=cache, use_cache=True)
+        return cache
+
+    def _cache_system_prompt(self, messages: list) -> None:
+        """Prefill the system prompt on its own the first time it is seen."""
+        if not messages:
+            return
+        first = messages[0]
+        role = first.role if isinstance(first, ChatMessage) else first["role"]
+        if str(getattr(role, "value", role)) != MessageRole.SYSTEM.value:
+            return
+        system_messages = self._prepare_completion_kwargs(messages=messages[:1])["messages"]
+        key = str(system_messages)
+        with self._lock:
+            if key in self._system_prompts:
+                self._system_prompts.move_to_end(key)
+                return
+        token_ids = self._tokenizer.apply_chat_template(
+            system_messages, return_tensors="pt", add_generation_prompt=False, tokenize=True,
+            **self.apply_chat_template_kwargs)
+        if not isinstance(token_ids, torch.Tensor):
+            token_ids = token_ids["input_ids"]
+        token_ids = token_ids[0].to(self.model.device)
+        cache = self._prefill(token_ids)
+        with self._lock:
+            self._system_prompts[key] = (token_ids, cache)
+            while len(self._system_prompts) > self.max_cached_system_prompts:
+                self._system_prompts.popitem(last=False)
+
+    def _take_cache(self, prompt_ids: torch.Tensor) -> DynamicCache:
+        """Return a cache holding the longest cached prefix of the prompt, or None."""
+        with self._lock:
+            best = (0, None, None)  # (prefix length, store, key)
+            for store in (self._conversations, self._system_prompts):
+                for key, (token_ids, _) in store.items():
+                    length = _common_prefix_length(token_ids, prompt_ids)
+                    if length > best[0]:
+                        best = (length, store, key)
+            # The model must run on at least one prompt token to produce the next one
+            length = min(best[0], len(prompt_ids) - 1)
+            if length < self.min_prefix_tokens:
+                self.prefix_misses += 1
+                self.prefilled_tokens += len(prompt_ids)
+                return None
+            _, store, key = best
+            if store is self._conversations and length >= len(store[key][0]) - CONTINUATION_SLACK_TOKENS:
+                _, cache = store.pop(key)
+            else:
+                cache = copy.deepcopy(store[key][1])
+            self.prefix_hits += 1
+            self.reused_tokens += length
+            self.prefilled_tokens += len(prompt_ids) - length
+        if cache.get_seq_length() > length:
+            cache.crop(length - cache.get_seq_length())  # A negative value drops that many tokens
+        return cache
+
+    def _store_conversation(self, sequence: torch.Tensor, cache: DynamicCache) -> None:
+        # The cache covers every token but the last generated one
+        token_ids = sequence[:cache.get_seq_length()]
+        with self._lock:
+            self._conversations[id(cache)] = (token_ids, cache)
+            while len(self._conversations) > self.max_cached_conversations:
+                self._conversations.popitem(last=False)
+
+    def _prepare_cached_generation(self, messages: list, stop_sequences: list, tools_to_call_from: list,
+                                   **kwargs) -> tuple:
+        self._cache_system_prompt(messages)
+        generation_kwargs = self._prepare_completion_args(
+            messages=messages, stop_sequences=stop_sequences, tools_to_call_from=tools_to_call_from, **kwargs)
+        prompt_ids = generation_kwargs["inputs"][0]
+        cache = self._take_cache(prompt_ids) or DynamicCache()
+        generation_kwargs["past_key_values"] = cache
+        return generation_kwargs, cache
+
+    def generate(self, messages: list, stop_sequences: list = None, response_format: dict = None,
+                 tools_to_call_from: list = None, **kwargs) -> ChatMessage:
+        if response_format is not None:
+            raise ValueError("Transformers does not support structured outputs, use VLLMModel for this.")
+        generation_kwargs, cache = self._prepare_cached_generation(messages, stop_sequences, tools_to_call_from, **kwargs)
+        count_prompt_tokens = generation_kwargs["inputs"].shape[1]
+        out = self.model.generate(**generation_kwargs)
+        self._store_conversation(out[0], cache)
+        output_text = self._tokenizer.decode(out[0, count_prompt_tokens:], skip_special_tokens=True)
+        if stop_sequences is not None:
+            output_text = remove_content_after_stop_sequences(output_text, stop_sequences)
+        return ChatMessage(
+            role=MessageRole.ASSISTANT,
+            content=output_text,
+            raw={"out": output_text},
+            token_usage=TokenUsage(input_tokens=count_prompt_tokens, output_tokens=out.shape[1] - count_prompt_tokens),
+        )
+
+    def generate_stream(self, messages: list, stop_sequences: list = None, response_format: dict = None,
+                        tools_to_call_from: list = None, **kwargs) -> Generator:
+        if response_format is not None:
+            raise ValueError("Transformers does not support structured outputs, use VLLMModel for this.")
+        generation_kwargs, cache = self._prepare_cached_generation(messages, stop_sequences, tools_to_call_from, **kwargs)
+        count_prompt_tokens = generation_kwargs["inputs"].shape[1]
+        # A streamer per call, so that concurrent calls do not read each other's tokens
+        streamer = TextIteratorStreamer(self._tokenizer, skip_prompt=True, skip_special_tokens=True)
+        result = {}
+
+        def run() -> None:
+            try:
+                result["out"] = self.model.generate(streamer=streamer, **generation_kwargs)
+            except BaseException as e:
+                result["error"] = e
+                streamer.end()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        for new_text in streamer:
+            yield ChatMessageStreamDelta(
+                content=new_text,
+                token_usage=TokenUsage(input_tokens=count_prompt_tokens, output_tokens=1),
+            )
+            count_prompt_tokens = 0
+        thread.join()
+        if "error" in result:
+            raise result["error"]
+        self._store_conversation(result["out"][0], cache)
+
+    def cache_stats(self) -> dict:
+        """Return how many prompts started from a cached prefix and how many tokens were reused."""
+        with self._lock:
+            total = self.prefix_hits + self.prefix_misses
+            return {
+                "hits": self.prefix_hits,
+                "misses": self.prefix_misses,
+                "hit_rate": round(self.prefix_hits / total, 4) if total else 0.0,
+                "reused_tokens": self.reused_tokens,
+                "prefilled_tokens": self.prefilled_tokens,
+                "conversations": len(self._conversations),
+                "system_prompts": len(self._system_prompts),
+            }
+
+
+# A code action is a short thought and one code block, ended by one of these
+# stop sequences, so its step gets a smaller token budget than other steps
+# (planning, final summaries). Both are capped by the model's max_new_tokens.
+CODE_ACTION_STOP_SEQUENCES = ("<end_code>", "</code>", "Observation:")
+CODE_ACTION_MAX_NEW_TOKENS = 1024
+STEP_MAX_NEW_TOKENS = 2048
+# Stop sequences are looked for in the decoded tail of this many generated tokens
+STOP_SEQUENCE_WINDOW_TOKENS = 32
+QUANTIZATION_MODES = ("none", "int8", "int4")
+
+
+# int8 and int4 quantize the weights of nn.Linear layers only. Mixture of experts
+# models such as Qwen3-MoE keep their experts in 3D parameters instead, so
+# quantizing them would leave most of the weights as they are.
+MIN_LINEAR_WEIGHT_FRACTION = 0.5
+
+
+def linear_weight_fraction(model_id: str, trust_remote_code: bool = False) -> float:
+    """Return the share of a model's parameters held by nn.Linear layers, without loading its weights.
+    Args:
+        model_id (str): The Hugging Face model id or local path.
+        trust_remote_code (bool): Whether to run the model's own code.
+    Returns:
+        float: The fraction of all parameters that are nn.Linear weights.
+    """
+    config = AutoConfig.from_pretrained(model_id, trust_remote_code=trust_remote_code)
+    # The meta device allocates no memory for the parameters
+    with torch.device("meta"):
+        try:
+            model = AutoModelForCausalLM.from_config(config, trust_remote_code=trust_remote_code)
+        except ValueError:
+            model = AutoModelForImageTextToText.from_config(config, trust_remote_code=trust_remote_code)
+    total = sum(parameter.numel() for parameter in model.parameters())
+    linear = sum(module.weight.numel() for module in model.modules() if isinstance(module, torch.nn.Linear))
+    return linear / total if total else 0.0
+
+
+def check_quantizable(model_id: str, trust_remote_code: bool = False) -> None:
+    """Reject a model whose weights are mostly outside of the nn.Linear layers that quantization converts.
+    Args:
+        model_id (str): The Hugging Face model id or local path.
+        trust_remote_code (bool): Whether to run the model's own code.
+    Raises:
+        ValueError: If less than MIN_LINEAR_WEIGHT_FRACTION of the parameters are nn.Linear weights.
+    """
+    fraction = linear_weight_fraction(model_id, trust_remote_code)
+    if fraction < MIN_LINEAR_WEIGHT_FRACTION:
+        architectures = AutoConfig.from_pretrained(model_id, trust_remote_code=trust_remote_code).architectures
+        raise ValueError(
+            f"{model_id} ({', '.join(architectures or ['unknown architecture'])}) keeps only {fraction:.0%} of its "
+            f"weights in nn.Linear layers (mixture of experts models keep their experts elsewhere), so int8 and int4 "
+            f"quantization would leave most of them unquantized. Use quantization=\"none\" or a dense model.")
+
+
+def int4_quantization_config() -> QuantoConfig:
+    """Return the from_pretrained quantization config that loads nn.Linear weights as int4.
+    Raises:
+        ImportError: If optimum-quanto is not installed.
+    """
+    try:
+        import optimum.quanto  # noqa: F401
+    except ImportError as e:
+        raise ImportError("int4 quantization needs optimum-quanto: pip install optimum-quanto") from e
+    return QuantoConfig(weights="int4")
+
+
+class _PendingStep:
+    """One agent step waiting for a batch or being generated in one."""
+
+    def __init__(self, prompt_ids: torch.Tensor, stop_sequences: list, max_new_tokens: int, generation_kwargs: dict):
+        self.prompt_ids = prompt_ids
+        self.stop_sequences = stop_sequences or []
+        self.max_new_tokens = max_new_tokens
+        self.generation_kwargs = generation_kwargs
+        self.tokens = []
+        self.done = False
+        # Generated token ids, then None once the step is done, or the exception that failed it
+        self.events = queue.SimpleQueue()
+
+    def add_token(self, token_id: int) -> None:
+        if not self.done:
+            self.tokens.append(token_id)
+            self.events.put(token_id)
+
+    def finish(self, error: BaseException = None) -> None:
+        if not self.done:
+            self.done = True
+            self.events.put(error)
+
+    def reached_stop_sequence(self, tokenizer: Any) -> bool:
+        if not self.stop_sequences:
+            return False
+        tail = tokenizer.decode(self.tokens[-STOP_SEQUENCE_WINDOW_TOKENS:], skip_special_tokens=True)
+        return any(stop_sequence in tail for stop_sequence in self.stop_sequences)
+
+
+class _BatchStreamer:
+    """Hands the tokens of a batched generate call to the step of every row."""
+
+    def __init__(self, steps: list, eos_token_ids: set):
+        self.steps = steps
+        self.eos_token_ids = eos_token_ids
+        self.prompt_seen = False
+
+    def put(self, value: torch.Tensor) -> None:
+        if not self.prompt_seen:
+            self.prompt_seen = True  # The first call passes the prompts
+            return
+        for step, token_id in zip(self.steps, value.reshape(len(self.steps), -1)[:, -1].tolist()):
+            if token_id in self.eos_token_ids:
+                step.finish()
+            else:
+                step.add_token(token_id)
+
+    def end(self) -> None:
+        pass  # The rows still running are finished once the batch statistics are recorded
+
+
+class _BatchStoppingCriteria(StoppingCriteria):
+    """Stops every row of a batch at its own stop sequences and token budget."""
+
+    def __init__(self, steps: list, tokenizer: Any):
+        self.steps = steps
+        self.tokenizer = tokenizer
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor, **kwargs) -> torch.BoolTensor:
+        for step in self.steps:
+            if not step.done and (len(step.tokens) >= step.max_new_tokens or step.reached_stop_sequence(self.tokenizer)):
+                step.finish()
+        return torch.tensor([step.done for step in self.steps], dtype=torch.bool, device=input_ids.device)
+
+
+class BatchedTransformersModel(TransformersModel):
+    """A TransformersModel with quantized weights that batches the steps of concurrent sessions.
+
+    Steps are queued and a scheduler thread runs them in batches: it waits up
+    to batch_window_seconds for more steps to arrive, then left-pads their
+    prompts into one generate call. Every row stops at its own stop sequence
+    or token budget, and its caller gets the answer as soon as its row is
+    done, without waiting for the rest of the batch.
+    """
+
+    def __init__(self, model_id: str = None, device_map: str = None, torch_dtype: str = None,
+                 trust_remote_code: bool = False, model_kwargs: dict = None, *, quantization: str = "int8",
+                 max_batch_size: int = 8, max_batch_tokens: int = 65536, batch_window_seconds: float = 0.02,
+                 code_action_max_new_tokens: int = CODE_ACTION_MAX_NEW_TOKENS,
+                 step_max_new_tokens: int = STEP_MAX_NEW_TOKENS, **kwargs):
+        """
+        Args:
+            model_id, device_map, torch_dtype, trust_remote_code, model_kwargs: Passed to TransformersModel.
+            quantization (str): "int8" loads the weights as float32 and then quantizes the nn.Linear layers
+                dynamically (peak memory is that of the float32 model), "int4" loads the nn.Linear weights as
+                int4 (needs optimum-quanto) and "none" loads the weights as they are.
+            max_batch_size (int): The maximum number of steps generated together.
+            max_batch_tokens (int): The maximum number of padded prompt tokens in a batch.
+            batch_window_seconds (float): How long the first queued step waits for others to join its batch.
+            code_action_max_new_tokens (int): The token budget of a code action step.
+            step_max_new_tokens (int): The token budget of other steps.
+            **kwargs: Passed to TransformersModel.
+        Raises:
+            ValueError: If quantization is unknown or does not suit the model's architectures, see check_quantizable().
+            ImportError: If quantization is "int4" and optimum-quanto is not installed.
+            RuntimeError: If the loaded model fails to generate a token.
+        """
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization {quantization!r}, use one of {QUANTIZATION_MODES}.")
+        if quantization == "int4":
+            model_kwargs = {**(model_kwargs or {}), "quantization_config": int4_quantization_config()}
+        if quantization != "none" and model_id:
+            check_quantizable(model_id, trust_remote_code)
+        if quantization == "int8":
+            # Dynamically quantized layers take float32 activations, bfloat16 ones fail at the first matmul
+            torch_dtype = torch.float32
+        super().__init__(model_id=model_id, device_map=device_map, torch_dtype=torch_dtype,
+                         trust_remote_code=trust_remote_code, model_kwargs=model_kwargs, **kwargs)
+        if quantization == "int8":
+            from torch.ao.quantization import quantize_dynamic
+
+            quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        self.quantization = quantization
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.batch_window_seconds = batch_window_seconds
+        self.code_action_max_new_tokens = code_action_max_new_tokens
+        self.step_max_new_tokens = step_max_new_tokens
+        eos_token_id = self.model.generation_config.eos_token_id
+        self._eos_token_ids = set(eos_token_id if isinstance(eos_token_id, list) else [eos_token_id]) - {None}
+        self._pad_token_id = self._tokenizer.pad_token_id
+        if self._pad_token_id is None:
+            self._pad_token_id = min(self._eos_token_ids) if self._eos_token_ids else 0
+        self._pending = []
+        self._pending_changed = threading.Condition()
+        self._scheduler = None
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.batched_steps = 0
+        self.largest_batch = 0
+        self.generated_tokens = 0
+        self.generate_seconds = 0.0
+        self._warm_up()
+
+    @property
+    def _tokenizer(self) -> Any:
+        return self.processor.tokenizer if hasattr(self, "processor") else self.tokenizer
+
+    def _warm_up(self) -> None:
+        """Generate one token, so that a model and quantization that do not work together fail at startup."""
+        input_ids = self._tokenizer("Hello", return_tensors="pt")["input_ids"].to(self.model.device)
+        try:
+            with torch.no_grad():
+                self.model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=1,
+                                    pad_token_id=self._pad_token_id)
+        except Exception as e:
+            raise RuntimeError(
+                f"{self.model_id} failed to generate with quantization={self.quantization!r}: {e}") from e
+
+    def step_token_budget(self, stop_sequences: list) -> int:
+        """Return the maximum number of tokens a step with these stop sequences may generate."""
+        limit = self.kwargs.get("max_new_tokens") or self.kwargs.get("max_tokens") or self.step_max_new_tokens
+        if stop_sequences and any(stop_sequence in CODE_ACTION_STOP_SEQUENCES for stop_sequence in stop_sequences):
+            return min(limit, self.code_action_max_new_tokens)
+        return min(limit, self.step_max_new_tokens)
+
+    def _submit(self, messages: list, stop_sequences: list, tools_to_call_from: list, **kwargs) -> _PendingStep:
+        generation_kwargs = self._prepare_completion_args(
+            messages=messages, stop_sequences=stop_sequences, tools_to_call_from=tools_to_call_from, **kwargs)
+        prompt_ids = generation_kwargs.pop("inputs")[0].cpu()
+        for key in ("use_cache", "stopping_criteria", "max_new_tokens"):
+            generation_kwargs.pop(key, None)
+        max_new_tokens = kwargs.get("max_new_tokens") or self.step_token_budget(stop_sequences)
+        step = _PendingStep(prompt_ids, stop_sequences, max_new_tokens, generation_kwargs)
+        with self._pending_changed:
+            self._pending.append(step)
+            self._pending_changed.notify_all()
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=self._schedule, name="batched-generate", daemon=True)
+                self._scheduler.start()
+        return step
+
+    def _take_batch(self) -> list:
+        """Take the oldest pending steps that fit in a batch. Must hold _pending_changed."""
+        batch = [self._pending.pop(0)]
+        longest = len(batch[0].prompt_ids)
+        while self._pending and len(batch) < self.max_batch_size:
+            candidate = max(longest, len(self._pending[0].prompt_ids))
+            if candidate * (len(batch) + 1) > self.max_batch_tokens:
+                break
+            longest = candidate
+            batch.append(self._pending.pop(0))
+        return batch
+
+    def _schedule(self) -> None:
+        while True:
+            with self._pending_changed:
+                while not self._pending:
+                    self._pending_changed.wait()
+                # Give the steps of other sessions a moment to join the batch
+                deadline = time.monotonic() + self.batch_window_seconds
+                while len(self._pending) < self.max_batch_size and time.monotonic() < deadline:
+                    self._pending_changed.wait(deadline - time.monotonic())
+                batch = self._take_batch()
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list) -> None:
+        try:
+            length = max(len(step.prompt_ids) for step in batch)
+            input_ids = torch.full((len(batch), length), self._pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(batch), length), dtype=torch.long)
+            for row, step in enumerate(batch):
+                # Left padding, so that every row's next token follows its prompt
+                input_ids[row, length - len(step.prompt_ids):] = step.prompt_ids
+                attention_mask[row, length - len(step.prompt_ids):] = 1
+            start = time.perf_counter()
+            with torch.no_grad():
+                self.model.generate(
+                    input_ids=input_ids.to(self.model.device),
+                    attention_mask=attention_mask.to(self.model.device),
+                    max_new_tokens=max(step.max_new_tokens for step in batch),
+                    stopping_criteria=StoppingCriteriaList([_BatchStoppingCriteria(batch, self._tokenizer)]),
+                    streamer=_BatchStreamer(batch, self._eos_token_ids),
+                    pad_token_id=self._pad_token_id,
+                    **batch[0].generation_kwargs,
+                )
+            with self._stats_lock:
+                self.batches += 1
+                self.batched_steps += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.generated_tokens += sum(len(step.tokens) for step in batch)
+                self.generate_seconds += time.perf_counter() - start
+        except BaseException as e:
+            for step in batch:
+                step.finish(e)
+        finally:
+            for step in batch:
+                step.finish()
+
+    def _stream_tokens(self, step: _PendingStep) -> Generator:
+        """Yield the step's generated token ids as they arrive."""
+        while True:
+            event = step.events.get()
+            if event is None:
+                return
+            if isinstance(event, BaseException):
+                raise event
+            yield event
+
+    def generate(self, messages: list, stop_sequences: list = None, response_format: dict = None,
+                 tools_to_call_from: list = None, **kwargs) -> ChatMessage:
+        if response_format is not None:
+            raise ValueError("Transformers does not support structured outputs, use VLLMModel for this.")
+        step = self._submit(messages, stop_sequences, tools_to_call_from, **kwargs)
+        tokens = list(self._stream_tokens(step))
+        output_text = self._tokenizer.decode(tokens, skip_special_tokens=True)
+        if stop_sequences is not None:
+            output_text = remove_content_after_stop_sequences(output_text, stop_sequences)
+        return ChatMessage(
+            role=MessageRole.ASSISTANT,
+            content=output_text,
+            raw={"out": output_text},
+            token_usage=TokenUsage(input_tokens=len(step.prompt_ids), output_tokens=len(tokens)),
+        )
+
+    def generate_stream(self, messages: list, stop_sequences: list = None, response_format: dict = None,
+                        tools_to_call_from: list = None, **kwargs) -> Generator:
+        if response_format is not None:
+            raise ValueError("Transformers does not support structured outputs, use VLLMModel for this.")
+        step = self._submit(messages, stop_sequences, tools_to_call_from, **kwargs)
+        count_prompt_tokens = len(step.prompt_ids)
+        tokens = []
+        text = ""
+        for token_id in self._stream_tokens(step):
+            tokens.append(token_id)
+            # Decoding all tokens again keeps characters that span several tokens intact
+            new_text = self._tokenizer.decode(tokens, skip_special_tokens=True)
+            if len(new_text) > len(text) and not new_text.endswith("\ufffd"):
+                yield ChatMessageStreamDelta(
+                    content=new_text[len(text):],
+                    token_usage=TokenUsage(input_tokens=count_prompt_tokens, output_tokens=1),
+                )
+                count_prompt_tokens = 0
+                text = new_text
+
+    def batch_stats(self) -> dict:
+        """Return how many batches were generated, how full they were and the generation throughput."""
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "steps": self.batched_steps,
+                "mean_batch_size": round(self.batched_steps / self.batches, 2) if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "pending_steps": len(self._pending),
+                "generated_tokens": self.generated_tokens,
+                "tokens_per_second": round(self.generated_tokens / self.generate_seconds, 1) if self.generate_seconds else 0.0,
+            }
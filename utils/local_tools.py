@@ -0,0 +1,68 @@
+"""Bind the meal planner MCP tools directly as smolagents tools.
+
+In this mode the tool functions of `utils/mcp_server.py` run inside the app
+process: no `uv` environment is resolved at startup, no server subprocess is
+started and tool calls are plain function calls instead of JSON-RPC over
+stdio. The tools share the app's database connection pool and caches.
+
+The agent sees the same tool names, descriptions and inputs as through
+MCP. Results are returned as the Python values produced by the tool, so
+strings are unchanged and lists (e.g. from `execute_query_on_database`)
+are no longer reduced to their text form.
+"""
+from typing import Any
+
+from smolagents import Tool
+
+
+def _tool_inputs(parameters: dict) -> dict:
+    """Convert a JSON schema of tool parameters to smolagents tool inputs, like the MCP client does."""
+    required = set(parameters.get("required", []))
+    inputs = {}
+    for name, schema in parameters.get("properties", {}).items():
+        inputs[name] = {
+            "type": schema.get("type", "string"),
+            "description": schema.get("description", "see tool description"),
+        }
+        if name not in required:
+            inputs[name]["nullable"] = True
+    return inputs
+
+
+class LocalMCPTool(Tool):
+    """A smolagents tool that calls a FastMCP tool function in process."""
+
+    skip_forward_signature_validation = True
+
+    def __init__(self, mcp_tool: Any):
+        """
+        Args:
+            mcp_tool (Any): A tool registered on a FastMCP server.
+        """
+        self.name = mcp_tool.name
+        self.description = mcp_tool.description
+        self.inputs = _tool_inputs(mcp_tool.parameters)
+        self.output_type = "object"
+        self._fn = mcp_tool.fn
+        self._arg_model = mcp_tool.fn_metadata.arg_model
+        super().__init__()
+
+    def forward(self, *args, **kwargs) -> Any:
+        if args:
+            if len(args) == 1 and isinstance(args[0], dict) and not kwargs:
+                kwargs = args[0]
+            else:
+                raise ValueError(f"tool {self.name} does not support positional arguments")
+        # Validate and coerce the arguments the same way the MCP server does
+        arguments = self._arg_model.model_validate(kwargs).model_dump_one_level()
+        return self._fn(**arguments)
+
+
+def get_local_tools() -> list:
+    """Create in-process tools for every tool of the meal planner MCP server.
+    Returns:
+        list: The tools, in the order the server registers them.
+    """
+    from utils import mcp_server
+
+    return [LocalMCPTool(mcp_tool) for mcp_tool in mcp_server.mcp._tool_manager.list_tools()]
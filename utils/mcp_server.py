@@ -1,13 +1,100 @@
-from mcp.server.fastmcp import FastMCP
-import database
 import json
+import os
+import sqlite3
+import sys
+
+from mcp.server.fastmcp import FastMCP
+
+# `mcp run ./utils/mcp_server.py` loads this file as a script, so make the
+# repository root importable to share the `utils` package with the app.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import database, meal_io, planner, tracing
 
 # Create an MCP server instance
 mcp = FastMCP("Meal Planner Service")
 
 DB_NAME = 'meals_database.db'
+# import_meals and export_meals only read and write files inside this directory, so
+# the agent, or a message or web page steering it, cannot reach other files of the process.
+DATA_DIR = os.getenv('MEALPLAN_DATA_DIR') or 'data'
+
+def traced_tool(name: str):
+    """Register an MCP tool and record the server-side latency of every call."""
+    def decorator(fn):
+        return mcp.tool(name)(tracing.traced("mcp_tool_server", tool=name)(fn))
+    return decorator
+
+# Page sizes for the paginated meal reads. The agent prints tool results in a
+# sandbox that truncates long outputs, so keep the pages it asks for small.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# The "read everything" tools page through the table in larger chunks.
+READ_ALL_PAGE_SIZE = 1000
+# Search results are ranked, so the model rarely needs more than the first few.
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+def _read_all_meal_records(columns: list = None) -> list:
+    """Read every meal record page by page."""
+    records = []
+    cursor = 0
+    while cursor is not None:
+        page, cursor = database.get_meal_records_page(cursor, READ_ALL_PAGE_SIZE, columns, db_name=DB_NAME)
+        records.extend(page)
+    return records
+
+@traced_tool("read_meal_records")
+def read_meal_records(cursor: int = 0, page_size: int = DEFAULT_PAGE_SIZE, columns: list = None, cuisine: str = None,
+                      able_to_make_more_for_lunch: bool = None, ingredient: str = None) -> str:
+    """This tool fetches one page of meal records from the database, optionally filtered.
+    Prefer this tool over `read_all_meal_records_from_db` when the database has many meals,
+    when only some columns are needed or when looking for specific meals.
+    To read the next page, call it again with `cursor` set to the `next_cursor` of the previous result.
+    Args:
+        cursor (int): Where to start reading. Use 0 for the first page, then the returned `next_cursor`.
+        page_size (int): The maximum number of records to return, at most 200.
+        columns (list): The columns to return, any of "id", "meal_name", "grocery_items", "able_to_make_more_for_lunch", "cuisine". Defaults to all columns.
+        cuisine (str): Only return meals of this cuisine, e.g. "Italian".
+        able_to_make_more_for_lunch (bool): Only return meals whose leftovers can (True) or cannot (False) be used for lunch.
+        ingredient (str): Only return meals with a grocery item containing this text, e.g. "spinach".
+    Returns:
+        str:
+          Returns a JSON-encoded object with the keys "columns", "records" and "next_cursor".
+          "records" is a list of lists with the values of "columns" in the same order.
+          "next_cursor" is null when there are no more pages.
+    Raises:
+        ValueError: If an unknown column is requested or page_size is not between 1 and 200.
+    """
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}.")
+    columns = columns or list(database.MEAL_COLUMNS)
+    records, next_cursor = database.get_meal_records_page(cursor, page_size, columns, cuisine,
+                                                          able_to_make_more_for_lunch, ingredient, DB_NAME)
+    return json.dumps({"columns": columns, "records": records, "next_cursor": next_cursor})
+
+@traced_tool("search_meals")
+def search_meals(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> str:
+    """This tool searches the meal database for meals whose name, grocery items or cuisine contain some words.
+    Use it to answer questions like "what can I make with spinach and paneer" or "show me Thai meals",
+    instead of reading every meal or writing SQL with LIKE.
+    Meals containing all the words are returned, or if there are none, meals containing any of them.
+    The best matches come first, and words also match their plural, e.g. "tomato" matches "Tomatoes".
+    Args:
+        query (str): The words to look for, e.g. "spinach paneer".
+        limit (int): The maximum number of meals to return, at most 50.
+    Returns:
+        str:
+          Returns a JSON-encoded object with the keys "columns" and "records".
+          "records" is a list of lists with the values of "columns" in the same order, best match first.
+    Raises:
+        ValueError: If limit is not between 1 and 50.
+    """
+    if not 1 <= limit <= MAX_SEARCH_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_SEARCH_LIMIT}.")
+    records = database.search_meals(query, limit, DB_NAME)
+    return json.dumps({"columns": list(database.MEAL_COLUMNS), "records": records})
 
-@mcp.tool("read_all_meal_records_from_db")
+@traced_tool("read_all_meal_records_from_db")
 # Passing complex data structures like lists of tuples directly to MCP tools can sometimes lead to serialization issues.
 # To avoid this, we serialize the list of tuples to a JSON string before returning it.
 def read_all_meal_records_from_db() -> str:
@@ -15,6 +102,7 @@ def read_all_meal_records_from_db() -> str:
     This is useful for viewing all meals stored in the database.
     It returns a list of tuples containing meal records, where each record is a tuple containing meal details.
     If the user wants to see all meals, they can use this tool.
+    If the database has many meals, use `read_meal_records` to read them page by page instead.
     Args:
         None
     Returns:
@@ -23,10 +111,9 @@ def read_all_meal_records_from_db() -> str:
           In the list of meal records, each record is a tuple containing meal details.
           Tuple format: (id, meal_name, grocery_items, able_to_make_more_for_lunch, cuisine).
     """
-    return_val = (database.get_all_meal_records_from_db(DB_NAME))
-    return json.dumps(return_val)
+    return json.dumps(_read_all_meal_records())
 
-@mcp.tool("get_all_meal_names_from_db")
+@traced_tool("get_all_meal_names_from_db")
 def get_all_meal_names_from_db() -> str:
     """This tool fetches all meal names from the database.
     This is useful for viewing all meal names stored in the database.
@@ -37,16 +124,10 @@ def get_all_meal_names_from_db() -> str:
     Returns:
         str: A comma-separated string of all meal names in the database.
     """
+    meal_names = [record[0] for record in _read_all_meal_records(["meal_name"])]
+    return ", ".join(meal_names)
 
-    meals = database.get_all_meal_records_from_db()
-
-    # Extract meal names from the records                                                                                                                            
-    meal_names = [meal[1] for meal in meals]
-
-    combined_meal_names = ", ".join(meal_names)
-    return combined_meal_names
-
-@mcp.tool("add_meal_to_db")
+@traced_tool("add_meal_to_db")
 def add_meal_to_db(meal_name: str, grocery_items: str, able_to_make_more_for_lunch: bool, cuisine: str) -> str:
     """This tool adds a new meal to the database.
     It is useful for adding meals that are not already in the database.
@@ -55,7 +136,8 @@ def add_meal_to_db(meal_name: str, grocery_items: str, able_to_make_more_for_lun
     If the user wants to add a meal, they can use this tool.
     Args:
         meal_name (str): The name of the meal.
-        grocery_items (str): Comma-separated list of grocery items.
+        grocery_items (str): Comma-separated list of grocery items. An item can start with its quantity
+            for one meal, e.g. "200 g Paneer, 2 Onions, Spinach".
         able_to_make_more_for_lunch (bool): Whether more can be made for lunch.
         cuisine (str): The type of cuisine.
     Returns:
@@ -69,57 +151,177 @@ def add_meal_to_db(meal_name: str, grocery_items: str, able_to_make_more_for_lun
     if not meal_name or not grocery_items or not cuisine:
         raise ValueError("Meal name, grocery items, and cuisine cannot be empty.")
     
-    # Check
-    meal_records = database.get_all_meal_records_from_db(DB_NAME)
-    meal_names = [record[1] for record in meal_records]  # Assuming meal_name is the second element in the tuple
-    if meal_name in meal_names:
+    # Check (index lookup on the unique meal_name index)
+    if database.meal_exists(meal_name, DB_NAME):
         raise ValueError(f"Meal '{meal_name}' already exists in the database.")
     
     if not isinstance(able_to_make_more_for_lunch, bool):
         raise TypeError("able_to_make_more_for_lunch must be a boolean value.")
     
     # Add the meal to the database
-    database.add_meal_to_db(meal_name, grocery_items, able_to_make_more_for_lunch, cuisine, DB_NAME)
+    try:
+        database.add_meal_to_db(meal_name, grocery_items, able_to_make_more_for_lunch, cuisine, DB_NAME)
+    except sqlite3.IntegrityError:
+        # Another client added the same meal between the check and the insert
+        raise ValueError(f"Meal '{meal_name}' already exists in the database.")
     return f"Meal '{meal_name}' successfully added to the database."
 
-@mcp.tool("write_meal_plan_to_json_file")
+def _data_file_path(file_path: str) -> str:
+    """Resolve a file path inside DATA_DIR. Relative paths are taken relative to DATA_DIR.
+    Args:
+        file_path (str): The path the agent passed.
+    Returns:
+        str: The absolute path, with symbolic links resolved.
+    Raises:
+        ValueError: If the path points outside DATA_DIR.
+    """
+    data_dir = os.path.realpath(DATA_DIR)
+    path = os.path.realpath(os.path.join(data_dir, file_path))
+    if os.path.commonpath([data_dir, path]) != data_dir:
+        raise ValueError(f"The file must be inside the data directory {data_dir}.")
+    return path
+
+@traced_tool("import_meals")
+def import_meals(file_path: str) -> str:
+    """This tool imports many meals at once from a CSV or JSON Lines file.
+    Use it instead of calling `add_meal_to_db` once per meal when the user provides a file of recipes.
+    The file needs the columns meal_name, grocery_items, able_to_make_more_for_lunch and cuisine.
+    Meals that already exist in the database, duplicates within the file and invalid rows are skipped and counted as rejected.
+    Args:
+        file_path (str): Name of the .csv or .jsonl file to import, in the data directory.
+    Returns:
+        str: A JSON-encoded summary with the number of imported and rejected rows and the import speed in rows per second.
+    Raises:
+        ValueError: If the file is not a .csv or .jsonl file, or not in the data directory.
+    """
+    return json.dumps(meal_io.import_meals(_data_file_path(file_path), DB_NAME))
+
+@traced_tool("export_meals")
+def export_meals(file_path: str) -> str:
+    """This tool exports all meals in the database to a CSV or JSON Lines file.
+    This is useful for backing up the database or sharing the recipes.
+    Args:
+        file_path (str): Name of the .csv or .jsonl file to write, in the data directory.
+    Returns:
+        str: A JSON-encoded summary with the number of exported rows and the export speed in rows per second.
+    Raises:
+        ValueError: If the file is not a .csv or .jsonl file, or not in the data directory.
+    """
+    file_path = _data_file_path(file_path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    return json.dumps(meal_io.export_meals(file_path, DB_NAME))
+
+@traced_tool("write_meal_plan_to_json_file")
 # Passing complex data structures like dicts or lists directly to MCP tools can sometimes lead to serialization issues.
 # To avoid this, we can pass simpler data types (like strings or lists) and reconstruct the complex structure within the tool.
-def write_meal_plan_to_json_file(lunch_list: list, dinner_list: list) -> str:
-    """This tool writes the generated meal plan to a JSON file.
-    The meal plan is provided as a dictionary
+def write_meal_plan_to_json_file(lunch_list: list, dinner_list: list, household: str = database.DEFAULT_HOUSEHOLD) -> str:
+    """This tool saves the meal plan for the current week.
+    Plans are kept in the database as versions of their week, so saving again does not lose the earlier plan.
     This is useful for saving the meal plan for future reference or sharing.
     Args:
         lunch_list (list): A list of 7 meals for lunch, one for each day of the week.
         dinner_list (list): A list of 7 meals for dinner, one for each day of the week.
+        household (str): The household the plan is for. Only pass it when the user plans for several households.
     Returns:
-        str: A confirmation message indicating that the meal plan has been written to the file.
+        str: A confirmation message indicating that the meal plan has been saved.
     Raises:
         ValueError: If lunch_list or dinner_list does not contain exactly 7 meals.
 
     """
+    # Not adding any more rules here to give the agent more flexibility to cater to user prompts.
 
-    file_path = "./meal_plan.json"
+    saved = database.save_meal_plan(lunch_list, dinner_list, db_name=DB_NAME, household=household)
 
-    if (len(lunch_list) != 7) or (len(dinner_list) != 7):
-        raise ValueError("Both lunch and dinner lists must contain exactly 7 meals.")
+    return (f"Meal plan successfully saved as version {saved['version']} of the week of {saved['week_start']}. "
+            "Please refresh the Meal Plan tab to see the updated plan.")
 
-    # Not adding any more rules here to give the agent more flexibility to cater to user prompts.
+@traced_tool("generate_meal_plan")
+def generate_meal_plan(pins: dict = None, no_repeat_window: int = 7, seed: int = None, avoid_recent_weeks: int = 2,
+                       household: str = database.DEFAULT_HOUSEHOLD) -> str:
+    """This tool generates the meal plan for the week from the meals in the database and saves it, in one step.
+    Use it whenever the user asks for a meal plan. It is much faster than building the plan yourself.
+    It follows these rules:
+    - When a dinner can be made in a larger quantity (able_to_make_more_for_lunch), its leftovers are the next day's lunch.
+    - A meal is not repeated within `no_repeat_window` days, except for those leftover lunches.
+    - Meals of the same cuisine are spread out over the week.
+    - Meals served in the last `avoid_recent_weeks` weeks are only used when there are not enough other meals.
+    - Pinned meals are always used on their day and slot.
+    Args:
+        pins (dict): Meals the user wants on specific days, e.g. {"Monday": {"Dinner": "Rajma"}, "Friday": {"Lunch": "Dosa"}}.
+        no_repeat_window (int): Minimum number of days between two servings of the same meal. Defaults to 7.
+        seed (int): Optional seed to make the plan reproducible.
+        avoid_recent_weeks (int): How many previous weeks of plans to avoid repeating. Defaults to 2, use 0 to allow any meal.
+        household (str): The household the plan is for. Only pass it when the user plans for several households.
+    Returns:
+        str: A JSON-encoded object with the "Lunch" and "Dinner" lists of the saved plan (Monday first).
+    Raises:
+        ValueError: If the pins are invalid or there are not enough meals in the database.
+    """
+    meal_plan = planner.generate_meal_plan_from_db(pins, no_repeat_window, seed, DB_NAME, avoid_recent_weeks,
+                                                   household=household)
+    write_meal_plan_to_json_file(meal_plan["Lunch"], meal_plan["Dinner"], household)
+    return json.dumps(meal_plan)
 
-    meal_plan = {"Lunch": lunch_list, "Dinner": dinner_list}
+@traced_tool("read_meal_plan")
+def read_meal_plan(week_start: str = None, version: int = None, household: str = database.DEFAULT_HOUSEHOLD) -> str:
+    """This tool fetches a saved weekly meal plan.
+    Use it when the user asks about the current plan or the plan of an earlier week.
+    Args:
+        week_start (str): Any date in the week to fetch, as "YYYY-MM-DD". Defaults to the current week,
+            or the most recent earlier week if the current week has no plan yet.
+        version (int): The version of the week's plan to fetch. Defaults to the latest version.
+        household (str): The household whose plan to fetch. Only pass it when the user plans for several households.
+    Returns:
+        str:
+          Returns a JSON-encoded object with the keys "household", "week_start" (the Monday of the week), "version",
+          "created_at", "Lunch" and "Dinner" (lists of 7 meal names, Monday first), or null if there is no such plan.
+    Raises:
+        ValueError: If week_start is not a valid date.
+    """
+    return json.dumps(database.get_meal_plan(week_start, version, DB_NAME, household))
 
-    with open(file_path, 'w') as json_file:
-        json.dump(meal_plan, json_file, indent=4)
-    
-    return f"Meal plan successfully written to file. Please refresh the Meal Plan tab to see the updated plan."
+@traced_tool("get_grocery_list")
+def get_grocery_list(start_date: str = None, end_date: str = None, households: list = None) -> str:
+    """This tool computes the grocery list for the meals planned between two dates.
+    Use it when the user asks what to buy, e.g. for this week, the next two weeks or several households together.
+    Meals planned several times are counted every time. A lunch made from the previous day's dinner
+    counts as a second portion cooked with that dinner.
+    Args:
+        start_date (str): The first day, as "YYYY-MM-DD". Defaults to the Monday of the current week.
+        end_date (str): The last day, as "YYYY-MM-DD". Defaults to the Sunday after start_date.
+        households (list): The households to shop for, e.g. ["home", "grandma"]. Defaults to all households.
+    Returns:
+        str:
+          Returns a JSON-encoded object with the keys "columns" ("grocery_item", "quantity", "unit") and "records",
+          a list of lists sorted by grocery item. The unit is "" for items listed without a quantity;
+          their quantity is the number of meals that need them.
+    Raises:
+        ValueError: If a date is not a valid date, or end_date is before start_date.
+    """
+    records = database.get_grocery_list(start_date, end_date, households, DB_NAME)
+    return json.dumps({"columns": list(database.GROCERY_COLUMNS), "records": records})
+
+@traced_tool("get_meals_not_served_recently")
+def get_meals_not_served_recently(weeks: int = 4) -> str:
+    """This tool lists the meals in the database that were not in any meal plan of the last few weeks.
+    Use it when the user asks what they have not eaten in a while.
+    Args:
+        weeks (int): How many weeks before the current week to look back. Defaults to 4.
+    Returns:
+        str: A JSON-encoded list of meal names.
+    """
+    return json.dumps(database.get_meals_not_served_in_weeks(weeks, db_name=DB_NAME))
 
-@mcp.tool("execute_query_on_database")
+@traced_tool("execute_query_on_database")
 def execute_query_on_database(sql_query: str, sql_query_args: list) -> list:
     """This tool executes a SQL query on the database.
     Before trying this, check if any of the other tools can help you.
     This is a low-level tool that allows you to run any SQL query on the database.
-    It is not recommended for regular use, as it does not provide any safety checks or validation.
+    It is not recommended for regular use, as it does not validate what a write statement changes.
     Use it only if you know what you are doing.
+    Queries that only read run on a read-only connection, and repeating one is cheap until the data changes.
+    A long result is cut off and ends with a row starting with "[truncated]",
+    so add a LIMIT, an aggregate or a narrower WHERE clause to see the rest.
     It is useful for debugging or for running complex queries that are not supported by the other tools.
     It is also useful for running custom queries that are not part of the meal planner functionality.
     If you want to add a new meal, use the `add_meal_to_db` tool instead.
@@ -149,7 +351,7 @@ def execute_query_on_database(sql_query: str, sql_query_args: list) -> list:
 
     return result
 
-@mcp.tool("cleanup_database")
+@traced_tool("cleanup_database")
 def cleanup_database() -> str:
     """This tool cleans up the database by removing all records from the meals table.
     This is not recommended for regular use, as it will delete all meal records.
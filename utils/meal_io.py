@@ -0,0 +1,179 @@
+"""Bulk import and export of meals as CSV or JSON Lines files.
+
+Both formats use the columns of the meals table:
+meal_name, grocery_items, able_to_make_more_for_lunch, cuisine.
+
+Usage from the repository root:
+    python -m utils.meal_io import recipes.csv
+    python -m utils.meal_io export backup.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+
+from utils import database
+
+MEAL_FIELDS = ["meal_name", "grocery_items", "able_to_make_more_for_lunch", "cuisine"]
+DEFAULT_BATCH_SIZE = 1000
+
+_TRUE_VALUES = {"true", "yes", "y", "1"}
+_FALSE_VALUES = {"false", "no", "n", "0"}
+
+def _file_format(file_path: str) -> str:
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"Unsupported file type '{extension}'. Use a .csv or .jsonl file.")
+
+def _parse_bool(value) -> bool:
+    """Parse the able_to_make_more_for_lunch column, which is text in CSV files."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in _TRUE_VALUES:
+        return True
+    if text in _FALSE_VALUES:
+        return False
+    raise ValueError(f"Invalid boolean value: {value!r}")
+
+def _read_rows(file_path: str):
+    """Yield the raw rows of a CSV or JSON Lines file one at a time."""
+    file_format = _file_format(file_path)
+    with open(file_path, "r", newline="", encoding="utf-8") as meal_file:
+        if file_format == "csv":
+            yield from csv.DictReader(meal_file)
+        else:
+            for line in meal_file:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # Counted as a rejected row by the caller
+                        yield None
+
+def _validate_row(row) -> tuple:
+    """Turn a raw row into a meal tuple, or raise ValueError if it cannot be imported."""
+    if not isinstance(row, dict):
+        raise ValueError("Row is not an object.")
+    meal_name = str(row.get("meal_name") or "").strip()
+    grocery_items = row.get("grocery_items") or ""
+    if isinstance(grocery_items, list):
+        grocery_items = ", ".join(str(item) for item in grocery_items)
+    grocery_items = str(grocery_items).strip()
+    cuisine = str(row.get("cuisine") or "").strip()
+    if not meal_name or not grocery_items or not cuisine:
+        raise ValueError("Meal name, grocery items, and cuisine cannot be empty.")
+    able_to_make_more_for_lunch = _parse_bool(row.get("able_to_make_more_for_lunch", False))
+    return (meal_name, grocery_items, able_to_make_more_for_lunch, cuisine)
+
+def _write_batch(batch: list, db_name: str) -> tuple:
+    """Write one batch and return (imported, rejected).
+    If another client added one of the meals since the names were loaded,
+    the batch is retried without the meals that now exist.
+    """
+    try:
+        return database.add_meals_to_db(batch, db_name), 0
+    except sqlite3.IntegrityError:
+        remaining = [meal for meal in batch if not database.meal_exists(meal[0], db_name)]
+        return database.add_meals_to_db(remaining, db_name), len(batch) - len(remaining)
+
+def import_meals(file_path: str, db_name: str = 'meals_database.db', batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """Import meals from a CSV or JSON Lines file.
+    The file is streamed in batches of batch_size rows. Every batch is written
+    in one transaction. Rows that are invalid or whose meal already exists
+    (in the database or earlier in the file) are rejected.
+    Args:
+        file_path (str): Path of the .csv or .jsonl file to import.
+        db_name (str): The name of the SQLite database file.
+        batch_size (int): The number of rows written per transaction.
+    Returns:
+        dict: Import statistics with the keys "imported", "rejected", "seconds" and "rows_per_second".
+    """
+    start = time.perf_counter()
+    known_meal_names = set(database.get_all_meal_names(db_name))
+    imported = 0
+    rejected = 0
+    batch = []
+    for row in _read_rows(file_path):
+        try:
+            meal = _validate_row(row)
+        except ValueError:
+            rejected += 1
+            continue
+        if meal[0] in known_meal_names:
+            rejected += 1
+            continue
+        known_meal_names.add(meal[0])
+        batch.append(meal)
+        if len(batch) >= batch_size:
+            batch_imported, batch_rejected = _write_batch(batch, db_name)
+            imported += batch_imported
+            rejected += batch_rejected
+            batch = []
+    batch_imported, batch_rejected = _write_batch(batch, db_name)
+    imported += batch_imported
+    rejected += batch_rejected
+
+    seconds = time.perf_counter() - start
+    return {
+        "imported": imported,
+        "rejected": rejected,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round((imported + rejected) / seconds, 1) if seconds else 0.0,
+    }
+
+def export_meals(file_path: str, db_name: str = 'meals_database.db', batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """Export all meals to a CSV or JSON Lines file.
+    Args:
+        file_path (str): Path of the .csv or .jsonl file to write.
+        db_name (str): The name of the SQLite database file.
+        batch_size (int): The number of records read from the database at a time.
+    Returns:
+        dict: Export statistics with the keys "exported", "seconds" and "rows_per_second".
+    """
+    start = time.perf_counter()
+    file_format = _file_format(file_path)
+    exported = 0
+    with open(file_path, "w", newline="", encoding="utf-8") as meal_file:
+        writer = csv.writer(meal_file) if file_format == "csv" else None
+        if writer:
+            writer.writerow(MEAL_FIELDS)
+        for batch in database.iter_meal_records(batch_size, db_name):
+            # Records are (id, meal_name, grocery_items, able_to_make_more_for_lunch, cuisine)
+            rows = [(record[1], record[2], bool(record[3]), record[4]) for record in batch]
+            if writer:
+                writer.writerows(rows)
+            else:
+                meal_file.writelines(json.dumps(dict(zip(MEAL_FIELDS, row))) + "\n" for row in rows)
+            exported += len(rows)
+
+    seconds = time.perf_counter() - start
+    return {
+        "exported": exported,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(exported / seconds, 1) if seconds else 0.0,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import or export meals as CSV or JSON Lines.")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("file_path", help="A .csv or .jsonl file.")
+    parser.add_argument("--db", default="meals_database.db", help="The SQLite database file.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        stats = import_meals(args.file_path, args.db, args.batch_size)
+    else:
+        stats = export_meals(args.file_path, args.db, args.batch_size)
+    print(json.dumps(stats))
+
+if __name__ == "__main__":
+    main()
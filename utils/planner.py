@@ -0,0 +1,180 @@
+"""Deterministic weekly meal plan generator.
+
+Builds the 7 day x (lunch, dinner) plan directly from the meals table
+instead of having the agent shuffle meal names over several LLM steps.
+
+Rules, in order of priority:
+- Pinned meals are always used for their day and slot.
+- When a dinner is marked `able_to_make_more_for_lunch`, the leftovers are
+  the next day's lunch.
+- A meal is not repeated within `no_repeat_window` days (leftover lunches
+  are the intended exception).
+- Consecutive fresh meals prefer cuisines that were not used recently.
+- Meals served in recent weeks are only used when nothing else fits.
+
+If the catalog is too small to satisfy every rule, the variety rule, the
+recent-weeks rule and the no-repeat rule are relaxed in that order rather
+than failing.
+"""
+import random
+
+from utils import database
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+SLOTS = ["Lunch", "Dinner"]
+
+# Number of random draws from a cuisine before falling back to scanning it.
+# Large catalogs almost always succeed within a few draws.
+_RANDOM_DRAWS_PER_CUISINE = 8
+
+
+class _MealCatalog:
+    """The candidate meals, grouped by cuisine for fast random picks."""
+
+    def __init__(self, meals: list):
+        self.can_make_more = {}
+        self.cuisine_of = {}
+        self.by_cuisine = {}
+        for meal_name, able_to_make_more_for_lunch, cuisine in meals:
+            if meal_name in self.can_make_more:
+                continue
+            cuisine = cuisine or ""
+            self.can_make_more[meal_name] = able_to_make_more_for_lunch
+            self.cuisine_of[meal_name] = cuisine
+            self.by_cuisine.setdefault(cuisine, []).append(meal_name)
+
+
+class _PlanBuilder:
+    def __init__(self, catalog: _MealCatalog, no_repeat_window: int, rng: random.Random, avoid: set = frozenset()):
+        self.catalog = catalog
+        self.no_repeat_window = no_repeat_window
+        self.rng = rng
+        self.avoid = avoid           # meal names to only use when nothing else fits
+        self.days_used = {}          # meal name -> days it is planned on
+        self.cuisine_last_used = {}  # cuisine -> index of the last slot it was used in
+
+    def use(self, meal_name: str, day: int, slot_index: int) -> None:
+        self.days_used.setdefault(meal_name, set()).add(day)
+        cuisine = self.catalog.cuisine_of.get(meal_name)
+        if cuisine is not None:
+            self.cuisine_last_used[cuisine] = slot_index
+
+    def _allowed(self, meal_name: str, day: int, window: int, avoid: set) -> bool:
+        if meal_name in avoid:
+            return False
+        days = self.days_used.get(meal_name, ())
+        if day in days:
+            return False
+        return all(abs(day - used_day) >= window for used_day in days)
+
+    def _pick_from(self, names: list, day: int, window: int, avoid: set):
+        for _ in range(min(_RANDOM_DRAWS_PER_CUISINE, len(names))):
+            candidate = names[self.rng.randrange(len(names))]
+            if self._allowed(candidate, day, window, avoid):
+                return candidate
+        start = self.rng.randrange(len(names))
+        for offset in range(len(names)):
+            candidate = names[(start + offset) % len(names)]
+            if self._allowed(candidate, day, window, avoid):
+                return candidate
+        return None
+
+    def pick(self, day: int, slot_index: int) -> str:
+        # Least recently used cuisines first, never used ones before all others.
+        cuisines = list(self.catalog.by_cuisine)
+        self.rng.shuffle(cuisines)
+        cuisines.sort(key=lambda cuisine: self.cuisine_last_used.get(cuisine, -1))
+        recent_cuisines = {cuisine for cuisine, last in self.cuisine_last_used.items() if last >= slot_index - 2}
+
+        window = self.no_repeat_window
+        for window, respect_variety, avoid in ((window, True, self.avoid), (window, False, self.avoid),
+                                               (window, False, ()), (1, False, ())):
+            for cuisine in cuisines:
+                if respect_variety and cuisine in recent_cuisines and len(cuisines) > 1:
+                    continue
+                meal_name = self._pick_from(self.catalog.by_cuisine[cuisine], day, window, avoid)
+                if meal_name is not None:
+                    return meal_name
+        raise ValueError("Not enough meals in the database to generate a meal plan for the week.")
+
+
+def _normalize_pins(pins: dict) -> dict:
+    """Validate pins of the form {"Monday": {"Dinner": "Rajma"}} and key them by (day index, slot)."""
+    normalized = {}
+    for day_name, slots in (pins or {}).items():
+        day = next((index for index, name in enumerate(DAYS) if name.lower() == str(day_name).lower()), None)
+        if day is None:
+            raise ValueError(f"Unknown day '{day_name}'. Use one of {DAYS}.")
+        if not isinstance(slots, dict):
+            raise ValueError(f"Pins for {day_name} must map 'Lunch' and/or 'Dinner' to a meal name.")
+        for slot_name, meal_name in slots.items():
+            slot = next((name for name in SLOTS if name.lower() == str(slot_name).lower()), None)
+            if slot is None:
+                raise ValueError(f"Unknown meal slot '{slot_name}'. Use one of {SLOTS}.")
+            normalized[(day, slot)] = meal_name
+    return normalized
+
+
+def generate_meal_plan(meals: list, pins: dict = None, no_repeat_window: int = 7, seed: int = None,
+                       avoid: set = None) -> dict:
+    """Generate a weekly meal plan from a list of candidate meals.
+    Args:
+        meals (list): A list of (meal_name, able_to_make_more_for_lunch, cuisine) tuples.
+        pins (dict): Meals that must be used, e.g. {"Monday": {"Dinner": "Rajma"}}.
+        no_repeat_window (int): Minimum number of days between two servings of the same meal.
+        seed (int): Seed for the random choices. The same seed and meals give the same plan.
+        avoid (set): Meal names to only use when there are not enough other meals, e.g. recently served ones.
+    Returns:
+        dict: {"Lunch": [7 meal names], "Dinner": [7 meal names]}, Monday first.
+    Raises:
+        ValueError: If the pins are invalid or there are no meals to plan with.
+    """
+    pins = _normalize_pins(pins)
+    catalog = _MealCatalog(meals)
+    if not catalog.can_make_more and len(pins) < len(DAYS) * len(SLOTS):
+        raise ValueError("Not enough meals in the database to generate a meal plan for the week.")
+
+    builder = _PlanBuilder(catalog, max(1, no_repeat_window), random.Random(seed), frozenset(avoid or ()))
+    for (day, slot), meal_name in pins.items():
+        builder.use(meal_name, day, day * 2 + SLOTS.index(slot))
+
+    plan = {"Lunch": [], "Dinner": []}
+    for day in range(len(DAYS)):
+        lunch = pins.get((day, "Lunch"))
+        if lunch is None and day > 0 and catalog.can_make_more.get(plan["Dinner"][-1]):
+            lunch = plan["Dinner"][-1]
+            builder.use(lunch, day, day * 2)
+        if lunch is None:
+            lunch = builder.pick(day, day * 2)
+            builder.use(lunch, day, day * 2)
+        plan["Lunch"].append(lunch)
+
+        dinner = pins.get((day, "Dinner"))
+        if dinner is None:
+            dinner = builder.pick(day, day * 2 + 1)
+            builder.use(dinner, day, day * 2 + 1)
+        plan["Dinner"].append(dinner)
+    return plan
+
+
+def generate_meal_plan_from_db(pins: dict = None, no_repeat_window: int = 7, seed: int = None,
+                               db_name: str = 'meals_database.db', avoid_recent_weeks: int = 0,
+                               week_start: str = None, household: str = database.DEFAULT_HOUSEHOLD) -> dict:
+    """Generate a weekly meal plan from the meals in the database.
+    Args:
+        pins (dict): Meals that must be used, e.g. {"Monday": {"Dinner": "Rajma"}}.
+        no_repeat_window (int): Minimum number of days between two servings of the same meal.
+        seed (int): Seed for the random choices.
+        db_name (str): The name of the SQLite database file.
+        avoid_recent_weeks (int): Meals planned in this many weeks before the plan's week are
+            only used when there are not enough other meals.
+        week_start (str): Any ISO date in the week the plan is for. Defaults to the current week.
+        household (str): The household the plan is for, whose earlier plans are avoided.
+    Returns:
+        dict: {"Lunch": [7 meal names], "Dinner": [7 meal names]}, Monday first.
+    """
+    meals = []
+    for batch in database.iter_meal_records(10000, db_name, ["meal_name", "able_to_make_more_for_lunch", "cuisine"]):
+        meals.extend(batch)
+    avoid = database.get_recently_served_meals(avoid_recent_weeks, week_start, db_name, household)
+    return generate_meal_plan(meals, pins, no_repeat_window, seed, avoid)
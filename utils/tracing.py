@@ -0,0 +1,305 @@
+"""Lightweight tracing and latency metrics.
+
+Spans are timed with `span()` or the `traced()` decorator. Every span
+- adds its duration to an in-process latency histogram, and
+- is written as one JSON line to the trace file (MEALPLAN_TRACE_FILE,
+  default .cache/traces.jsonl) by a background thread, so callers never
+  wait on file I/O. Once the file reaches MEALPLAN_TRACE_FILE_MAX_MB it is
+  moved to <file>.1, replacing the previous one. Spans that cannot be
+  written (a full queue, a full disk or a read-only filesystem) are dropped
+  and counted in trace_spans_dropped_total.
+
+The app and the MCP server process both trace into the same file. The
+histograms of the app process are served in the Prometheus text format by
+`start_metrics_server()`.
+
+Set MEALPLAN_TRACING=0 to turn tracing off.
+"""
+import bisect
+import functools
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+TRACING_ENABLED = os.getenv("MEALPLAN_TRACING", "1") != "0"
+TRACE_FILE = os.getenv("MEALPLAN_TRACE_FILE") or os.path.join(".cache", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(float(os.getenv("MEALPLAN_TRACE_FILE_MAX_MB") or 64) * 1024 * 1024)
+# Spans waiting for the writer; more are dropped, so a stalled writer cannot grow memory
+TRACE_QUEUE_SIZE = 10000
+# How long the writer waits before it tries the trace file again after an error
+TRACE_RETRY_SECONDS = 30.0
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_metrics_lock = threading.Lock()
+_histograms = {}       # (metric, labels) -> [bucket counts..., +Inf count, sum]
+_counters = {}         # (metric, labels) -> value
+_stats_providers = {}  # name -> callable returning a dict of numbers
+
+_trace_queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+_writer_lock = threading.Lock()
+_writer_thread = None
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def observe(metric: str, seconds: float, **labels: Any) -> None:
+    """Add one latency observation to a histogram.
+    Args:
+        metric (str): The histogram name, e.g. "mcp_tool_client_seconds".
+        seconds (float): The observed duration.
+        **labels: Labels that identify the series, e.g. tool="read_meal_records".
+    """
+    key = (metric, _labels_key(labels))
+    with _metrics_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        histogram[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+
+def increment(metric: str, value: float = 1, **labels: Any) -> None:
+    """Add value to a counter, e.g. the number of model input tokens."""
+    key = (metric, _labels_key(labels))
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def register_stats_provider(name: str, provider: Callable[[], dict]) -> None:
+    """Expose the numeric values returned by provider() as gauges named <name>_<key>.
+    Useful for cache hit counts or agent queue depth.
+    """
+    _stats_providers[name] = provider
+
+
+def _ensure_writer() -> None:
+    global _writer_thread
+    if _writer_thread is not None:
+        return
+    with _writer_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=_write_spans, name="trace-writer", daemon=True)
+            _writer_thread.start()
+
+
+def _open_trace_file():
+    if os.path.dirname(TRACE_FILE):
+        os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+    return open(TRACE_FILE, "a", encoding="utf-8")
+
+
+def _rotate_trace_file(trace_file):
+    """Return the file to append to next: a new one if this one is full or was rotated by another process."""
+    file_stat = os.fstat(trace_file.fileno())
+    try:
+        path_stat = os.stat(TRACE_FILE)
+    except FileNotFoundError:
+        path_stat = None
+    if path_stat is not None and (path_stat.st_ino, path_stat.st_dev) == (file_stat.st_ino, file_stat.st_dev):
+        if file_stat.st_size < TRACE_FILE_MAX_BYTES:
+            return trace_file
+        os.replace(TRACE_FILE, TRACE_FILE + ".1")
+    trace_file.close()
+    return _open_trace_file()
+
+
+def _write_spans() -> None:
+    trace_file = None
+    while True:
+        lines = [_trace_queue.get()]
+        # Write everything that queued up while we were busy in one go
+        while True:
+            try:
+                lines.append(_trace_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            if trace_file is None:
+                trace_file = _open_trace_file()
+            trace_file.write("".join(lines))
+            trace_file.flush()
+            trace_file = _rotate_trace_file(trace_file)
+        except OSError:
+            # E.g. a full disk or a read-only filesystem: drop these spans and try again later
+            increment("trace_spans_dropped_total", len(lines))
+            if trace_file is not None:
+                try:
+                    trace_file.close()
+                except OSError:
+                    pass
+                trace_file = None
+            time.sleep(TRACE_RETRY_SECONDS)
+
+
+def record_span(name: str, start: float, seconds: float, error: str = None, labels: dict = None, **fields: Any) -> None:
+    """Record a finished span in its histogram (<name>_seconds) and in the trace file.
+    Args:
+        name (str): The span name, e.g. "db_query".
+        start (float): The wall-clock start time (time.time()).
+        seconds (float): The duration.
+        error (str): The error message if the span failed.
+        labels (dict): Labels of the histogram series, e.g. {"function": "add_meal_to_db"}.
+            Keep their values to a small set.
+        **fields: Additional values that are only written to the trace file, e.g. token counts.
+    """
+    if not TRACING_ENABLED:
+        return
+    labels = labels or {}
+    observe(f"{name}_seconds", seconds, **labels)
+    record = {"name": name, "start": round(start, 6), "duration_ms": round(seconds * 1000, 3),
+              "pid": os.getpid(), "thread": threading.current_thread().name, **labels, **fields}
+    if error:
+        record["error"] = error
+    _ensure_writer()
+    try:
+        _trace_queue.put_nowait(json.dumps(record, default=str) + "\n")
+    except queue.Full:
+        increment("trace_spans_dropped_total")
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """Time the enclosed block as a span.
+    Args:
+        name (str): The span name.
+        **attributes: Labels of the span.
+    """
+    if not TRACING_ENABLED:
+        yield
+        return
+    start = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record_span(name, start, time.perf_counter() - started, error, attributes)
+
+
+def traced(name: str, **attributes: Any) -> Callable:
+    """Decorator that records every call of the function as a span."""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_function(name: str) -> Callable:
+    """Like traced(), labelling the span with the decorated function's name."""
+    def decorator(fn: Callable) -> Callable:
+        return traced(name, function=fn.__name__)(fn)
+    return decorator
+
+
+def instrument_tools(tools: list, name: str = "mcp_tool_client") -> list:
+    """Time every call of the agent's tools, in place.
+    Args:
+        tools (list): smolagents tools.
+        name (str): The span name used for the calls.
+    Returns:
+        list: The same tools.
+    """
+    for tool in tools:
+        tool.forward = traced(name, tool=tool.name)(tool.forward)
+    return tools
+
+
+def record_agent_step(step: Any) -> None:
+    """smolagents step callback that records the step duration and its token usage."""
+    timing = getattr(step, "timing", None)
+    duration = timing.duration if timing is not None else None
+    if duration is None or not TRACING_ENABLED:
+        return
+    token_usage = getattr(step, "token_usage", None)
+    input_tokens = token_usage.input_tokens if token_usage else 0
+    output_tokens = token_usage.output_tokens if token_usage else 0
+    increment("agent_input_tokens_total", input_tokens)
+    increment("agent_output_tokens_total", output_tokens)
+    error = getattr(step, "error", None)
+    record_span("agent_step", timing.start_time, duration, str(error) if error else None,
+                {"step_type": type(step).__name__}, step_number=getattr(step, "step_number", None),
+                input_tokens=input_tokens, output_tokens=output_tokens)
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+def render_metrics() -> str:
+    """Render all histograms, counters and registered stats in the Prometheus text format."""
+    lines = []
+    with _metrics_lock:
+        histograms = {key: list(value) for key, value in _histograms.items()}
+        counters = dict(_counters)
+    for (metric, labels), histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram[:-1]):
+            cumulative += count
+            lines.append(f"mealplan_{metric}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+        lines.append(f"mealplan_{metric}_sum{_format_labels(labels)} {histogram[-1]:.6f}")
+        lines.append(f"mealplan_{metric}_count{_format_labels(labels)} {cumulative}")
+    for (metric, labels), value in sorted(counters.items()):
+        lines.append(f"mealplan_{metric}{_format_labels(labels)} {value}")
+    for name, provider in sorted(_stats_providers.items()):
+        try:
+            stats = provider()
+        except Exception:
+            continue
+        for key, value in _flatten_stats(stats):
+            lines.append(f"mealplan_{name}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _flatten_stats(stats: dict, prefix: str = ""):
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten_stats(value, f"{prefix}{key}_")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{key}", value
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would otherwise flood the console
+
+
+def start_metrics_server(port: int, host: str = None) -> ThreadingHTTPServer:
+    """Serve GET /metrics on a daemon thread.
+    Args:
+        port (int): The port to listen on.
+        host (str): The interface to bind to. Defaults to 127.0.0.1.
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    server = ThreadingHTTPServer((host or "127.0.0.1", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server